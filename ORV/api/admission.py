@@ -0,0 +1,110 @@
+# api/admission.py
+"""
+Nadzor sprejema zahtevkov (admission control) in roki zahtevkov.
+
+Ob navalu zahtevkov se ti brez omejitve kopičijo v nitih strežnika in vrsti
+MicroBatcher-ja, dokler ne potečejo vsi hkrati. Zato:
+
+- `AdmissionController` omeji število inferenčnih zahtevkov v teku; zahtevek
+  nad omejitvijo API takoj zavrne z 503 in glavo Retry-After.
+- Klicatelj lahko v glavi X-Request-Timeout-Ms poda, koliko časa (ms od prihoda
+  zahtevka) je še pripravljen čakati. Rok velja za trenutni kontekst
+  (contextvars, tako kot profil zahtevka) in se preveri pred inferenco; delo
+  zahtevka, ki mu je rok že potekel, se zavrže (`DeadlineExceeded`), namesto da
+  bi zasedlo model za odgovor, ki ga nihče ne bo prebral.
+"""
+import contextvars
+import threading
+import time
+from typing import Optional
+
+from src.metrics import set_in_flight
+
+DEADLINE_HEADER = "X-Request-Timeout-Ms"
+
+_current_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Rok zahtevka je potekel, preden je bilo delo opravljeno."""
+
+
+class AdmissionController:
+    """Omejitev števila sočasnih inferenčnih zahtevkov v enem procesu (0 = brez omejitve)."""
+
+    def __init__(self, max_in_flight: int, retry_after_s: int = 1):
+        self.max_in_flight = int(max_in_flight)
+        self.retry_after_s = int(retry_after_s)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._admitted_total = 0
+        self._rejected_total = 0
+
+    def try_acquire(self) -> bool:
+        """Zasede mesto za zahtevek; False, če je omejitev dosežena (zahtevek je treba zavrniti)."""
+        with self._lock:
+            if 0 < self.max_in_flight <= self._in_flight:
+                self._rejected_total += 1
+                return False
+            self._in_flight += 1
+            self._admitted_total += 1
+            in_flight = self._in_flight
+        set_in_flight(in_flight)
+        return True
+
+    def release(self):
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+            in_flight = self._in_flight
+        set_in_flight(in_flight)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_in_flight": self.max_in_flight,
+                "in_flight": self._in_flight,
+                "admitted_total": self._admitted_total,
+                "rejected_total": self._rejected_total,
+                "retry_after_s": self.retry_after_s,
+            }
+
+
+def parse_deadline(headers) -> Optional[float]:
+    """
+    Rok zahtevka (time.monotonic()) iz glave X-Request-Timeout-Ms ali None.
+    Neveljavna vrednost se prezre, kot da glave ni.
+    """
+    value = headers.get(DEADLINE_HEADER)
+    if not value:
+        return None
+    try:
+        timeout_ms = float(value)
+    except ValueError:
+        return None
+    return time.monotonic() + timeout_ms / 1000.0
+
+
+def start_deadline(deadline: Optional[float]):
+    """Nastavi rok za trenutni kontekst. Vrne žeton za `end_deadline` ali None."""
+    if deadline is None:
+        return None
+    return _current_deadline.set(deadline)
+
+
+def end_deadline(token):
+    if token is not None:
+        _current_deadline.reset(token)
+
+
+def current_deadline() -> Optional[float]:
+    return _current_deadline.get()
+
+
+def is_expired(deadline: Optional[float]) -> bool:
+    return deadline is not None and time.monotonic() > deadline
+
+
+def check_deadline():
+    """Sproži DeadlineExceeded, če je rok trenutnega zahtevka že potekel."""
+    if is_expired(_current_deadline.get()):
+        raise DeadlineExceeded("Request deadline exceeded")
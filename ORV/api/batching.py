@@ -0,0 +1,198 @@
+# api/batching.py
+import os
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+from collections import deque
+from typing import Callable, Optional
+
+import numpy as np
+
+from api.admission import DeadlineExceeded, is_expired
+
+
+class MicroBatcher:
+    """
+    Zbira posamezne vhode (npr. izrezane obraze) iz več sočasnih zahtevkov in jih
+    požene skozi model v enem samem klicu.
+
+    Batch se sproži, ko se nabere `max_batch_size` vhodov ali ko najstarejši vhod
+    v vrsti čaka `max_wait_ms` milisekund. Vsak zahtevek dobi nazaj svoj `Future`,
+    ki se razreši z ustrezno vrstico izhoda modela.
+
+    Vhod ima lahko rok (`deadline`, time.monotonic()); če rok poteče, medtem ko
+    vhod čaka v vrsti, se vhod ne pošlje v model, njegov Future pa se razreši z
+    DeadlineExceeded.
+    """
+
+    def __init__(self, predict_fn: Callable[[np.ndarray], np.ndarray],
+                 max_batch_size: int = 16, max_wait_ms: float = 5.0, name: str = "embedding"):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size mora biti vsaj 1.")
+        if max_wait_ms < 0:
+            raise ValueError("max_wait_ms ne sme biti negativen.")
+
+        self.predict_fn = predict_fn
+        self.max_batch_size = int(max_batch_size)
+        self.max_wait_s = float(max_wait_ms) / 1000.0
+        self.name = name
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._stopped = False
+
+        # Statistika (zaščitena s self._cond)
+        self._batches_total = 0
+        self._items_total = 0
+        self._max_batch_seen = 0
+        self._batch_size_counts = {}
+        self._queue_wait_total_s = 0.0
+        self._queue_wait_max_s = 0.0
+        self._expired_total = 0
+
+        self._start_worker()
+
+        # Niti ne preživijo fork-a: v pre-fork strežniku (serve.py) je treba delavca znova zagnati
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._restart_after_fork)
+
+    def _start_worker(self):
+        self._worker = threading.Thread(target=self._run, name=f"microbatcher-{self.name}", daemon=True)
+        self._worker.start()
+
+    def _restart_after_fork(self):
+        self._queue = deque()
+        self._cond = threading.Condition()
+        if not self._stopped:
+            self._start_worker()
+
+    def submit(self, item: np.ndarray, deadline: Optional[float] = None) -> Future:
+        """Doda en vhod (brez batch dimenzije) v vrsto in vrne Future z rezultatom."""
+        future = Future()
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError(f"MicroBatcher '{self.name}' je ustavljen.")
+            self._queue.append((item, future, time.perf_counter(), deadline))
+            self._cond.notify()
+        return future
+
+    def predict(self, item: np.ndarray, timeout: Optional[float] = None) -> np.ndarray:
+        """Sinhroni ovoj okoli `submit`: počaka na rezultat za en vhod."""
+        return self.submit(item).result(timeout=timeout)
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._worker.join(timeout=1.0)
+
+    def _collect_batch(self):
+        with self._cond:
+            while not self._queue and not self._stopped:
+                self._cond.wait()
+            if self._stopped and not self._queue:
+                return None
+
+            # Čakamo, dokler se batch ne napolni ali dokler najstarejši vhod ne čaka predolgo
+            deadline = self._queue[0][2] + self.max_wait_s
+            while len(self._queue) < self.max_batch_size and not self._stopped:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(timeout=remaining)
+
+            batch = []
+            while self._queue and len(batch) < self.max_batch_size:
+                batch.append(self._queue.popleft())
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            if batch is None:
+                return
+            try:
+                self._process_batch(batch)
+            except Exception as e:
+                # Nit ne sme umreti: sicer bi vsi čakajoči in prihodnji zahtevki obviseli
+                print(f"Error in micro-batcher '{self.name}': {e}")
+                for entry in batch:
+                    self._resolve(entry[1], exception=e)
+
+    def _process_batch(self, batch):
+        # Vhodi s preteklim rokom ne gredo v model, klicatelj nanje ne čaka več
+        batch = self._drop_expired(batch)
+        if not batch:
+            return
+
+        started = time.perf_counter()
+        items = [entry[0] for entry in batch]
+        futures = [entry[1] for entry in batch]
+        self._record_stats(len(batch), [started - entry[2] for entry in batch])
+
+        try:
+            outputs = self.predict_fn(np.stack(items, axis=0))
+            if len(outputs) != len(batch):
+                raise RuntimeError(f"Model returned {len(outputs)} outputs for a batch of {len(batch)} inputs")
+        except Exception as e:
+            for future in futures:
+                self._resolve(future, exception=e)
+            return
+
+        for i, future in enumerate(futures):
+            self._resolve(future, result=outputs[i])
+
+    @staticmethod
+    def _resolve(future, result=None, exception=None):
+        """Razreši Future; preklicane ali že razrešene (npr. po poteku roka) preskoči."""
+        if future.done():
+            return
+        try:
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
+        except InvalidStateError:
+            pass
+
+    def _drop_expired(self, batch):
+        live = []
+        for entry in batch:
+            if is_expired(entry[3]):
+                self._resolve(entry[1], exception=DeadlineExceeded(
+                    "Request deadline exceeded while queued for inference"))
+            else:
+                live.append(entry)
+        if len(live) < len(batch):
+            with self._cond:
+                self._expired_total += len(batch) - len(live)
+        return live
+
+    def _record_stats(self, batch_size, waits_s):
+        with self._cond:
+            self._batches_total += 1
+            self._items_total += batch_size
+            self._max_batch_seen = max(self._max_batch_seen, batch_size)
+            self._batch_size_counts[batch_size] = self._batch_size_counts.get(batch_size, 0) + 1
+            self._queue_wait_total_s += sum(waits_s)
+            self._queue_wait_max_s = max(self._queue_wait_max_s, max(waits_s))
+
+    def get_stats(self) -> dict:
+        """Vrne statistiko velikosti batchev in čakanja v vrsti."""
+        with self._cond:
+            batches = self._batches_total
+            items = self._items_total
+            return {
+                "name": self.name,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_s * 1000.0,
+                "queue_depth": len(self._queue),
+                "batches_total": batches,
+                "items_total": items,
+                "avg_batch_size": (items / batches) if batches else 0.0,
+                "max_batch_size_seen": self._max_batch_seen,
+                "batch_size_histogram": {str(k): v for k, v in sorted(self._batch_size_counts.items())},
+                "avg_queue_wait_ms": (self._queue_wait_total_s / items * 1000.0) if items else 0.0,
+                "max_queue_wait_ms": self._queue_wait_max_s * 1000.0,
+                "expired_total": self._expired_total,
+            }
@@ -0,0 +1,95 @@
+# api/embedding_cache.py
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import numpy as np
+
+from src.metrics import record_embedding_cache
+
+
+class EmbeddingCache:
+    """
+    LRU predpomnilnik embeddingov, naslovljen z vsebino naložene slike.
+
+    Ključ je zgoščena vrednost bajtov slike in različice modela, zato ponovno
+    poslana ista slika (ponovitev zahtevka z mobilne aplikacije ali paketnika)
+    preskoči dekodiranje, detekcijo in inferenco. Shranijo se okvir obraza,
+    embedding in ocena kakovosti; None kot okvir pomeni, da na sliki ni obraza.
+
+    Omejitvi: največ `max_entries` vnosov (najdlje neuporabljeni gredo ven) in
+    `ttl_s` sekund življenjske dobe vnosa.
+    """
+
+    def __init__(self, max_entries: int = 4096, ttl_s: float = 300.0):
+        self.max_entries = int(max_entries)
+        self.ttl_s = float(ttl_s)
+        self._entries = OrderedDict()  # ključ -> (čas vpisa, okvir obraza, embedding, kakovost)
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def make_key(image_bytes: bytes, model_version: str) -> str:
+        digest = hashlib.blake2b(image_bytes, digest_size=16).hexdigest()
+        return f"{model_version}:{digest}"
+
+    def get(self, key: str) -> Optional[Tuple[Optional[tuple], Optional[np.ndarray], Optional[dict]]]:
+        """Vrne (okvir obraza, embedding, kakovost) ali None, če vnosa ni ali je potekel."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl_s:
+                del self._entries[key]
+                self._expirations += 1
+                entry = None
+            if entry is None:
+                self._misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self._hits += 1
+        record_embedding_cache(entry is not None)
+        return entry[1:] if entry is not None else None
+
+    def put(self, key: str, face_box: Optional[tuple], embedding: Optional[np.ndarray],
+            quality: Optional[dict] = None):
+        if not self.enabled:
+            return
+        if embedding is not None:
+            embedding = np.array(embedding, dtype=np.float32)  # Lastna kopija, klicatelj je ne more spremeniti
+            embedding.setflags(write=False)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), face_box, embedding, quality)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_s": self.ttl_s,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": (self._hits / lookups) if lookups else 0.0,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+            }
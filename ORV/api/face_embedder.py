@@ -1,10 +1,11 @@
 # face_embedder.py
 import os
 import sys
+import threading
+import time
 import numpy as np
-import tensorflow as tf
 import cv2
-from typing import Union, Optional
+from typing import Union, Optional, List
 
 # --- Nastavitev poti za pravilne importe ---
 # Skripta predpostavlja, da se nahaja v korenu projekta (ORV/).
@@ -15,7 +16,13 @@ if SRC_PATH not in sys.path:
 
 try:
     from src import config
-    from src.model_definition import l2_normalize_layer_func
+    from api.batching import MicroBatcher
+    from api.admission import DeadlineExceeded, check_deadline, current_deadline
+    from api.inference_backends import load_backend, is_fork_safe, model_version
+    from api.embedding_cache import EmbeddingCache
+    from api.face_pipeline import FacePipeline
+    from src.metrics import stage_timer, record_quality_rejected
+    from src.profiling import record_stage
 except ImportError as e:
     print(f"NAPAKA: Ni mogoče uvoziti modulov iz 'src/'. Prepričaj se, da je struktura map pravilna. Napaka: {e}")
     sys.exit(1)
@@ -24,73 +31,208 @@ except ImportError as e:
 # Ta del se izvede samo enkrat, ko se modul prvič importa.
 
 # Poti do potrebnih datotek
-MODEL_PATH = os.path.join(PROJECT_ROOT, 'model', config.EMBEDDING_MODEL_NAME)
+MODEL_DIR = os.path.join(PROJECT_ROOT, 'model')
 CASCADE_PATH = os.path.join(PROJECT_ROOT, 'haarcascade_frontalface_default.xml')
 
-# Globalne spremenljivke za model in detektor
-_model = None
+# Predpomnilnik embeddingov za ponovno poslane slike (glej api/embedding_cache.py)
+embedding_cache = EmbeddingCache(max_entries=config.EMBED_CACHE_MAX_ENTRIES, ttl_s=config.EMBED_CACHE_TTL_S)
+
+# Globalne spremenljivke za model (inference backend) in detektor
+_backend = None
 _face_cascade = None
+_batcher = None
+_cache_version = None  # Različica modela in nastavitev detekcije, del ključa predpomnilnika
 _is_initialized = False
+_init_lock = threading.Lock()  # Viri se lahko nalagajo hkrati iz warm-up niti in iz zahtevkov
 
 
-def _initialize_resources():
+def _initialize_resources(load_model=True):
     """
     Interna funkcija, ki naloži model in detektor v pomnilnik.
     Pokliče se samodejno ob prvem klicu glavne funkcije.
+
+    :param load_model: Če je False, se naložita samo detektor in vrsta (model pride kasneje).
     """
-    global _model, _face_cascade, _is_initialized
+    global _backend, _face_cascade, _batcher, _cache_version, _is_initialized
 
     if _is_initialized:
         return
 
-    print("Inicializacija virov (model in detektor)... To se zgodi samo enkrat.")
-
-    # Preverjanje obstoja datotek
-    if not os.path.exists(MODEL_PATH):
-        raise FileNotFoundError(f"Model ni najden na poti: {MODEL_PATH}")
-    if not os.path.exists(CASCADE_PATH):
-        raise FileNotFoundError(f"Haar cascade datoteka ni najdena na poti: {CASCADE_PATH}")
-
-    # Nalaganje modela za prepoznavo obrazov
-    try:
-        tf.keras.config.enable_unsafe_deserialization()
-        _model = tf.keras.models.load_model(
-            MODEL_PATH,
-            custom_objects={'l2_normalize_layer_func': l2_normalize_layer_func},
-            compile=False
-        )
-        print("-> Model uspešno naložen.")
-    except Exception as e:
-        raise RuntimeError(f"Napaka pri nalaganju modela: {e}")
-
-    # Nalaganje detektorja obrazov
-    _face_cascade = cv2.CascadeClassifier(CASCADE_PATH)
-    if _face_cascade.empty():
-        raise IOError(f"Napaka pri nalaganju Haar cascade klasifikatorja iz: {CASCADE_PATH}")
-    print("-> Detektor obrazov uspešno naložen.")
-
-    _is_initialized = True
-    print("Inicializacija končana.")
-
-
-def _detect_and_crop_face(image_np_uint8):
+    with _init_lock:
+        if _is_initialized:
+            return
+
+        if _face_cascade is None:
+            print("Inicializacija virov (model in detektor)... To se zgodi samo enkrat.")
+
+            # Preverjanje obstoja datotek
+            if not os.path.exists(CASCADE_PATH):
+                raise FileNotFoundError(f"Haar cascade datoteka ni najdena na poti: {CASCADE_PATH}")
+
+            # Nalaganje detektorja obrazov
+            face_cascade = cv2.CascadeClassifier(CASCADE_PATH)
+            if face_cascade.empty():
+                raise IOError(f"Napaka pri nalaganju Haar cascade klasifikatorja iz: {CASCADE_PATH}")
+            _face_cascade = face_cascade
+            print("-> Detektor obrazov uspešno naložen.")
+
+            # Vsi sočasni zahtevki gredo skozi skupno vrsto, ki jih združi v batche
+            _batcher = MicroBatcher(
+                _predict_batch,
+                max_batch_size=config.EMBED_BATCH_MAX_SIZE,
+                max_wait_ms=config.EMBED_BATCH_MAX_WAIT_MS,
+                name="embedding",
+            )
+            print(f"-> Micro-batching vklopljen (max_batch={config.EMBED_BATCH_MAX_SIZE}, "
+                  f"max_wait={config.EMBED_BATCH_MAX_WAIT_MS} ms).")
+
+        if not load_model:
+            return
+
+        # Nalaganje modela za prepoznavo obrazov z izbranim backendom (keras, onnx ali tflite)
+        try:
+            _backend = load_backend(config.EMBEDDING_BACKEND, MODEL_DIR)
+            print(f"-> Model uspešno naložen (backend: {_backend.name}).")
+            # Okvir obraza je odvisen tudi od načina detekcije, zato je ta del ključa
+            _cache_version = (f"{model_version(_backend)}:"
+                              f"{config.DETECT_MODE}:{config.DETECT_PROXY_MAX_SIDE}")
+        except FileNotFoundError:
+            raise
+        except Exception as e:
+            raise RuntimeError(f"Napaka pri nalaganju modela: {e}")
+
+        _is_initialized = True
+        print("Inicializacija končana.")
+
+
+def _predict_batch(batch: np.ndarray) -> np.ndarray:
+    """En klic modela za celoten batch."""
+    with stage_timer("inference"):
+        return _backend.predict(batch)
+
+
+def preload_resources(fork_safe_only=True):
     """
-    Interna funkcija, ki poišče največji obraz, ga obreže in pomanjša.
+    Vnaprej naloži model in detektor (npr. v glavnem procesu pred fork-om delavcev).
+
+    :param fork_safe_only: Model naloži samo, če ga backend lahko deli z delavci po fork-u
+                           (ONNX Runtime); TensorFlow in TFLite model naloži šele delavec.
+                           Privzeto vklopljeno: TF/TFLite, naložen pred fork-om, v delavcu obvisi
+                           ob prvem klicu. False samo za proces, ki se ne forka.
     """
-    img_rgb = cv2.cvtColor(image_np_uint8, cv2.COLOR_BGR2RGB)
-    gray_img = cv2.cvtColor(img_rgb, cv2.COLOR_RGB2GRAY)
+    _initialize_resources(load_model=not fork_safe_only or is_fork_safe(config.EMBEDDING_BACKEND))
+
+
+def warm_up():
+    """
+    Naloži vire in izvede prazne klice modela (en obraz in poln batch), da prvi
+    pravi zahtevek ne plača inicializacije runtime-a in priprave grafa.
+    """
+    _initialize_resources()
+    dummy_face = np.zeros((config.IMG_HEIGHT, config.IMG_WIDTH, config.IMG_CHANNELS), dtype=np.float32)
+    _batcher.predict(dummy_face)
+    # Poln batch gre prav tako skozi vrsto: model (TFLite interpreter, Keras) sme klicati samo nit batcherja,
+    # ki morda že streže zahtevkom
+    for future in [_batcher.submit(dummy_face) for _ in range(config.EMBED_BATCH_MAX_SIZE)]:
+        future.result()
+
+
+def get_backend_name() -> Optional[str]:
+    """Ime naloženega backenda ali None, če model še ni naložen."""
+    return _backend.name if _backend is not None else None
+
+
+def create_face_pipeline(image_bytes: bytes) -> FacePipeline:
+    """
+    Ustvari FacePipeline za ene bajte slike. Pipeline dekodira sliko in zazna obraz
+    samo enkrat, vsi nadaljnji koraki zahtevka pa berejo iz njega.
+    """
+    _initialize_resources()
+    return FacePipeline(image_bytes, _face_cascade)
 
-    faces = _face_cascade.detectMultiScale(gray_img, scaleFactor=1.1, minNeighbors=5, minSize=(50, 50))
-    if not len(faces):
-        return None
 
-    if len(faces) > 1:
-        faces = sorted(faces, key=lambda f: f[2] * f[3], reverse=True)
+def get_embedding_from_pipeline(pipeline: FacePipeline) -> Optional[np.ndarray]:
+    """
+    Vrne 128-dimenzionalni embedding za največji obraz v pipeline-u.
+
+    Returns:
+        NumPy array (1, 128) z embeddingom, ali None, če obraz ni bil najden.
+    """
+    return get_embeddings_from_pipelines([pipeline])[0]
+
+
+def get_embeddings_from_pipelines(pipelines: List[FacePipeline]) -> List[Optional[np.ndarray]]:
+    """
+    Embeddingi za več slik hkrati. Vsi najdeni obrazi gredo v vrsto MicroBatcher-ja
+    naenkrat, zato se izračunajo v čim manj klicih modela. Slike, ki so že v
+    predpomnilniku (ista vsebina, isti model), se ne obdelajo ponovno. Obrazi, ki
+    ne dosežejo mej kakovosti, ne gredo v model (koda v `pipeline.quality_error`).
 
-    x, y, w, h = faces[0]
-    cropped = img_rgb[y:y + h, x:x + w]
-    resized = cv2.resize(cropped, (config.IMG_WIDTH, config.IMG_HEIGHT), interpolation=cv2.INTER_AREA)
-    return resized
+    Returns:
+        Seznam enake dolžine kot `pipelines`; element je (1, 128) embedding ali None,
+        če slika ni veljavna, obraz ni bil najden ali je bil zavrnjen zaradi kakovosti.
+
+    Raises:
+        DeadlineExceeded: rok zahtevka (api/admission.py) je potekel pred inferenco.
+    """
+    _initialize_resources()
+    check_deadline()
+
+    results = [None] * len(pipelines)
+    cache_keys = [None] * len(pipelines)
+    model_inputs = [None] * len(pipelines)
+
+    # Najprej predpomnilnik, nato detekcija in izrezi za vse ostale slike, šele nato oddaja v vrsto,
+    # da se batch napolni
+    for i, pipeline in enumerate(pipelines):
+        try:
+            if embedding_cache.enabled:
+                cache_keys[i] = EmbeddingCache.make_key(pipeline.image_bytes, _cache_version)
+                cached = embedding_cache.get(cache_keys[i])
+                if cached is not None:
+                    face_box, embedding, quality = cached
+                    # Okvir obraza prenesemo v pipeline, da ga uporabijo nadaljnji koraki (npr. FaceNet izrez)
+                    pipeline.use_known_face(face_box, quality)
+                    results[i] = np.expand_dims(embedding.copy(), axis=0) if embedding is not None else None
+                    continue
+
+            if not pipeline.is_valid:
+                continue
+            if pipeline.face_box is not None and pipeline.quality_error is not None:
+                # Zamegljen, pretemen, premajhen ... obraz: brez inference (in brez vpisa v predpomnilnik)
+                record_quality_rejected(pipeline.quality_error)
+                continue
+            model_inputs[i] = pipeline.face_input(config.IMG_WIDTH)
+            if model_inputs[i] is None and cache_keys[i] is not None:
+                # Tudi "ni obraza" si zapomnimo, ponovitev ne bo ponovila detekcije
+                embedding_cache.put(cache_keys[i], None, None)
+        except Exception as e:
+            print(f"Napaka med obdelavo slike: {e}")
+            model_inputs[i] = None
+
+    # Detekcija je lahko trajala dlje od roka; zahtevka, na katerega nihče ne čaka, ne pošiljamo v model
+    check_deadline()
+    deadline = current_deadline()
+    futures = [_batcher.submit(model_input, deadline=deadline) if model_input is not None else None
+               for model_input in model_inputs]
+
+    # Inferenca teče v niti MicroBatcher-ja; v profil zahtevka zapišemo čas čakanja na rezultate
+    start = time.perf_counter()
+    for i, future in enumerate(futures):
+        if future is None:
+            continue
+        try:
+            embedding = future.result()
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            print(f"Napaka med izračunom embeddinga: {e}")
+            continue
+        results[i] = np.expand_dims(embedding, axis=0)
+        if cache_keys[i] is not None:
+            embedding_cache.put(cache_keys[i], pipelines[i].face_box, embedding, pipelines[i].quality)
+    record_stage("predict", time.perf_counter() - start)
+    return results
 
 
 # --- GLAVNA FUNKCIJA ZA UPORABO V API-ju ---
@@ -105,34 +247,19 @@ def get_embedding_from_image_bytes(image_bytes: bytes) -> Optional[np.ndarray]:
     Returns:
         NumPy array (1, 128) z embeddingom, ali None, če obraz ni bil najden.
     """
-    # Zagotovi, da so model in ostali viri naloženi
-    _initialize_resources()
+    return get_embedding_from_pipeline(create_face_pipeline(image_bytes))
+
 
-    try:
-        # Pretvori bajte v NumPy array, ki ga razume OpenCV
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        img_bgr = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        if img_bgr is None:
-            print("OPOZORILO: Neveljavni bajti slike.")
-            return None
-
-        # Zaznaj in obreži obraz
-        cropped_face = _detect_and_crop_face(img_bgr)
-        if cropped_face is None:
-            print("INFO: Obraz na sliki ni bil zaznan.")
-            return None
-
-        # Priprava za model (normalizacija in dodajanje batch dimenzije)
-        img_normalized = cropped_face.astype(np.float32) / 255.0
-        model_input = np.expand_dims(img_normalized, axis=0)
-
-        # Generiranje in vrnitev embeddinga
-        embedding = _model.predict(model_input)
-        return embedding
-
-    except Exception as e:
-        print(f"Napaka med obdelavo slike: {e}")
+def get_batching_stats() -> Optional[dict]:
+    """Vrne statistiko micro-batchinga ali None, če viri še niso naloženi."""
+    if _batcher is None:
         return None
+    return _batcher.get_stats()
+
+
+def get_cache_stats() -> dict:
+    """Vrne statistiko predpomnilnika embeddingov (zadetki, zgrešitve, velikost)."""
+    return embedding_cache.get_stats()
 
 
 # --- Primer uporabe (za testiranje) --->
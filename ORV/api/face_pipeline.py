@@ -0,0 +1,215 @@
+# api/face_pipeline.py
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+from src import config
+from src.metrics import stage_timer
+from face_processing.proxy_detection import (
+    decode_for_detection,
+    detection_size_limits,
+    map_boxes_to_full,
+)
+from face_processing.quality import score_face_quality, quality_error
+
+# Parametri detekcije (enaki, kot jih je uporabljal face_embedder._detect_and_crop_face)
+DETECT_SCALE_FACTOR = 1.1
+DETECT_MIN_NEIGHBORS = 5
+DETECT_MIN_SIZE = (50, 50)
+
+# Padding okoli obraza za FaceNet izrez (enako kot face_processing.detection.detect_face)
+FACE_PADDING_H = 0.15
+FACE_PADDING_W = 0.10
+
+
+class FacePipeline:
+    """
+    Obdelava ene naložene slike v okviru enega zahtevka.
+
+    Slika se dekodira samo enkrat, detekcija obraza se izvede samo enkrat, vsi
+    vmesni rezultati (sivinska slika, okvirji obrazov, izrezi v vseh ciljnih
+    velikostih) pa se shranijo, da jih lahko uporabijo vsi nadaljnji koraki
+    (embedding model, FaceNet augmentacije, ...).
+
+    V načinu "multires" (config.DETECT_MODE) detekcija teče na zmanjšani proxy
+    sliki, polna ločljivost pa se dekodira šele, ko je obraz najden in ga je
+    treba izrezati.
+
+    Po detekciji je na voljo ocena kakovosti največjega obraza (`quality`,
+    `quality_error`), da slabih slik ne pošljemo v model.
+    """
+
+    def __init__(self, image_bytes: bytes, face_cascade, detect_mode: Optional[str] = None):
+        self.image_bytes = image_bytes
+        self.face_cascade = face_cascade
+        self.detect_mode = detect_mode or config.DETECT_MODE
+
+        self._proxy_decoded = False
+        self._proxy_bgr = None
+        self._proxy_scale = 1.0
+        self._decoded = False
+        self._image_bgr = None
+        self._image_rgb = None
+        self._gray = None
+        self._faces = None
+        self._neighbors = []
+        self._min_face_side = float(DETECT_MIN_SIZE[0])
+        self._quality = None
+        self._quality_done = False
+        self._crops = {}
+        self._inputs = {}
+
+    # --- Dekodiranje ---
+
+    @property
+    def image_bgr(self) -> Optional[np.ndarray]:
+        if not self._decoded:
+            self._decoded = True
+            with stage_timer("decode"):
+                nparr = np.frombuffer(self.image_bytes, np.uint8)
+                self._image_bgr = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        return self._image_bgr
+
+    @property
+    def proxy_bgr(self) -> Optional[np.ndarray]:
+        """Zmanjšana slika za detekcijo (v načinu "full" kar polna slika)."""
+        if self.detect_mode != "multires":
+            return self.image_bgr
+        if not self._proxy_decoded:
+            self._proxy_decoded = True
+            with stage_timer("decode"):
+                self._proxy_bgr, self._proxy_scale = decode_for_detection(
+                    self.image_bytes, config.DETECT_PROXY_MAX_SIDE)
+            if self._proxy_scale == 1.0:
+                # Majhna slika: proxy je že polna ločljivost, drugič je ne dekodiramo
+                self._decoded = True
+                self._image_bgr = self._proxy_bgr
+        return self._proxy_bgr
+
+    @property
+    def is_valid(self) -> bool:
+        """Ali so bajti veljavna slika."""
+        return self.proxy_bgr is not None
+
+    @property
+    def image_rgb(self) -> Optional[np.ndarray]:
+        if self._image_rgb is None and self.image_bgr is not None:
+            self._image_rgb = cv2.cvtColor(self.image_bgr, cv2.COLOR_BGR2RGB)
+        return self._image_rgb
+
+    @property
+    def gray(self) -> Optional[np.ndarray]:
+        """Sivinska slika, na kateri teče detekcija (proxy v načinu "multires")."""
+        if self._gray is None and self.proxy_bgr is not None:
+            self._gray = cv2.cvtColor(self.proxy_bgr, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+    # --- Detekcija ---
+
+    @property
+    def faces(self) -> list:
+        """Vsi zaznani obrazi (x, y, w, h), razvrščeni po površini (največji prvi)."""
+        if self._faces is None:
+            if self.gray is None:
+                self._faces = []
+            else:
+                size_limits = {"minSize": DETECT_MIN_SIZE}
+                if self.detect_mode == "multires":
+                    min_size, max_size = detection_size_limits(
+                        self.gray.shape, self._proxy_scale, DETECT_MIN_SIZE, config.DETECT_MIN_FACE_FRACTION)
+                    size_limits = {"minSize": min_size, "maxSize": max_size}
+                    self._min_face_side = min_size[0] * self._proxy_scale
+                with stage_timer("detect"):
+                    # detectMultiScale2 vrne tudi število sosedov za vsak okvir (zanesljivost detekcije)
+                    detected, neighbors = self.face_cascade.detectMultiScale2(
+                        self.gray,
+                        scaleFactor=DETECT_SCALE_FACTOR,
+                        minNeighbors=DETECT_MIN_NEIGHBORS,
+                        **size_limits,
+                    )
+                detected = [tuple(int(v) for v in f) for f in detected]
+                neighbors = [int(n) for n in np.ravel(neighbors)] if len(detected) else []
+                if detected and self.detect_mode == "multires":
+                    # Polno ločljivost dekodiramo šele tukaj, ko je obraz najden
+                    detected = (map_boxes_to_full(detected, self.gray.shape, self.image_bgr.shape)
+                                if self.image_bgr is not None else [])
+                order = sorted(range(len(detected)), key=lambda i: detected[i][2] * detected[i][3], reverse=True)
+                self._faces = [detected[i] for i in order]
+                self._neighbors = [neighbors[i] for i in order]
+        return self._faces
+
+    def use_known_face(self, face_box: Optional[Tuple[int, int, int, int]], quality: Optional[dict] = None):
+        """Nastavi že znan okvir obraza in oceno kakovosti (npr. iz predpomnilnika), detekcija se ne izvede."""
+        self._faces = [tuple(face_box)] if face_box is not None else []
+        self._neighbors = []
+        self._quality = quality
+        self._quality_done = quality is not None
+
+    @property
+    def face_box(self) -> Optional[Tuple[int, int, int, int]]:
+        """Okvir največjega obraza ali None."""
+        return self.faces[0] if self.faces else None
+
+    # --- Kakovost ---
+
+    @property
+    def quality(self) -> Optional[dict]:
+        """Ocene kakovosti največjega obraza (glej face_processing/quality.py) ali None, če obraza ni."""
+        if not self._quality_done:
+            self._quality_done = True
+            if self.face_box is not None:
+                with stage_timer("quality"):
+                    self._quality = score_face_quality(
+                        self.image_bgr, self.face_box, self._min_face_side,
+                        self._neighbors[0] if self._neighbors else None)
+        return self._quality
+
+    @property
+    def quality_error(self) -> Optional[str]:
+        """Koda napake, če obraz ne dosega mej kakovosti (in je ocena vklopljena), sicer None."""
+        if not config.QUALITY_GATE_ENABLED:
+            return None
+        return quality_error(self.quality)
+
+    def _padded_box(self):
+        x, y, w, h = self.face_box
+        img_h, img_w = self.image_bgr.shape[:2]
+        pad_h = int(h * FACE_PADDING_H)
+        pad_w = int(w * FACE_PADDING_W)
+        x1, y1 = max(0, x - pad_w), max(0, y - pad_h)
+        x2, y2 = min(img_w, x + w + pad_w), min(img_h, y + h + pad_h)
+        if x2 <= x1 or y2 <= y1:
+            return x, y, w, h
+        return x1, y1, x2 - x1, y2 - y1
+
+    # --- Izrezi ---
+
+    def face_crop(self, size: int, padded: bool = False) -> Optional[np.ndarray]:
+        """
+        Izrez največjega obraza (RGB, uint8), pomanjšan na size x size.
+        :param padded: Če je True, se okoli obraza doda rob (za FaceNet).
+        """
+        key = (size, padded)
+        if key not in self._crops:
+            if self.face_box is None:
+                return None
+            x, y, w, h = self._padded_box() if padded else self.face_box
+            cropped = self.image_bgr[y:y + h, x:x + w]
+            if cropped.size == 0:
+                return None
+            with stage_timer("preprocess"):
+                # Barvno pretvorbo naredimo samo na izrezu, ne na celotni (lahko 12 MP) sliki
+                resized = cv2.resize(cropped, (size, size), interpolation=cv2.INTER_AREA)
+                self._crops[key] = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
+        return self._crops[key]
+
+    def face_input(self, size: int, padded: bool = False) -> Optional[np.ndarray]:
+        """Izrez obraza, normaliziran na [0, 1] float32 (vhod za modele)."""
+        key = (size, padded)
+        if key not in self._inputs:
+            crop = self.face_crop(size, padded=padded)
+            if crop is None:
+                return None
+            self._inputs[key] = crop.astype(np.float32) / 255.0
+        return self._inputs[key]
@@ -0,0 +1,563 @@
+"""
+Transport-independent face registration/verification logic.
+
+Both the Flask app (face_recognition_api.py) and the ASGI app
+(face_recognition_asgi.py) validate the request themselves and call into these
+functions for the CPU-heavy part (decode, detection, augmentation, inference,
+matching). Every function returns a (payload, http_status) tuple.
+
+Both apps also share the admission controller: at most
+ADMISSION_MAX_IN_FLIGHT inference requests per process, the rest get a fast
+503 (overloaded()). Work whose client deadline (X-Request-Timeout-Ms) has
+passed is dropped before inference and answered with 504.
+
+Startup is cheap: the embedding backend, FaceNet (TensorFlow) and
+albumentations are imported and loaded by warm_up(), normally in a background
+thread started with start_warmup(). get_readiness() reports when inference is hot.
+"""
+import threading
+import time
+
+import numpy as np
+
+from src import config
+from api import face_embedder
+from api.admission import AdmissionController, DeadlineExceeded, check_deadline
+from api.face_embedder import (
+    get_embeddings_from_pipelines,
+    create_face_pipeline,
+)
+from face_processing.quality import QUALITY_ERRORS
+from src.metrics import stage_timer, record_no_face, record_verification, record_rejected
+from user_management.db import (
+    register_user_embeddings,
+    verify_user_by_embeddings,
+    verify_users_by_embeddings,
+    is_user_registered,
+    delete_user,
+    identify_by_embedding,
+    is_read_only,
+    VERIFICATION_THRESHOLD,
+)
+
+# Registration-only dependencies (keras_facenet pulls in TensorFlow, plus albumentations).
+# None until _load_face_processing() has run.
+FACE_PROCESSING_AVAILABLE = None
+_augmentation = None
+_facenet = None
+_face_processing_lock = threading.Lock()
+
+_readiness = {"status": "starting", "error": None, "warmup_seconds": None}
+_readiness_lock = threading.Lock()
+
+admission = AdmissionController(config.ADMISSION_MAX_IN_FLIGHT, config.ADMISSION_RETRY_AFTER_S)
+
+
+def _load_face_processing():
+    """Import the augmentation/FaceNet modules once; returns FACE_PROCESSING_AVAILABLE."""
+    global FACE_PROCESSING_AVAILABLE, _augmentation, _facenet
+    if FACE_PROCESSING_AVAILABLE is not None:
+        return FACE_PROCESSING_AVAILABLE
+
+    with _face_processing_lock:
+        if FACE_PROCESSING_AVAILABLE is not None:
+            return FACE_PROCESSING_AVAILABLE
+        if not config.REGISTER_AUGMENTATION:
+            print("Augmentation disabled (FACE_REGISTER_AUGMENTATION=0), using single embedding only.")
+            FACE_PROCESSING_AVAILABLE = False
+            return False
+        try:
+            from face_processing import augmentation, embedding_model
+
+            embedding_model.initialize_embedding_model()
+            _augmentation, _facenet = augmentation, embedding_model
+            FACE_PROCESSING_AVAILABLE = True
+        except ImportError as face_import_error:
+            print(f"Warning: Face processing modules not available: {face_import_error}")
+            print("Augmentation will be disabled, using single embedding only.")
+            FACE_PROCESSING_AVAILABLE = False
+    return FACE_PROCESSING_AVAILABLE
+
+
+def warm_up():
+    """
+    Load every model and run a dummy forward pass through each, so the first
+    real request does not pay for it. Blocks; see start_warmup().
+    """
+    with _readiness_lock:
+        _readiness.update(status="warming", error=None)
+    start = time.perf_counter()
+    try:
+        face_embedder.warm_up()
+        if _load_face_processing():
+            dummy_face = np.zeros(_facenet.EXPECTED_EMBEDDING_SHAPE + (3,), dtype=np.float32)
+            _facenet.get_face_embeddings_batch(
+                _augmentation.generate_augmented_faces(dummy_face) or [dummy_face]
+            )
+    except Exception as e:
+        print(f"Warm-up failed: {e}")
+        with _readiness_lock:
+            _readiness.update(status="failed", error=str(e))
+        return False
+
+    elapsed = time.perf_counter() - start
+    with _readiness_lock:
+        _readiness.update(status="ready", warmup_seconds=round(elapsed, 3))
+    print(f"Models warm after {elapsed:.1f}s (backend: {face_embedder.get_backend_name()}, "
+          f"augmentation: {FACE_PROCESSING_AVAILABLE})")
+    return True
+
+
+def start_warmup():
+    """Run warm_up() in a background thread, unless it is already running or done."""
+    with _readiness_lock:
+        if _readiness["status"] in ("warming", "ready"):
+            return
+        _readiness["status"] = "warming"
+    threading.Thread(target=warm_up, name="model-warmup", daemon=True).start()
+
+
+def get_readiness():
+    """Readiness probe: 200 once inference is hot, 503 while starting/warming or after a failure."""
+    with _readiness_lock:
+        state = dict(_readiness)
+    ready = state["status"] == "ready"
+    return {
+        "ready": ready,
+        "status": state["status"],
+        "error": state["error"],
+        "warmup_seconds": state["warmup_seconds"],
+        "embedding_backend": face_embedder.get_backend_name(),
+        "augmentation": FACE_PROCESSING_AVAILABLE,
+    }, 200 if ready else 503
+
+
+def overloaded():
+    """Response for a request rejected by admission control; send it with a Retry-After header."""
+    record_rejected("overload")
+    return {
+        "success": False,
+        "message": "Server is overloaded, retry later",
+        "retry_after_s": admission.retry_after_s,
+    }, 503
+
+
+def _read_only_replica():
+    """Response for a write sent to a follower replica (FACE_REPLICATION_ROLE=follower)."""
+    return {
+        "success": False,
+        "message": "This node is a read-only replica; send registrations and deletions to the leader",
+    }, 503
+
+
+def _deadline_exceeded(results):
+    """Fill every unanswered item with a 504; nothing was stored or verified for them."""
+    if any(result is None for result in results):
+        record_rejected("deadline")
+    payload = {"success": False, "message": "Request deadline exceeded"}, 504
+    return [payload if result is None else result for result in results]
+
+
+def _no_embedding(pipeline, endpoint):
+    """
+    Response for an image that produced no embedding: 400 when no face was found,
+    422 with an error_code and the quality scores when the face failed the quality gate.
+    """
+    error_code = pipeline.quality_error if pipeline.face_box is not None else None
+    if error_code is None:
+        record_no_face(endpoint)
+        return {"success": False, "message": "No face detected in image"}, 400
+    return {
+        "success": False,
+        "message": QUALITY_ERRORS[error_code],
+        "error_code": error_code,
+        "quality": pipeline.quality,
+    }, 422
+
+
+def register_face_image(user_id, image_bytes):
+    """Compute embeddings (with augmentations when available) and register the user."""
+    return register_faces_batch([(user_id, image_bytes)])[0]
+
+
+def verify_face_image(user_id, image_bytes):
+    """Embed the uploaded face and match it against the user's stored embeddings."""
+    return verify_faces_batch([(user_id, image_bytes)])[0]
+
+
+def register_faces_batch(items):
+    """
+    Register many users at once.
+    :param items: list of (user_id, image_bytes) pairs.
+    :return: list of (payload, status) tuples, one per item, in the same order.
+
+    All faces go through the custom model together (via the micro-batcher) and
+    all augmentations of all items go through FaceNet in a single call.
+    """
+    if is_read_only():
+        return [_read_only_replica() for _ in items]
+
+    results = [None] * len(items)
+    pending = []
+    seen_user_ids = set()
+    for i, (user_id, image_bytes) in enumerate(items):
+        if not user_id:
+            results[i] = {"success": False, "message": "user_id is required"}, 400
+        elif user_id in seen_user_ids or is_user_registered(user_id):
+            results[i] = {
+                "success": False,
+                "message": "User already registered. Use update endpoint to modify.",
+            }, 409
+        elif not image_bytes:
+            results[i] = {"success": False, "message": "No image file provided"}, 400
+        else:
+            seen_user_ids.add(user_id)
+            pending.append(i)
+
+    # Decode and face detection happen once per image; every step below reads from the pipelines
+    pipelines = {}
+    for i in pending:
+        try:
+            pipelines[i] = create_face_pipeline(items[i][1])
+        except Exception as e:
+            results[i] = _item_failed("Registration", items[i][0], e)
+    pending = [i for i in pending if i in pipelines]
+
+    try:
+        embeddings = get_embeddings_from_pipelines([pipelines[i] for i in pending])
+    except DeadlineExceeded:
+        return _deadline_exceeded(results)
+    except Exception as e:
+        # The model call is shared by the whole batch, so every pending item fails with it
+        for i in pending:
+            results[i] = _item_failed("Registration", items[i][0], e)
+        return results
+
+    base_embeddings = {}
+    for i, embedding in zip(pending, embeddings):
+        if embedding is None:
+            results[i] = _no_embedding(pipelines[i], "register")
+        else:
+            base_embeddings[i] = embedding
+
+    augmented = {}
+    if base_embeddings and _load_face_processing():
+        face_size = _facenet.EXPECTED_EMBEDDING_SHAPE[0]
+        for i in list(base_embeddings):
+            face_processed = pipelines[i].face_input(face_size, padded=True)
+            if face_processed is None:
+                results[i] = {"success": False, "message": "Failed to preprocess face"}, 400
+                del base_embeddings[i]
+        try:
+            augmented = _embed_augmentations(
+                {i: pipelines[i].face_input(face_size, padded=True) for i in base_embeddings}
+            )
+        except DeadlineExceeded:
+            return _deadline_exceeded(results)
+
+    for i, embedding in base_embeddings.items():
+        try:
+            results[i] = _store_registration(items[i][0], embedding, augmented.get(i))
+        except Exception as e:
+            results[i] = _item_failed("Registration", items[i][0], e)
+
+    return results
+
+
+def _item_failed(action, user_id, error):
+    """500 result for one batch item; the other items keep their own status."""
+    print(f"{action} error for user {user_id}: {error}")
+    return {"success": False, "message": f"{action} failed: {str(error)}"}, 500
+
+
+def _embed_augmentations(faces_by_item):
+    """
+    Augment every face and embed all augmentations in one FaceNet call.
+    :return: dict item index -> list of embeddings; items whose augmentation or its
+        embedding failed are missing.
+    """
+    faces, owners = [], []
+    embeddings_by_item = {}
+    for i, face_processed in faces_by_item.items():
+        try:
+            with stage_timer("augment"):
+                augmented_faces = _augmentation.generate_augmented_faces(face_processed)
+        except Exception as e:
+            print(f"Error during augmentation: {e}")
+            continue
+        embeddings_by_item[i] = []
+        faces.extend(augmented_faces)
+        owners.extend([i] * len(augmented_faces))
+
+    if not faces:
+        return embeddings_by_item
+
+    check_deadline()
+    # All augmentations go through the model in a single forward pass
+    aug_embeddings = _facenet.get_face_embeddings_batch(faces)
+    if aug_embeddings is None or len(aug_embeddings) != len(faces):
+        print("Error during augmentation: batched embedding of augmented faces failed")
+        failed = set(owners)
+        return {i: embeddings for i, embeddings in embeddings_by_item.items() if i not in failed}
+    for i, aug_embedding in zip(owners, aug_embeddings):
+        embeddings_by_item[i].append(aug_embedding)
+    return embeddings_by_item
+
+
+def _store_registration(user_id, embedding, aug_embeddings):
+    """Persist the embeddings for one user and build the response."""
+    if not FACE_PROCESSING_AVAILABLE:
+        message = f"User {user_id} registered with single embedding"
+        embeddings_list = [embedding]
+    elif aug_embeddings is None:
+        message = f"User {user_id} registered with single embedding (augmentation failed)"
+        embeddings_list = [embedding]
+    else:
+        message = f"User {user_id} registered successfully"
+        embeddings_list = [embedding] + list(aug_embeddings)
+
+    embeddings_np = [np.array(emb, dtype=np.float32) for emb in embeddings_list]
+    register_user_embeddings(user_id, embeddings_np)
+
+    return {
+        "success": True,
+        "message": message,
+        "embeddings_count": len(embeddings_np),
+    }, 200
+
+
+def verify_faces_batch(items):
+    """
+    Verify many (user_id, image_bytes) pairs at once.
+    :return: list of (payload, status) tuples, one per item, in the same order.
+    """
+    results = [None] * len(items)
+    pending = []
+    for i, (user_id, image_bytes) in enumerate(items):
+        if not user_id:
+            results[i] = {"success": False, "message": "user_id is required"}, 400
+        elif not is_user_registered(user_id):
+            results[i] = {"success": False, "message": "User not registered"}, 404
+        elif not image_bytes:
+            results[i] = {"success": False, "message": "No image file provided"}, 400
+        else:
+            pending.append(i)
+
+    pipelines = {i: create_face_pipeline(items[i][1]) for i in pending}
+    try:
+        embeddings = get_embeddings_from_pipelines([pipelines[i] for i in pending])
+    except DeadlineExceeded:
+        return _deadline_exceeded(results)
+
+    embedded = []
+    for i, embedding in zip(pending, embeddings):
+        if embedding is None:
+            results[i] = _no_embedding(pipelines[i], "verify")
+        else:
+            embedded.append((i, embedding[0]))
+
+    # One matrix product per user for all of that user's queries
+    matches = verify_users_by_embeddings([(items[i][0], embedding) for i, embedding in embedded])
+    for (i, _), (is_verified, similarity_score) in zip(embedded, matches):
+        record_verification(is_verified)
+        results[i] = {
+            "success": True,
+            "verified": is_verified,
+            "similarity_score": float(similarity_score),
+            "threshold": VERIFICATION_THRESHOLD,
+            "quality": pipelines[i].quality,
+            "message": (
+                "Verification successful" if is_verified else "Verification failed"
+            ),
+        }, 200
+
+    return results
+
+
+class BurstVerification:
+    """
+    Verify one user from a short burst of camera frames, in arrival order.
+
+    Frames are embedded a group at a time through the batched path and the
+    group is scored with one verify_user_by_embeddings call. Processing stops at the first frame that
+    clears VERIFICATION_THRESHOLD or once max_frames frames were used, so a
+    locker camera can send a few frames in one request instead of retrying
+    /verify on bad ones. Frames can be added as they arrive (MJPEG stream).
+
+    Frames that fail the quality gate are skipped without inference; every
+    frame's quality scores are reported, together with the best one.
+    """
+
+    def __init__(self, user_id, max_frames=None):
+        self.user_id = user_id
+        self.max_frames = max_frames or config.BURST_MAX_FRAMES
+        self.frames = []  # Per-frame summary, in processing order
+        self.matched_frame = None
+        self.best_score = None
+        self.deadline_exceeded = False
+
+    @property
+    def done(self):
+        return (
+            self.matched_frame is not None
+            or self.deadline_exceeded
+            or len(self.frames) >= self.max_frames
+        )
+
+    def add_frames(self, frames):
+        """Embed and score the next frames; returns True once no more frames are needed."""
+        frames = list(frames)[: max(0, self.max_frames - len(self.frames))]
+        if self.done or not frames:
+            return self.done
+
+        pipelines = [create_face_pipeline(f) for f in frames]
+        try:
+            embeddings = get_embeddings_from_pipelines(pipelines)
+        except DeadlineExceeded:
+            self.deadline_exceeded = True
+            return True
+
+        scored = [embedding[0] for embedding in embeddings if embedding is not None]
+        matches = iter(verify_user_by_embeddings(self.user_id, scored)) if scored else iter(())
+
+        for pipeline, embedding in zip(pipelines, embeddings):
+            index = len(self.frames)
+            frame = {
+                "index": index,
+                "face_detected": pipeline.face_box is not None,
+                "quality": pipeline.quality,
+                "similarity_score": None,
+            }
+            self.frames.append(frame)
+            if embedding is None:
+                if pipeline.face_box is None:
+                    record_no_face("verify_burst")
+                else:
+                    frame["error_code"] = pipeline.quality_error
+                continue
+
+            is_verified, similarity_score = next(matches)
+            frame["similarity_score"] = similarity_score
+            if self.best_score is None or similarity_score > self.best_score:
+                self.best_score = similarity_score
+            if is_verified:
+                # Early exit: the rest of the group is not scored
+                self.matched_frame = index
+                break
+        return self.done
+
+    def result(self):
+        """(payload, status) for the frames processed so far."""
+        if self.deadline_exceeded:
+            return _deadline_exceeded([None])[0]
+        if not self.frames:
+            return {"success": False, "message": "No frames provided"}, 400
+        if self.best_score is None:
+            rejected = [f for f in self.frames if f.get("error_code")]
+            if rejected:
+                # Faces were found, but none was good enough to embed; report the best of them
+                best = max(rejected, key=lambda f: f["quality"]["score"])
+                return {
+                    "success": False,
+                    "message": QUALITY_ERRORS[best["error_code"]],
+                    "error_code": best["error_code"],
+                    "best_quality_frame": best["index"],
+                    "frames_processed": len(self.frames),
+                    "frames": self.frames,
+                }, 422
+            return {
+                "success": False,
+                "message": "No face detected in any frame",
+                "frames_processed": len(self.frames),
+            }, 400
+
+        is_verified = self.matched_frame is not None
+        record_verification(is_verified)
+        return {
+            "success": True,
+            "verified": is_verified,
+            "similarity_score": self.best_score,
+            "threshold": VERIFICATION_THRESHOLD,
+            "matched_frame": self.matched_frame,
+            "best_quality_frame": self._best_quality_frame(),
+            "frames_processed": len(self.frames),
+            "frames": self.frames,
+            "message": (
+                "Verification successful" if is_verified else "Verification failed"
+            ),
+        }, 200
+
+    def _best_quality_frame(self):
+        scored = [f for f in self.frames if f["quality"] is not None]
+        return max(scored, key=lambda f: f["quality"]["score"])["index"] if scored else None
+
+
+def verify_face_burst(user_id, frames):
+    """Burst verification over already uploaded frames, BURST_CHUNK_SIZE frames per model call."""
+    burst = BurstVerification(user_id)
+    chunk_size = max(1, config.BURST_CHUNK_SIZE)
+    for start in range(0, len(frames), chunk_size):
+        if burst.add_frames(frames[start:start + chunk_size]):
+            break
+    return burst.result()
+
+
+def identify_face_image(image_bytes, top_k=5):
+    """1:N identification: the top_k most similar registered users for the uploaded face."""
+    pipeline = create_face_pipeline(image_bytes)
+    try:
+        embedding = get_embeddings_from_pipelines([pipeline])[0]
+    except DeadlineExceeded:
+        return _deadline_exceeded([None])[0]
+    if embedding is None:
+        return _no_embedding(pipeline, "identify")
+
+    matches = identify_by_embedding(embedding[0], top_k=top_k)
+    best = matches[0] if matches and matches[0][1] >= VERIFICATION_THRESHOLD else None
+
+    return {
+        "success": True,
+        "identified": best is not None,
+        "user_id": best[0] if best else None,
+        "threshold": VERIFICATION_THRESHOLD,
+        "matches": [
+            {
+                "user_id": user_id,
+                "similarity_score": score,
+                "is_match": score >= VERIFICATION_THRESHOLD,
+            }
+            for user_id, score in matches
+        ],
+    }, 200
+
+
+def batch_response(items, results):
+    """Combine per-item (payload, status) tuples into one batch response payload."""
+    return {
+        "success": True,
+        "count": len(results),
+        "results": [
+            dict(payload, index=i, user_id=items[i][0], status=status)
+            for i, (payload, status) in enumerate(results)
+        ],
+    }
+
+
+def get_user_status(user_id):
+    """Registration status of a user."""
+    return {
+        "success": True,
+        "user_id": user_id,
+        "is_registered": is_user_registered(user_id),
+    }, 200
+
+
+def delete_user_face(user_id):
+    """Delete a user's face registration."""
+    if is_read_only():
+        return _read_only_replica()
+    if not is_user_registered(user_id):
+        return {"success": False, "message": "User not registered"}, 404
+
+    delete_user(user_id)
+    return {"success": True, "message": f"User {user_id} deleted successfully"}, 200
@@ -0,0 +1,123 @@
+# api/frame_stream.py
+"""
+Branje zaporedja slik iz MJPEG toka (multipart/x-mixed-replace), kot ga pošilja
+kamera na paketniku.
+
+Telo zahtevka je zaporedje delov, ločenih z mejo (boundary) iz glave
+Content-Type:
+
+    --frame\r\n
+    Content-Type: image/jpeg\r\n
+    Content-Length: 48213\r\n
+    \r\n
+    <JPEG bajti>\r\n
+    --frame\r\n
+    ...
+    --frame--\r\n
+
+Razčlenjevalnik je inkrementalen: `feed` sprejme poljuben kos telesa, kot ga
+prebere strežnik, in vrne slike, ki so v celoti prispele, zato jih API lahko
+obdela, še preden je tok končan. Content-Length dela ni obvezen; brez njega se
+slika konča pri naslednji meji.
+"""
+from typing import List, Optional
+
+STREAM_CONTENT_TYPE = "multipart/x-mixed-replace"
+
+
+def boundary_from_content_type(content_type: str) -> Optional[str]:
+    """Meja iz glave Content-Type (npr. 'multipart/x-mixed-replace; boundary=frame') ali None."""
+    for param in content_type.split(";")[1:]:
+        key, _, value = param.strip().partition("=")
+        if key.lower() == "boundary" and value:
+            return value.strip('"')
+    return None
+
+
+class MultipartFrameParser:
+    """Inkrementalni razčlenjevalnik multipart/x-mixed-replace toka na posamezne slike."""
+
+    def __init__(self, boundary: str, max_frame_bytes: int):
+        self._delimiter = b"--" + boundary.encode("latin-1")
+        self.max_frame_bytes = int(max_frame_bytes)
+        self._buffer = bytearray()
+        self.finished = False
+
+    def feed(self, data: bytes) -> List[bytes]:
+        """
+        Doda naslednji kos telesa in vrne vse slike, ki so v celoti prispele.
+        Sproži ValueError, če je posamezna slika večja od max_frame_bytes.
+        """
+        if self.finished:
+            return []
+        self._buffer += data
+        frames = []
+        while True:
+            frame = self._next_frame()
+            if frame is None:
+                break
+            frames.append(frame)
+        # Nepopolna slika v medpomnilniku ne sme rasti brez meje
+        if len(self._buffer) > self.max_frame_bytes + 4096:
+            raise ValueError(f"Frame larger than {self.max_frame_bytes} bytes")
+        return frames
+
+    def close(self) -> List[bytes]:
+        """Konec toka: vrne zadnjo sliko, če tok ni bil zaključen z zaključno mejo."""
+        if self.finished:
+            return []
+        self.finished = True
+        parsed = self._parse_part_start()
+        if parsed is None:
+            return []
+        body_start, _ = parsed
+        frame = bytes(self._buffer[body_start:]).rstrip(b"\r\n")
+        self._buffer.clear()
+        return [frame] if frame else []
+
+    def _parse_part_start(self):
+        """(začetek telesa, Content-Length ali None) za del na začetku medpomnilnika ali None."""
+        buf = self._buffer
+        start = buf.find(self._delimiter)
+        if start < 0:
+            return None
+        after = start + len(self._delimiter)
+        if len(buf) < after + 2:
+            return None
+        if buf[after:after + 2] == b"--":
+            # Zaključna meja
+            self.finished = True
+            self._buffer.clear()
+            return None
+        header_end = buf.find(b"\r\n\r\n", after)
+        if header_end < 0:
+            return None
+
+        content_length = None
+        for line in bytes(buf[after:header_end]).split(b"\r\n"):
+            name, _, value = line.partition(b":")
+            if name.strip().lower() == b"content-length":
+                try:
+                    content_length = int(value.strip())
+                except ValueError:
+                    pass
+        return header_end + 4, content_length
+
+    def _next_frame(self) -> Optional[bytes]:
+        parsed = self._parse_part_start()
+        if parsed is None:
+            return None
+        body_start, content_length = parsed
+        if content_length is not None:
+            if content_length > self.max_frame_bytes:
+                raise ValueError(f"Frame larger than {self.max_frame_bytes} bytes")
+            body_end = body_start + content_length
+            if len(self._buffer) < body_end:
+                return None
+        else:
+            body_end = self._buffer.find(b"\r\n" + self._delimiter, body_start)
+            if body_end < 0:
+                return None
+        frame = bytes(self._buffer[body_start:body_end])
+        del self._buffer[:body_end]
+        return frame
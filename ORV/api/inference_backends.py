@@ -0,0 +1,133 @@
+# api/inference_backends.py
+import os
+
+import numpy as np
+
+from src import config
+
+
+class KerasBackend:
+    """Izvajanje embedding modela s TensorFlow/Keras (.keras datoteka)."""
+
+    name = "keras"
+    model_filename = config.EMBEDDING_MODEL_NAME
+    # TensorFlow po fork-u ne deluje (niti thread poolov ne preživijo), model naložimo v delavcu
+    fork_safe = False
+
+    def __init__(self, model_path):
+        self.model_path = model_path
+        # TensorFlow uvozimo šele tukaj, da ga ONNX backend sploh ne naloži
+        import tensorflow as tf
+        from src.model_definition import l2_normalize_layer_func
+
+        # Omejitev TF niti (serve.py), preden TF izvede prvo operacijo
+        try:
+            if config.TF_INTRA_OP_THREADS > 0:
+                tf.config.threading.set_intra_op_parallelism_threads(config.TF_INTRA_OP_THREADS)
+            if config.TF_INTER_OP_THREADS > 0:
+                tf.config.threading.set_inter_op_parallelism_threads(config.TF_INTER_OP_THREADS)
+        except RuntimeError as e:
+            print(f"OPOZORILO: Števila TF niti ni mogoče nastaviti (runtime že teče): {e}")
+
+        tf.keras.config.enable_unsafe_deserialization()
+        self._model = tf.keras.models.load_model(
+            model_path,
+            custom_objects={'l2_normalize_layer_func': l2_normalize_layer_func},
+            compile=False
+        )
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        # `predict` ima velik fiksni strošek na klic (izgradnja data pipeline-a),
+        # zato uporabimo `predict_on_batch`.
+        return np.asarray(self._model.predict_on_batch(batch))
+
+
+class OnnxBackend:
+    """Izvajanje embedding modela z ONNX Runtime na CPU (izvoz: src/export_onnx_model.py)."""
+
+    name = "onnx"
+    model_filename = config.ONNX_MODEL_NAME
+    fork_safe = True
+
+    def __init__(self, model_path):
+        self.model_path = model_path
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if config.TF_INTRA_OP_THREADS > 0:
+            options.intra_op_num_threads = config.TF_INTRA_OP_THREADS
+        if config.TF_INTER_OP_THREADS > 0:
+            options.inter_op_num_threads = config.TF_INTER_OP_THREADS
+
+        self._session = ort.InferenceSession(model_path, sess_options=options,
+                                             providers=["CPUExecutionProvider"])
+        self._input_name = self._session.get_inputs()[0].name
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return self._session.run(None, {self._input_name: batch.astype(np.float32, copy=False)})[0]
+
+
+class TfliteBackend:
+    """Izvajanje INT8 kvantiziranega modela s TFLite interpreterjem (izvoz: src/quantize_model.py)."""
+
+    name = "tflite"
+    model_filename = config.TFLITE_INT8_MODEL_NAME
+    fork_safe = False
+
+    def __init__(self, model_path):
+        self.model_path = model_path
+        # Na edge napravah zadošča LiteRT (ali starejši tflite_runtime), sicer uporabimo TensorFlow
+        try:
+            from ai_edge_litert.interpreter import Interpreter
+        except ImportError:
+            try:
+                from tflite_runtime.interpreter import Interpreter
+            except ImportError:
+                import tensorflow as tf
+                Interpreter = tf.lite.Interpreter
+
+        num_threads = config.TF_INTRA_OP_THREADS if config.TF_INTRA_OP_THREADS > 0 else None
+        self._interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        self._input_index = self._interpreter.get_input_details()[0]['index']
+        self._output_index = self._interpreter.get_output_details()[0]['index']
+        self._batch_size = None
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        # Tenzorje prerazporedimo samo, ko se spremeni velikost batcha
+        if len(batch) != self._batch_size:
+            self._interpreter.resize_tensor_input(self._input_index, batch.shape)
+            self._interpreter.allocate_tensors()
+            self._batch_size = len(batch)
+        self._interpreter.set_tensor(self._input_index, batch.astype(np.float32, copy=False))
+        self._interpreter.invoke()
+        return self._interpreter.get_tensor(self._output_index).copy()
+
+
+BACKENDS = {
+    KerasBackend.name: KerasBackend,
+    OnnxBackend.name: OnnxBackend,
+    TfliteBackend.name: TfliteBackend,
+}
+
+
+def model_version(backend) -> str:
+    """Oznaka različice naloženega modela (backend, datoteka, velikost, čas spremembe)."""
+    stat = os.stat(backend.model_path)
+    return f"{backend.name}:{os.path.basename(backend.model_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def is_fork_safe(name: str) -> bool:
+    """Ali je backend mogoče naložiti v glavnem procesu pred fork-om delavcev."""
+    return name in BACKENDS and BACKENDS[name].fork_safe
+
+
+def load_backend(name: str, model_dir: str):
+    """Ustvari izbrani backend (config.EMBEDDING_BACKEND) z modelom iz `model_dir`."""
+    if name not in BACKENDS:
+        raise ValueError(f"Neznan backend '{name}'. Možnosti: {', '.join(BACKENDS)}")
+    backend_cls = BACKENDS[name]
+    model_path = os.path.join(model_dir, backend_cls.model_filename)
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"Model za backend '{name}' ni najden na poti: {model_path}")
+    return backend_cls(model_path)
@@ -0,0 +1,135 @@
+import cv2
+import numpy as np
+import os
+
+from src import config
+from src.metrics import stage_timer
+from face_processing.proxy_detection import fit_to_max_side, detection_size_limits, map_boxes_to_full
+from face_processing.quality import score_face_quality, quality_error
+
+# Pot do Haar kaskade
+# Pravilna pot glede na strukturo projekta: ../models_data/
+script_dir = os.path.dirname(os.path.abspath(__file__))
+CASCADE_PATH = os.path.join(script_dir, '..', 'models_data', 'haarcascade_frontalface_default.xml')
+
+if not os.path.exists(CASCADE_PATH):
+    # Poskusimo najti v standardni poti OpenCV, če ni lokalno
+    cv2_base_dir = os.path.dirname(os.path.abspath(cv2.__file__))
+    haar_cascade_path_cv2 = os.path.join(cv2_base_dir, 'data', 'haarcascade_frontalface_default.xml')
+    if os.path.exists(haar_cascade_path_cv2):
+        CASCADE_PATH = haar_cascade_path_cv2
+        print(f"Using Haar cascade from OpenCV data folder: {CASCADE_PATH}")
+    else:
+        raise FileNotFoundError(
+            f"Haar cascade file not found. Expected at {CASCADE_PATH} or {haar_cascade_path_cv2}. "
+            "Please download it from OpenCV's GitHub and place it in 'face_auth_project/models_data/' "
+            "or ensure OpenCV is correctly installed with data files."
+        )
+try:
+    face_cascade = cv2.CascadeClassifier(CASCADE_PATH)
+    if face_cascade.empty():
+        raise IOError(f"Could not load Haar cascade classifier from {CASCADE_PATH}")
+except Exception as e:
+    print(f"Error loading Haar cascade: {e}")
+    # V primeru napake, naj modul ne prepreči zagona, ampak funkcija vrne None
+    face_cascade = None
+
+
+def detect_face(image_np_bgr, check_quality=None):
+    """
+    Zazna največji obraz na sliki z Viola-Jones.
+    :param image_np_bgr: NumPy array slike (naložena z OpenCV, torej BGR format).
+    :param check_quality: Ali se obraz, ki ne doseže mej kakovosti (face_processing/quality.py),
+                          zavrne, kot da ga ni. Privzeto config.QUALITY_GATE_ENABLED.
+    :return: Izrezan obraz (NumPy array, BGR) ali None, če obraz ni najden.
+             Prav tako vrne koordinate (x, y, w, h) najdenega obraza ali None.
+    """
+    face_roi_bgr, face_box, quality = detect_face_with_quality(image_np_bgr)
+    if check_quality is None:
+        check_quality = config.QUALITY_GATE_ENABLED
+    if face_box is not None and check_quality:
+        error_code = quality_error(quality)
+        if error_code is not None:
+            print(f"Obraz zavrnjen zaradi kakovosti: {error_code} {quality}")
+            return None, None
+    return face_roi_bgr, face_box
+
+
+def detect_face_with_quality(image_np_bgr):
+    """
+    Kot detect_face, le da vrne še ocene kakovosti obraza in obraza ne zavrne.
+    :return: (izrez obraza, (x, y, w, h), slovar z ocenami) ali (None, None, None).
+    """
+    if face_cascade is None or face_cascade.empty():
+        print("Error: Face cascade classifier not loaded.")
+        return None, None, None
+
+    if image_np_bgr is None or image_np_bgr.size == 0:
+        print("Error: Input image to detect_face is empty or None.")
+        return None, None, None
+
+    # Pretvori v sivinsko sliko za detekcijo
+    if len(image_np_bgr.shape) == 3 and image_np_bgr.shape[2] == 3:
+        gray_image = cv2.cvtColor(image_np_bgr, cv2.COLOR_BGR2GRAY)
+    elif len(image_np_bgr.shape) == 2:  # Že sivinska
+        gray_image = image_np_bgr
+    else:
+        print(f"Error: Nepričakovana oblika slike za detect_face: {image_np_bgr.shape}")
+        return None, None, None
+
+    min_size = (60, 60)  # Povečamo minSize za bolj robustne detekcije na tipičnih slikah za prijavo
+    size_limits = {"minSize": min_size}
+    min_face_side = float(min_size[0])  # minSize v pikslih polne ločljivosti (za oceno kakovosti)
+    detection_image = gray_image
+    if config.DETECT_MODE == "multires":
+        # Kaskada teče na pomanjšani sliki, okvirje preslikamo nazaj na polno ločljivost
+        detection_image = fit_to_max_side(gray_image, config.DETECT_PROXY_MAX_SIDE)
+        scale_to_full = max(gray_image.shape) / max(detection_image.shape)
+        min_size, max_size = detection_size_limits(
+            detection_image.shape, scale_to_full, min_size, config.DETECT_MIN_FACE_FRACTION)
+        size_limits = {"minSize": min_size, "maxSize": max_size}
+        min_face_side = min_size[0] * scale_to_full
+
+    # Izenači histogram za boljšo odpornost na svetlobne razmere
+    detection_image = cv2.equalizeHist(detection_image)
+
+    with stage_timer("detect"):
+        # detectMultiScale2 vrne tudi število sosedov za vsak okvir (zanesljivost detekcije)
+        faces, neighbors = face_cascade.detectMultiScale2(
+            detection_image,
+            scaleFactor=1.1,
+            minNeighbors=5,
+            **size_limits,
+        )
+
+    if len(faces) == 0:
+        return None, None, None
+
+    if detection_image.shape != gray_image.shape:
+        faces = map_boxes_to_full(faces, detection_image.shape, gray_image.shape)
+
+    # Vrnemo največji obraz
+    largest = max(range(len(faces)), key=lambda i: faces[i][2] * faces[i][3])
+    x, y, w, h = (int(v) for v in faces[largest])
+    with stage_timer("quality"):
+        quality = score_face_quality(gray_image, (x, y, w, h), min_face_side, int(np.ravel(neighbors)[largest]))
+
+    # Izrežemo obraz iz originalne BGR slike
+    # Dodamo malo "paddinga" okoli obraza, da ne odrežemo preveč las/brade
+    padding_h = int(h * 0.15)  # 15% vertikalnega paddinga
+    padding_w = int(w * 0.10)  # 10% horizontalnega paddinga
+
+    y1 = max(0, y - padding_h)
+    y2 = min(image_np_bgr.shape[0], y + h + padding_h)
+    x1 = max(0, x - padding_w)
+    x2 = min(image_np_bgr.shape[1], x + w + padding_w)
+
+    face_roi_bgr = image_np_bgr[y1:y2, x1:x2]
+
+    if face_roi_bgr.shape[0] == 0 or face_roi_bgr.shape[1] == 0:
+        # V primeru, da padding povzroči neveljaven izrez (obraz na robu slike)
+        face_roi_bgr = image_np_bgr[y:y + h, x:x + w]  # Vrnemo brez paddinga
+        if face_roi_bgr.shape[0] == 0 or face_roi_bgr.shape[1] == 0:
+            return None, None, None  # Še vedno neveljaven
+
+    return face_roi_bgr, (x, y, w, h), quality
\ No newline at end of file
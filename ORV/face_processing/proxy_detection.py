@@ -0,0 +1,106 @@
+# face_processing/proxy_detection.py
+"""
+Večločljivostna detekcija obrazov za velike slike (telefoni, kamere).
+
+Namesto da Haar kaskada teče na polni ločljivosti (pri 12 MP daleč najdražji
+korak), sliko dekodiramo zmanjšano (IMREAD_REDUCED_*, pri JPEG se del dela
+preskoči že v dekoderju), jo pomanjšamo na omejeno velikost (proxy) in na njej
+poiščemo obraze. minSize/maxSize izpeljemo iz dimenzij slike, najdene okvirje
+pa preslikamo nazaj v koordinate polne ločljivosti, iz katere se obraz izreže.
+"""
+import io
+import math
+
+import cv2
+import numpy as np
+
+# Faktor zmanjšanja pri dekodiranju -> OpenCV zastavica
+REDUCED_DECODE_FLAGS = {
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    1: cv2.IMREAD_COLOR,
+}
+
+HAAR_WINDOW_SIZE = 24  # Velikost osnovnega okna kaskade haarcascade_frontalface_default
+
+
+def image_size_from_header(image_bytes):
+    """(širina, višina) iz glave slike brez dekodiranja pikslov, ali None."""
+    try:
+        from PIL import Image
+
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            return img.size
+    except Exception:
+        return None
+
+
+def choose_reduction(full_size, max_side):
+    """Največji faktor zmanjšanja, pri katerem daljša stranica ostane vsaj max_side."""
+    if full_size is None:
+        return 1
+    longest = max(full_size)
+    for factor in (8, 4, 2):
+        if longest / factor >= max_side:
+            return factor
+    return 1
+
+
+def fit_to_max_side(image, max_side):
+    """Pomanjša sliko, da daljša stranica ni večja od max_side (manjših slik ne spreminja)."""
+    h, w = image.shape[:2]
+    longest = max(h, w)
+    if longest <= max_side:
+        return image
+    scale = max_side / longest
+    return cv2.resize(image, (max(1, round(w * scale)), max(1, round(h * scale))),
+                      interpolation=cv2.INTER_AREA)
+
+
+def decode_for_detection(image_bytes, max_side):
+    """
+    Dekodira sliko v zmanjšani ločljivosti za detekcijo.
+    :return: (proxy BGR slika ali None, ocenjeno razmerje polna/proxy ločljivost)
+    """
+    full_size = image_size_from_header(image_bytes)
+    factor = choose_reduction(full_size, max_side)
+    nparr = np.frombuffer(image_bytes, np.uint8)
+    reduced = cv2.imdecode(nparr, REDUCED_DECODE_FLAGS[factor])
+    if reduced is None:
+        return None, 1.0
+    proxy = fit_to_max_side(reduced, max_side)
+    if full_size is not None:
+        scale_to_full = max(full_size) / max(proxy.shape[:2])
+    else:
+        scale_to_full = factor * max(reduced.shape[:2]) / max(proxy.shape[:2])
+    return proxy, scale_to_full
+
+
+def detection_size_limits(proxy_shape, scale_to_full, base_min_size, min_face_fraction):
+    """
+    minSize/maxSize za detectMultiScale na proxy sliki.
+    - minSize: base_min_size (podan v pikslih polne ločljivosti), preslikan na proxy, ali
+      min_face_fraction krajše stranice, karkoli je večje; nikoli manj od okna kaskade.
+    - maxSize: obraz ne more biti večji od krajše stranice slike.
+    """
+    short_side = min(proxy_shape[:2])
+    min_side = max(HAAR_WINDOW_SIZE,
+                   math.ceil(max(base_min_size) / scale_to_full),
+                   math.ceil(min_face_fraction * short_side))
+    min_side = min(min_side, short_side)
+    return (min_side, min_side), (short_side, short_side)
+
+
+def map_boxes_to_full(boxes, proxy_shape, full_shape):
+    """Preslika okvirje (x, y, w, h) s proxy slike v koordinate polne ločljivosti."""
+    scale_y = full_shape[0] / proxy_shape[0]
+    scale_x = full_shape[1] / proxy_shape[1]
+    mapped = []
+    for x, y, w, h in boxes:
+        x1 = min(full_shape[1] - 1, int(round(x * scale_x)))
+        y1 = min(full_shape[0] - 1, int(round(y * scale_y)))
+        x2 = min(full_shape[1], int(round((x + w) * scale_x)))
+        y2 = min(full_shape[0], int(round((y + h) * scale_y)))
+        mapped.append((x1, y1, max(1, x2 - x1), max(1, y2 - y1)))
+    return mapped
@@ -0,0 +1,91 @@
+# face_processing/quality.py
+"""
+Hitra ocena kakovosti zaznanega obraza, preden gre v model za embedding.
+
+Zamegljene, pretemne/preosvetljene, premajhne ali negotovo zaznane obraze
+zavrnemo že po detekciji, da zanje ne porabimo časa za inferenco (in pri
+registraciji za augmentacije s FaceNet). Ocene so poceni (nekaj ms):
+
+- blur: varianca Laplaceovega operatorja na sivinskem izrezu obraza,
+  pomanjšanem na QUALITY_FACE_SIZE (neodvisno od ločljivosti slike),
+- brightness: povprečna svetlost izreza (0-255),
+- size_ratio: širina obraza glede na najmanjši obraz detekcije (minSize),
+- neighbors: število sosednjih zadetkov kaskade (detectMultiScale2), ki so se
+  združili v ta okvir; več pomeni bolj zanesljivo detekcijo.
+
+`score` združi vse štiri v eno število med 0 in 1, da lahko pri več slikah
+(burst, batch) izberemo najboljšo.
+"""
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from src import config
+
+QUALITY_FACE_SIZE = 112
+
+# Koda napake -> sporočilo za API
+QUALITY_ERRORS = {
+    "FACE_TOO_BLURRY": "Face image is too blurry",
+    "FACE_UNDEREXPOSED": "Face image is too dark",
+    "FACE_OVEREXPOSED": "Face image is overexposed",
+    "FACE_TOO_SMALL": "Face is too small in the image",
+    "FACE_LOW_CONFIDENCE": "Face detection confidence is too low",
+}
+
+
+def score_face_quality(image_bgr: np.ndarray, face_box, min_face_side: float,
+                       neighbors: Optional[int] = None) -> Optional[dict]:
+    """
+    Ocene kakovosti za obraz `face_box` (x, y, w, h) na sliki.
+    :param min_face_side: minSize detekcije v pikslih iste slike.
+    :param neighbors: število sosedov iz detectMultiScale2 (None, če ni znano).
+    :return: slovar z ocenami ali None, če izrez ni veljaven.
+    """
+    x, y, w, h = face_box
+    crop = image_bgr[y:y + h, x:x + w]
+    if crop.size == 0:
+        return None
+    if crop.ndim == 3:
+        crop = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    crop = cv2.resize(crop, (QUALITY_FACE_SIZE, QUALITY_FACE_SIZE), interpolation=cv2.INTER_AREA)
+
+    blur = float(cv2.Laplacian(crop, cv2.CV_64F).var())
+    brightness = float(crop.mean())
+    size_ratio = float(w / min_face_side) if min_face_side > 0 else 1.0
+
+    # Vsaka ocena normirana na [0, 1]; 1 doseže pri dvakratni mejni vrednosti
+    parts = [
+        min(1.0, blur / (2 * config.QUALITY_MIN_BLUR)),
+        max(0.0, 1.0 - abs(brightness - 128.0) / 128.0),
+        min(1.0, size_ratio / (2 * config.QUALITY_MIN_SIZE_RATIO)),
+    ]
+    if neighbors is not None:
+        parts.append(min(1.0, neighbors / (2 * config.QUALITY_MIN_NEIGHBORS)))
+
+    return {
+        "blur": round(blur, 2),
+        "brightness": round(brightness, 2),
+        "size_ratio": round(size_ratio, 3),
+        "neighbors": int(neighbors) if neighbors is not None else None,
+        "score": round(float(np.mean(parts)), 4),
+    }
+
+
+def quality_error(quality: Optional[dict]) -> Optional[str]:
+    """Koda napake za prvo neizpolnjeno mejo (glej QUALITY_ERRORS) ali None, če je obraz dovolj dober."""
+    if quality is None:
+        return None
+    # Osvetlitev najprej: temna slika ima tudi nizko varianco Laplaceovega operatorja
+    if quality["brightness"] < config.QUALITY_MIN_BRIGHTNESS:
+        return "FACE_UNDEREXPOSED"
+    if quality["brightness"] > config.QUALITY_MAX_BRIGHTNESS:
+        return "FACE_OVEREXPOSED"
+    if quality["blur"] < config.QUALITY_MIN_BLUR:
+        return "FACE_TOO_BLURRY"
+    if quality["size_ratio"] < config.QUALITY_MIN_SIZE_RATIO:
+        return "FACE_TOO_SMALL"
+    if quality["neighbors"] is not None and quality["neighbors"] < config.QUALITY_MIN_NEIGHBORS:
+        return "FACE_LOW_CONFIDENCE"
+    return None
@@ -1,37 +1,20 @@
 import os
 import sys
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, g, request, jsonify, send_from_directory
 from flask_cors import CORS
-import numpy as np
-import cv2
 
 sys.path.append(os.path.join(os.path.dirname(__file__)))
 sys.path.append(os.path.join(os.path.dirname(__file__), "src"))
 
 try:
-    from api.face_embedder import get_embedding_from_image_bytes
-    from user_management.db import (
-        register_user_embeddings,
-        verify_user_by_embedding,
-        is_user_registered,
-        delete_user,
-        VERIFICATION_THRESHOLD,
-    )
-
-    try:
-        from face_processing.detection import detect_face
-        from face_processing.augmentation import generate_augmented_faces
-        from face_processing.embedding_model import (
-            initialize_embedding_model,
-            get_face_embedding,
-            preprocess_face_for_embedding,
-        )
-
-        FACE_PROCESSING_AVAILABLE = True
-    except ImportError as face_import_error:
-        print(f"Warning: Face processing modules not available: {face_import_error}")
-        print("Augmentation will be disabled, using single embedding only.")
-        FACE_PROCESSING_AVAILABLE = False
+    from src import config
+    from api.face_embedder import get_batching_stats, get_cache_stats
+    from src.metrics import render_metrics
+    from src.profiling import start_request_profile, end_request_profile
+    from api.admission import parse_deadline, start_deadline, end_deadline
+    from api.frame_stream import STREAM_CONTENT_TYPE, MultipartFrameParser
+    from api import face_service
+    from user_management.db import is_user_registered, persist_queue, store_sync, template_cache
 
 except ImportError as e:
     print(f"Import error: {e}")
@@ -41,20 +24,112 @@ except ImportError as e:
 app = Flask(__name__)
 CORS(app)
 
-print("Initializing face recognition models...")
-if FACE_PROCESSING_AVAILABLE:
-    initialize_embedding_model()
-print("Face recognition API ready!")
+# Models load and warm up in the background; /ready reports when inference is hot
+if config.API_WARMUP_ON_IMPORT:
+    face_service.start_warmup()
+
+# Endpoints that run inference and count against the in-flight limit
+INFERENCE_ENDPOINTS = {
+    "register_user_face",
+    "verify_user_face",
+    "register_user_faces_batch",
+    "verify_user_faces_batch",
+    "verify_user_face_burst",
+    "identify_user_face",
+}
+
+STREAM_READ_SIZE = 16 * 1024  # Small reads, so frames are scored as soon as they arrive
+
+
+@app.before_request
+def _admit_request():
+    """Admission control: fast 503 + Retry-After when too many inference requests are in flight"""
+    g.admitted = False
+    if request.endpoint not in INFERENCE_ENDPOINTS:
+        return None
+    if not face_service.admission.try_acquire():
+        payload, status = face_service.overloaded()
+        response = jsonify(payload)
+        response.status_code = status
+        response.headers["Retry-After"] = str(face_service.admission.retry_after_s)
+        return response
+    g.admitted = True
+    # Optional client deadline; work still queued when it passes is dropped before inference
+    g.deadline_token = start_deadline(parse_deadline(request.headers))
+    return None
+
+
+@app.teardown_request
+def _release_admission(exc):
+    if g.get("admitted"):
+        end_deadline(g.get("deadline_token"))
+        face_service.admission.release()
+
+
+@app.before_request
+def _start_profile():
+    """Opt-in per-request profiling (FACE_PROFILING=1 or a trusted X-Profile-Token header)"""
+    g.profile, g.profile_token = (
+        start_request_profile(request.endpoint, request.headers)
+        if request.method == "POST"
+        else (None, None)
+    )
+    if g.profile is not None:
+        g.profile.start_cprofile()
+
+
+@app.after_request
+def _attach_server_timing(response):
+    profile = g.get("profile")
+    if profile is not None:
+        profile.stop_cprofile()
+        response.headers["Server-Timing"] = profile.server_timing()
+    return response
+
+
+@app.teardown_request
+def _end_profile(exc):
+    end_request_profile(g.get("profile_token"))
 
 
 @app.route("/health", methods=["GET"])
 def health_check():
-    """Health check endpoint"""
+    """Health check endpoint (liveness only, does not touch the models)"""
     return jsonify(
         {"status": "healthy", "service": "Face Recognition API", "version": "1.0.0"}
     )
 
 
+@app.route("/ready", methods=["GET"])
+def readiness_check():
+    """Readiness probe: 200 once the models are loaded and warmed up, 503 before"""
+    payload, status = face_service.get_readiness()
+    return jsonify(payload), status
+
+
+@app.route("/stats", methods=["GET"])
+def inference_stats():
+    """Micro-batching, embedding cache, admission, store persistence/sync and template cache statistics"""
+    return jsonify(
+        {
+            "success": True,
+            "batching": get_batching_stats(),
+            "embedding_cache": get_cache_stats(),
+            "admission": face_service.admission.get_stats(),
+            "persistence": persist_queue.get_stats(),
+            "store_sync": store_sync.get_stats() if store_sync else None,
+            "template_cache": template_cache.get_stats() if template_cache else None,
+        }
+    )
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus metrics (per-stage latency histograms, result counters, store size)"""
+    body, content_type = render_metrics()
+    return Response(body, mimetype=content_type)
+
+
 @app.route("/register", methods=["POST"])
 def register_user_face():
     """
@@ -86,101 +161,8 @@ def register_user_face():
 
         image_bytes = image_file.read()
 
-        embedding_result = get_embedding_from_image_bytes(image_bytes)
-        if embedding_result is None:
-            return (
-                jsonify({"success": False, "message": "No face detected in image"}),
-                400,
-            )
-
-        embedding = (
-            embedding_result[0]
-            if isinstance(embedding_result, tuple)
-            else embedding_result
-        )
-
-        if FACE_PROCESSING_AVAILABLE:
-            nparr = np.frombuffer(image_bytes, np.uint8)
-            img_bgr = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-
-            face_roi, face_coords = detect_face(img_bgr)
-            if face_roi is None:
-                return (
-                    jsonify(
-                        {
-                            "success": False,
-                            "message": "No face detected for augmentation",
-                        }
-                    ),
-                    400,
-                )
-
-            face_processed = preprocess_face_for_embedding(face_roi)
-            if face_processed is None:
-                return (
-                    jsonify({"success": False, "message": "Failed to preprocess face"}),
-                    400,
-                )
-
-            try:
-                augmented_faces = generate_augmented_faces(face_processed)
-                embeddings_list = []
-
-                embeddings_list.append(embedding)
-
-                for aug_face in augmented_faces:
-                    aug_embedding = get_face_embedding(aug_face)
-                    if aug_embedding is not None:
-                        embeddings_list.append(aug_embedding)
-
-                if len(embeddings_list) == 0:
-                    return (
-                        jsonify(
-                            {
-                                "success": False,
-                                "message": "Failed to generate any embeddings",
-                            }
-                        ),
-                        400,
-                    )
-
-                embeddings_np = [
-                    np.array(emb, dtype=np.float32) for emb in embeddings_list
-                ]
-
-                register_user_embeddings(user_id, embeddings_np)
-
-                return jsonify(
-                    {
-                        "success": True,
-                        "message": f"User {user_id} registered successfully",
-                        "embeddings_count": len(embeddings_np),
-                    }
-                )
-
-            except Exception as e:
-                print(f"Error during augmentation: {e}")
-                embeddings_np = [np.array(embedding, dtype=np.float32)]
-                register_user_embeddings(user_id, embeddings_np)
-
-                return jsonify(
-                    {
-                        "success": True,
-                        "message": f"User {user_id} registered with single embedding (augmentation failed)",
-                        "embeddings_count": 1,
-                    }
-                )
-        else:
-            embeddings_np = [np.array(embedding, dtype=np.float32)]
-            register_user_embeddings(user_id, embeddings_np)
-
-            return jsonify(
-                {
-                    "success": True,
-                    "message": f"User {user_id} registered with single embedding",
-                    "embeddings_count": 1,
-                }
-            )
+        payload, status = face_service.register_face_image(user_id, image_bytes)
+        return jsonify(payload), status
 
     except Exception as e:
         print(f"Registration error: {e}")
@@ -213,31 +195,194 @@ def verify_user_face():
 
         image_bytes = image_file.read()
 
-        embedding = get_embedding_from_image_bytes(image_bytes)
-        if embedding is None:
-            return (
-                jsonify({"success": False, "message": "No face detected in image"}),
-                400,
-            )
+        payload, status = face_service.verify_face_image(user_id, image_bytes)
+        return jsonify(payload), status
 
-        is_verified, similarity_score = verify_user_by_embedding(user_id, embedding[0])
+    except Exception as e:
+        print(f"Verification error: {e}")
+        return (
+            jsonify({"success": False, "message": f"Verification failed: {str(e)}"}),
+            500,
+        )
 
-        return jsonify(
-            {
-                "success": True,
-                "verified": is_verified,
-                "similarity_score": float(similarity_score),
-                "threshold": VERIFICATION_THRESHOLD,
-                "message": (
-                    "Verification successful" if is_verified else "Verification failed"
-                ),
-            }
+
+def _read_batch_items():
+    """
+    Read (user_id, image) pairs from a multipart request with repeated
+    `user_id` and `image` fields, paired by order.
+    Returns (items, error_response).
+    """
+    user_ids = request.form.getlist("user_id")
+    image_files = request.files.getlist("image")
+
+    if not user_ids or not image_files:
+        return None, (
+            jsonify({"success": False, "message": "user_id and image fields are required"}),
+            400,
+        )
+    if len(user_ids) != len(image_files):
+        return None, (
+            jsonify(
+                {
+                    "success": False,
+                    "message": f"Got {len(user_ids)} user_id fields but {len(image_files)} images",
+                }
+            ),
+            400,
+        )
+    if len(user_ids) > config.API_BATCH_MAX_ITEMS:
+        return None, (
+            jsonify(
+                {
+                    "success": False,
+                    "message": f"Batch too large (max {config.API_BATCH_MAX_ITEMS} items)",
+                }
+            ),
+            413,
+        )
+
+    items = [
+        (user_id, image_file.read() if image_file.filename else b"")
+        for user_id, image_file in zip(user_ids, image_files)
+    ]
+    return items, None
+
+
+@app.route("/register/batch", methods=["POST"])
+def register_user_faces_batch():
+    """
+    Register many users in one request
+    Expects: repeated user_id and image fields (paired by order)
+    """
+    try:
+        items, error = _read_batch_items()
+        if error is not None:
+            return error
+
+        results = face_service.register_faces_batch(items)
+        return jsonify(face_service.batch_response(items, results))
+
+    except Exception as e:
+        print(f"Batch registration error: {e}")
+        return (
+            jsonify({"success": False, "message": f"Batch registration failed: {str(e)}"}),
+            500,
         )
 
+
+@app.route("/verify/batch", methods=["POST"])
+def verify_user_faces_batch():
+    """
+    Verify many users in one request
+    Expects: repeated user_id and image fields (paired by order)
+    """
+    try:
+        items, error = _read_batch_items()
+        if error is not None:
+            return error
+
+        results = face_service.verify_faces_batch(items)
+        return jsonify(face_service.batch_response(items, results))
+
     except Exception as e:
-        print(f"Verification error: {e}")
+        print(f"Batch verification error: {e}")
         return (
-            jsonify({"success": False, "message": f"Verification failed: {str(e)}"}),
+            jsonify({"success": False, "message": f"Batch verification failed: {str(e)}"}),
+            500,
+        )
+
+
+@app.route("/verify/burst", methods=["POST"])
+def verify_user_face_burst():
+    """
+    Verify a user from a burst of camera frames, stopping at the first match
+    Expects: user_id and repeated image fields (multipart/form-data), or an MJPEG
+    stream (multipart/x-mixed-replace) with user_id as a query parameter
+    """
+    try:
+        streaming = request.mimetype == STREAM_CONTENT_TYPE
+        user_id = request.args.get("user_id") if streaming else request.form.get("user_id")
+        if not user_id:
+            return jsonify({"success": False, "message": "user_id is required"}), 400
+
+        if not is_user_registered(user_id):
+            return jsonify({"success": False, "message": "User not registered"}), 404
+
+        if streaming:
+            payload, status = _verify_burst_stream(user_id)
+            return jsonify(payload), status
+
+        image_files = request.files.getlist("image")
+        if not image_files:
+            return jsonify({"success": False, "message": "No image file provided"}), 400
+
+        # Frames past the budget are never read
+        frames = [
+            image_file.read() if image_file.filename else b""
+            for image_file in image_files[: config.BURST_MAX_FRAMES]
+        ]
+        payload, status = face_service.verify_face_burst(user_id, frames)
+        return jsonify(payload), status
+
+    except Exception as e:
+        print(f"Burst verification error: {e}")
+        return (
+            jsonify({"success": False, "message": f"Burst verification failed: {str(e)}"}),
+            500,
+        )
+
+
+def _verify_burst_stream(user_id):
+    """Score MJPEG frames while the stream is still arriving; stop reading at the first match."""
+    boundary = request.mimetype_params.get("boundary")
+    if not boundary:
+        return {"success": False, "message": "Stream boundary is missing"}, 400
+
+    parser = MultipartFrameParser(boundary, config.BURST_MAX_FRAME_BYTES)
+    burst = face_service.BurstVerification(user_id)
+    while not burst.done:
+        data = request.stream.read(STREAM_READ_SIZE)
+        try:
+            # Every frame that has fully arrived goes to the model together
+            frames = parser.feed(data) if data else parser.close()
+        except ValueError as e:
+            # Only the parser's frame size limit is a 413; errors while scoring stay 500s
+            return {"success": False, "message": str(e)}, 413
+        burst.add_frames(frames)
+        if not data:
+            break
+    return burst.result()
+
+
+@app.route("/identify", methods=["POST"])
+def identify_user_face():
+    """
+    Identify who is in the image (1:N search over all registered users)
+    Expects: image file, optional top_k
+    """
+    try:
+        try:
+            top_k = int(request.form.get("top_k", config.IDENTIFY_DEFAULT_TOP_K))
+        except ValueError:
+            return jsonify({"success": False, "message": "top_k must be an integer"}), 400
+        top_k = max(1, min(top_k, config.IDENTIFY_MAX_TOP_K))
+
+        if "image" not in request.files:
+            return jsonify({"success": False, "message": "No image file provided"}), 400
+
+        image_file = request.files["image"]
+        if image_file.filename == "":
+            return jsonify({"success": False, "message": "No image file selected"}), 400
+
+        image_bytes = image_file.read()
+
+        payload, status = face_service.identify_face_image(image_bytes, top_k)
+        return jsonify(payload), status
+
+    except Exception as e:
+        print(f"Identification error: {e}")
+        return (
+            jsonify({"success": False, "message": f"Identification failed: {str(e)}"}),
             500,
         )
 
@@ -246,10 +391,8 @@ def verify_user_face():
 def get_user_info(user_id):
     """Get user registration status"""
     try:
-        is_registered = is_user_registered(user_id)
-        return jsonify(
-            {"success": True, "user_id": user_id, "is_registered": is_registered}
-        )
+        payload, status = face_service.get_user_status(user_id)
+        return jsonify(payload), status
     except Exception as e:
         return (
             jsonify({"success": False, "message": f"Error checking user: {str(e)}"}),
@@ -261,13 +404,8 @@ def get_user_info(user_id):
 def delete_user_face(user_id):
     """Delete user face registration"""
     try:
-        if not is_user_registered(user_id):
-            return jsonify({"success": False, "message": "User not registered"}), 404
-
-        delete_user(user_id)
-        return jsonify(
-            {"success": True, "message": f"User {user_id} deleted successfully"}
-        )
+        payload, status = face_service.delete_user_face(user_id)
+        return jsonify(payload), status
     except Exception as e:
         return (
             jsonify({"success": False, "message": f"Error deleting user: {str(e)}"}),
@@ -285,9 +423,18 @@ def index():
             "endpoints": {
                 "POST /register": "Register user with face image (multipart/form-data: user_id, image)",
                 "POST /verify": "Verify user with face image (multipart/form-data: user_id, image)",
+                "POST /identify": "Identify user from face image (multipart/form-data: image, optional top_k)",
+                "POST /register/batch": "Register many users (multipart/form-data: repeated user_id, image)",
+                "POST /verify/batch": "Verify many users (multipart/form-data: repeated user_id, image)",
+                "POST /verify/burst": "Verify user from a burst of frames, stops at the first match "
+                "(multipart/form-data: user_id, repeated image; or MJPEG multipart/x-mixed-replace with ?user_id=)",
                 "GET /user/<user_id>": "Get user registration status",
                 "DELETE /user/<user_id>": "Delete user registration",
                 "GET /health": "Health check",
+                "GET /ready": "Readiness check (models loaded and warmed up)",
+                "GET /stats": "Inference micro-batching, cache, admission, persistence, store sync and "
+                "template cache statistics",
+                "GET /metrics": "Prometheus metrics",
             },
         }
     )
@@ -298,8 +445,15 @@ if __name__ == "__main__":
     print("Available endpoints:")
     print("  POST /register - Register user with face")
     print("  POST /verify - Verify user with face")
+    print("  POST /identify - Identify user from face (1:N)")
+    print("  POST /register/batch - Register many users")
+    print("  POST /verify/batch - Verify many users")
+    print("  POST /verify/burst - Verify user from a burst of frames")
     print("  GET /user/<user_id> - Get user status")
     print("  DELETE /user/<user_id> - Delete user")
     print("  GET /health - Health check")
+    print("  GET /ready - Readiness check")
+    print("  GET /stats - Inference statistics")
+    print("  GET /metrics - Prometheus metrics")
 
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,433 @@
+"""
+ASGI variant of the Face Recognition API (same endpoints as face_recognition_api.py).
+
+Request parsing and upload I/O stay on the event loop, so a slow upload from a
+locker on a bad mobile link does not hold a thread. Decode, detection, inference
+and store writes run in a bounded thread pool (ASGI_CPU_WORKERS threads, at most
+ASGI_MAX_PENDING jobs in flight or queued).
+
+Run with:
+    uvicorn face_recognition_asgi:app --host 0.0.0.0 --port 5000
+"""
+import asyncio
+import contextvars
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
+
+sys.path.append(os.path.join(os.path.dirname(__file__)))
+sys.path.append(os.path.join(os.path.dirname(__file__), "src"))
+
+try:
+    from src import config
+    from api.face_embedder import get_batching_stats, get_cache_stats
+    from src.metrics import render_metrics
+    from src.profiling import start_request_profile, end_request_profile, current_profile
+    from api.admission import parse_deadline, start_deadline, end_deadline
+    from api.frame_stream import STREAM_CONTENT_TYPE, MultipartFrameParser, boundary_from_content_type
+    from api import face_service
+    from user_management.db import is_user_registered, persist_queue, store_sync, template_cache
+
+except ImportError as e:
+    print(f"Import error: {e}")
+    print("Make sure you're running this from the ORV root directory")
+    sys.exit(1)
+
+app = FastAPI(title="Face Recognition API", version="1.0.0")
+app.add_middleware(
+    CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"]
+)
+
+_cpu_executor = ThreadPoolExecutor(
+    max_workers=config.ASGI_CPU_WORKERS, thread_name_prefix="face-cpu"
+)
+_cpu_slots = None  # asyncio.Semaphore, created on the serving event loop
+
+# Models load and warm up in the background; /ready reports when inference is hot
+if config.API_WARMUP_ON_IMPORT:
+    face_service.start_warmup()
+
+
+async def run_cpu(fn, *args):
+    """
+    Run a blocking stage in the bounded executor: CPU work, and store lookups,
+    which hit the database directly with the sqlite backend.
+    """
+    global _cpu_slots
+    if _cpu_slots is None:
+        _cpu_slots = asyncio.Semaphore(config.ASGI_MAX_PENDING)
+    profile = current_profile()
+    if profile is not None:
+        # cProfile has to run on the executor thread that does the work
+        fn, args = profile.run, (fn,) + args
+    # Carry the request context (profile) over to the executor thread
+    ctx = contextvars.copy_context()
+    async with _cpu_slots:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_cpu_executor, ctx.run, fn, *args)
+
+
+# Paths that run inference and count against the in-flight limit
+INFERENCE_PATHS = {"/register", "/verify", "/register/batch", "/verify/batch", "/verify/burst", "/identify"}
+
+
+@app.middleware("http")
+async def admission_control(request: Request, call_next):
+    """Admission control: fast 503 + Retry-After when too many inference requests are in flight"""
+    if request.method != "POST" or request.url.path not in INFERENCE_PATHS:
+        return await call_next(request)
+    if not face_service.admission.try_acquire():
+        payload, status = face_service.overloaded()
+        return JSONResponse(
+            payload,
+            status_code=status,
+            headers={"Retry-After": str(face_service.admission.retry_after_s)},
+        )
+    # Optional client deadline, counted from arrival (before the upload is read);
+    # run_cpu carries it to the executor thread with the rest of the context
+    token = start_deadline(parse_deadline(request.headers))
+    try:
+        return await call_next(request)
+    finally:
+        end_deadline(token)
+        face_service.admission.release()
+
+
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    """Opt-in per-request profiling (FACE_PROFILING=1 or a trusted X-Profile-Token header)"""
+    if request.method != "POST":
+        return await call_next(request)
+    profile, token = start_request_profile(request.url.path.strip("/").replace("/", "_"), request.headers)
+    try:
+        response = await call_next(request)
+    finally:
+        end_request_profile(token)
+    if profile is not None:
+        response.headers["Server-Timing"] = profile.server_timing()
+    return response
+
+
+def _json(payload, status=200):
+    return JSONResponse(payload, status_code=status)
+
+
+async def _read_user_and_image(request: Request):
+    """
+    Parse the multipart form on the event loop.
+    Returns (user_id, image_bytes, error_response).
+    """
+    form = await request.form()
+    user_id = form.get("user_id")
+    if not user_id:
+        return None, None, _json({"success": False, "message": "user_id is required"}, 400)
+
+    image_file = form.get("image")
+    if image_file is None or isinstance(image_file, str):
+        return user_id, None, _json({"success": False, "message": "No image file provided"}, 400)
+    if not image_file.filename:
+        return user_id, None, _json({"success": False, "message": "No image file selected"}, 400)
+
+    return user_id, await image_file.read(), None
+
+
+@app.get("/health")
+async def health_check():
+    """Health check endpoint (liveness only, does not touch the models)"""
+    return {"status": "healthy", "service": "Face Recognition API", "version": "1.0.0"}
+
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 200 once the models are loaded and warmed up, 503 before"""
+    payload, status = face_service.get_readiness()
+    return _json(payload, status)
+
+
+@app.get("/stats")
+async def inference_stats():
+    """Micro-batching, embedding cache, admission, store persistence/sync and template cache statistics"""
+    return {
+        "success": True,
+        "batching": get_batching_stats(),
+        "embedding_cache": get_cache_stats(),
+        "admission": face_service.admission.get_stats(),
+        "persistence": persist_queue.get_stats(),
+        "store_sync": store_sync.get_stats() if store_sync else None,
+        "template_cache": template_cache.get_stats() if template_cache else None,
+    }
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics (per-stage latency histograms, result counters, store size)"""
+    body, content_type = render_metrics()
+    return Response(body, media_type=content_type)
+
+
+@app.post("/register")
+async def register_user_face(request: Request):
+    """
+    Register user with face embeddings
+    Expects: user_id and image file
+    """
+    try:
+        user_id, image_bytes, error = await _read_user_and_image(request)
+        if user_id and await run_cpu(is_user_registered, user_id):
+            return _json(
+                {
+                    "success": False,
+                    "message": "User already registered. Use update endpoint to modify.",
+                },
+                409,
+            )
+        if error is not None:
+            return error
+
+        payload, status = await run_cpu(face_service.register_face_image, user_id, image_bytes)
+        return _json(payload, status)
+
+    except Exception as e:
+        print(f"Registration error: {e}")
+        return _json({"success": False, "message": f"Registration failed: {str(e)}"}, 500)
+
+
+@app.post("/verify")
+async def verify_user_face(request: Request):
+    """
+    Verify user with face image
+    Expects: user_id and image file
+    """
+    try:
+        user_id, image_bytes, error = await _read_user_and_image(request)
+        if user_id and not await run_cpu(is_user_registered, user_id):
+            return _json({"success": False, "message": "User not registered"}, 404)
+        if error is not None:
+            return error
+
+        payload, status = await run_cpu(face_service.verify_face_image, user_id, image_bytes)
+        return _json(payload, status)
+
+    except Exception as e:
+        print(f"Verification error: {e}")
+        return _json({"success": False, "message": f"Verification failed: {str(e)}"}, 500)
+
+
+async def _read_batch_items(request: Request):
+    """
+    Read (user_id, image) pairs from a multipart request with repeated
+    `user_id` and `image` fields, paired by order.
+    Returns (items, error_response).
+    """
+    form = await request.form()
+    user_ids = form.getlist("user_id")
+    image_files = [f for f in form.getlist("image") if not isinstance(f, str)]
+
+    if not user_ids or not image_files:
+        return None, _json({"success": False, "message": "user_id and image fields are required"}, 400)
+    if len(user_ids) != len(image_files):
+        return None, _json(
+            {
+                "success": False,
+                "message": f"Got {len(user_ids)} user_id fields but {len(image_files)} images",
+            },
+            400,
+        )
+    if len(user_ids) > config.API_BATCH_MAX_ITEMS:
+        return None, _json(
+            {"success": False, "message": f"Batch too large (max {config.API_BATCH_MAX_ITEMS} items)"},
+            413,
+        )
+
+    items = []
+    for user_id, image_file in zip(user_ids, image_files):
+        items.append((user_id, await image_file.read() if image_file.filename else b""))
+    return items, None
+
+
+@app.post("/register/batch")
+async def register_user_faces_batch(request: Request):
+    """
+    Register many users in one request
+    Expects: repeated user_id and image fields (paired by order)
+    """
+    try:
+        items, error = await _read_batch_items(request)
+        if error is not None:
+            return error
+
+        results = await run_cpu(face_service.register_faces_batch, items)
+        return _json(face_service.batch_response(items, results))
+
+    except Exception as e:
+        print(f"Batch registration error: {e}")
+        return _json({"success": False, "message": f"Batch registration failed: {str(e)}"}, 500)
+
+
+@app.post("/verify/batch")
+async def verify_user_faces_batch(request: Request):
+    """
+    Verify many users in one request
+    Expects: repeated user_id and image fields (paired by order)
+    """
+    try:
+        items, error = await _read_batch_items(request)
+        if error is not None:
+            return error
+
+        results = await run_cpu(face_service.verify_faces_batch, items)
+        return _json(face_service.batch_response(items, results))
+
+    except Exception as e:
+        print(f"Batch verification error: {e}")
+        return _json({"success": False, "message": f"Batch verification failed: {str(e)}"}, 500)
+
+
+@app.post("/verify/burst")
+async def verify_user_face_burst(request: Request):
+    """
+    Verify a user from a burst of camera frames, stopping at the first match
+    Expects: user_id and repeated image fields (multipart/form-data), or an MJPEG
+    stream (multipart/x-mixed-replace) with user_id as a query parameter
+    """
+    try:
+        content_type = request.headers.get("content-type", "")
+        if content_type.split(";")[0].strip().lower() == STREAM_CONTENT_TYPE:
+            user_id = request.query_params.get("user_id")
+            if not user_id:
+                return _json({"success": False, "message": "user_id is required"}, 400)
+            if not await run_cpu(is_user_registered, user_id):
+                return _json({"success": False, "message": "User not registered"}, 404)
+            payload, status = await _verify_burst_stream(request, user_id, content_type)
+            return _json(payload, status)
+
+        form = await request.form()
+        user_id = form.get("user_id")
+        if not user_id:
+            return _json({"success": False, "message": "user_id is required"}, 400)
+        if not await run_cpu(is_user_registered, user_id):
+            return _json({"success": False, "message": "User not registered"}, 404)
+
+        image_files = [f for f in form.getlist("image") if not isinstance(f, str)]
+        if not image_files:
+            return _json({"success": False, "message": "No image file provided"}, 400)
+
+        frames = []
+        for image_file in image_files[: config.BURST_MAX_FRAMES]:
+            frames.append(await image_file.read() if image_file.filename else b"")
+        payload, status = await run_cpu(face_service.verify_face_burst, user_id, frames)
+        return _json(payload, status)
+
+    except Exception as e:
+        print(f"Burst verification error: {e}")
+        return _json({"success": False, "message": f"Burst verification failed: {str(e)}"}, 500)
+
+
+async def _verify_burst_stream(request: Request, user_id, content_type):
+    """Score MJPEG frames while the stream is still arriving; stop reading at the first match."""
+    boundary = boundary_from_content_type(content_type)
+    if not boundary:
+        return {"success": False, "message": "Stream boundary is missing"}, 400
+
+    parser = MultipartFrameParser(boundary, config.BURST_MAX_FRAME_BYTES)
+    burst = face_service.BurstVerification(user_id)
+    async for chunk in request.stream():
+        try:
+            # Every frame that has fully arrived goes to the model together
+            frames = parser.feed(chunk)
+        except ValueError as e:
+            # Only the parser's frame size limit is a 413; errors while scoring stay 500s
+            return {"success": False, "message": str(e)}, 413
+        if frames and await run_cpu(burst.add_frames, frames):
+            break
+    else:
+        frames = parser.close()
+        if frames:
+            await run_cpu(burst.add_frames, frames)
+    return burst.result()
+
+
+@app.post("/identify")
+async def identify_user_face(request: Request):
+    """
+    Identify who is in the image (1:N search over all registered users)
+    Expects: image file, optional top_k
+    """
+    try:
+        form = await request.form()
+        try:
+            top_k = int(form.get("top_k", config.IDENTIFY_DEFAULT_TOP_K))
+        except ValueError:
+            return _json({"success": False, "message": "top_k must be an integer"}, 400)
+        top_k = max(1, min(top_k, config.IDENTIFY_MAX_TOP_K))
+
+        image_file = form.get("image")
+        if image_file is None or isinstance(image_file, str):
+            return _json({"success": False, "message": "No image file provided"}, 400)
+        if not image_file.filename:
+            return _json({"success": False, "message": "No image file selected"}, 400)
+        image_bytes = await image_file.read()
+
+        payload, status = await run_cpu(face_service.identify_face_image, image_bytes, top_k)
+        return _json(payload, status)
+
+    except Exception as e:
+        print(f"Identification error: {e}")
+        return _json({"success": False, "message": f"Identification failed: {str(e)}"}, 500)
+
+
+@app.get("/user/{user_id}")
+async def get_user_info(user_id: str):
+    """Get user registration status"""
+    try:
+        payload, status = face_service.get_user_status(user_id)
+        return _json(payload, status)
+    except Exception as e:
+        return _json({"success": False, "message": f"Error checking user: {str(e)}"}, 500)
+
+
+@app.delete("/user/{user_id}")
+async def delete_user_face(user_id: str):
+    """Delete user face registration"""
+    try:
+        # Deleting rewrites the store on disk, keep it off the event loop
+        payload, status = await run_cpu(face_service.delete_user_face, user_id)
+        return _json(payload, status)
+    except Exception as e:
+        return _json({"success": False, "message": f"Error deleting user: {str(e)}"}, 500)
+
+
+@app.get("/")
+async def index():
+    """API documentation"""
+    return {
+        "service": "Face Recognition API",
+        "version": "1.0.0",
+        "endpoints": {
+            "POST /register": "Register user with face image (multipart/form-data: user_id, image)",
+            "POST /verify": "Verify user with face image (multipart/form-data: user_id, image)",
+            "POST /identify": "Identify user from face image (multipart/form-data: image, optional top_k)",
+            "POST /register/batch": "Register many users (multipart/form-data: repeated user_id, image)",
+            "POST /verify/batch": "Verify many users (multipart/form-data: repeated user_id, image)",
+            "POST /verify/burst": "Verify user from a burst of frames, stops at the first match "
+            "(multipart/form-data: user_id, repeated image; or MJPEG multipart/x-mixed-replace with ?user_id=)",
+            "GET /user/<user_id>": "Get user registration status",
+            "DELETE /user/<user_id>": "Delete user registration",
+            "GET /health": "Health check",
+            "GET /ready": "Readiness check (models loaded and warmed up)",
+            "GET /stats": "Inference micro-batching, cache, admission, persistence, store sync and "
+            "template cache statistics",
+            "GET /metrics": "Prometheus metrics",
+        },
+    }
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    print("Starting Face Recognition API server (ASGI)...")
+    uvicorn.run(app, host="0.0.0.0", port=5000)
@@ -0,0 +1,161 @@
+"""
+Production entry point for the Face Recognition API.
+
+Runs the Flask app under a pre-fork gunicorn worker pool instead of the Flask
+development server. With preloading enabled (default) the master process imports
+the app and loads the Haar cascade, the embedding store and, for fork-safe
+backends (ONNX Runtime), the embedding model *before* forking, so all workers
+share those pages copy-on-write instead of each holding its own copy.
+
+TensorFlow (keras backend, FaceNet) and TFLite do not survive fork(): their
+thread pools stay behind in the master and the first forward pass in a worker
+hangs. Those models are therefore loaded in each worker, in a background
+warm-up thread started right after the fork; /ready returns 503 until the
+worker's models are loaded and have run a dummy forward pass.
+
+Choosing workers x threads
+--------------------------
+Each worker runs the embedding model (TensorFlow, ONNX Runtime or TFLite, see
+FACE_EMBEDDING_BACKEND) with its own intra-op thread pool. To avoid
+oversubscribing the CPU, keep
+
+    workers * TF_INTRA_OP_THREADS <= physical cores
+
+A good default on an N-core box is N/2 workers with 2 intra-op threads each
+(and 1 inter-op thread): two workers can run a forward pass in parallel while
+each batch still gets some intra-op parallelism. On 1-2 cores use a single
+worker and let it use all cores. Run `python serve.py --print-layout` to see
+the layout chosen for the current machine.
+
+HTTP threads per worker (FACE_API_THREADS) only hold requests while they wait
+for I/O or for the micro-batcher; they do not add inference parallelism, so
+4-8 is usually enough.
+
+Environment variables (see src/config.py):
+    FACE_API_BIND, FACE_API_WORKERS, FACE_API_THREADS, FACE_API_TIMEOUT,
+    TF_INTRA_OP_THREADS, TF_INTER_OP_THREADS, FACE_API_PRELOAD
+
+Metrics: with more than one worker, set PROMETHEUS_MULTIPROC_DIR to an empty,
+writable directory so /metrics aggregates all workers (see src/metrics.py).
+"""
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__)))
+sys.path.append(os.path.join(os.path.dirname(__file__), "src"))
+
+from src import config
+
+
+def recommend_worker_layout(cpu_count=None):
+    """
+    Return (workers, intra_op_threads, inter_op_threads) for the given core count
+    so that workers * intra_op_threads does not exceed the number of cores.
+    """
+    cpu_count = cpu_count or os.cpu_count() or 1
+    if cpu_count <= 2:
+        return 1, cpu_count, 1
+    workers = cpu_count // 2
+    intra_op_threads = max(1, cpu_count // workers)
+    return workers, intra_op_threads, 1
+
+
+def resolve_layout():
+    """Apply the env overrides from config on top of the recommended layout."""
+    workers, intra, inter = recommend_worker_layout()
+    if config.API_WORKERS > 0:
+        workers = config.API_WORKERS
+        # Keep the total number of TF threads within the core count
+        intra = max(1, (os.cpu_count() or 1) // workers)
+    if config.TF_INTRA_OP_THREADS > 0:
+        intra = config.TF_INTRA_OP_THREADS
+    if config.TF_INTER_OP_THREADS > 0:
+        inter = config.TF_INTER_OP_THREADS
+    return workers, intra, inter
+
+
+def configure_inference_threading(intra_op_threads, inter_op_threads):
+    """
+    Limit inference thread pools. Must run before TF executes its first op,
+    i.e. before any model is loaded.
+    """
+    # TF and OpenMP/MKL kernels read these when the runtime starts
+    os.environ.setdefault("OMP_NUM_THREADS", str(intra_op_threads))
+    os.environ.setdefault("TF_NUM_INTRAOP_THREADS", str(intra_op_threads))
+    os.environ.setdefault("TF_NUM_INTEROP_THREADS", str(inter_op_threads))
+
+    # The backends read the thread counts from config when they load (in the worker);
+    # TensorFlow itself is not imported in the master
+    config.TF_INTRA_OP_THREADS = intra_op_threads
+    config.TF_INTER_OP_THREADS = inter_op_threads
+
+
+def load_application():
+    """Import the Flask app and eagerly load every resource that is safe to share across fork()."""
+    # Warm-up runs per worker (see _post_fork), never in the master
+    config.API_WARMUP_ON_IMPORT = False
+
+    from face_recognition_api import app
+    from api.face_embedder import preload_resources
+
+    preload_resources(fork_safe_only=True)
+    return app
+
+
+def _post_fork(server, worker):
+    """Load and warm up the models in the new worker, in the background."""
+    from api import face_service
+
+    face_service.start_warmup()
+
+
+def _child_exit(server, worker):
+    """Drop the metric files of a worker that exited (Prometheus multiprocess mode)."""
+    from src.metrics import mark_process_dead
+
+    mark_process_dead(worker.pid)
+
+
+def main():
+    from gunicorn.app.base import BaseApplication
+
+    workers, intra, inter = resolve_layout()
+    configure_inference_threading(intra, inter)
+
+    class FaceApiApplication(BaseApplication):
+        def __init__(self, options):
+            self.options = options
+            # With preloading the app (models, cascade, store) is created in the master
+            self.application = load_application() if config.API_PRELOAD_MODELS else None
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return self.application if self.application is not None else load_application()
+
+    options = {
+        "bind": config.API_BIND,
+        "workers": workers,
+        "worker_class": "gthread",
+        "threads": config.API_THREADS_PER_WORKER,
+        "timeout": config.API_TIMEOUT_S,
+        "preload_app": config.API_PRELOAD_MODELS,
+        "accesslog": "-",
+        "child_exit": _child_exit,
+        "post_fork": _post_fork,
+    }
+    print(f"Starting Face Recognition API: {workers} workers x {config.API_THREADS_PER_WORKER} threads, "
+          f"TF intra-op={intra}, inter-op={inter}, preload={config.API_PRELOAD_MODELS}")
+    FaceApiApplication(options).run()
+
+
+if __name__ == "__main__":
+    if "--print-layout" in sys.argv:
+        workers, intra, inter = resolve_layout()
+        print(f"cores={os.cpu_count()} workers={workers} tf_intra_op={intra} tf_inter_op={inter} "
+              f"http_threads={config.API_THREADS_PER_WORKER}")
+        sys.exit(0)
+    main()
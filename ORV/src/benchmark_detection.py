@@ -0,0 +1,142 @@
+# src/benchmark_detection.py
+"""
+Primerjava načinov detekcije obrazov ("full" in "multires") na vzorčnih slikah.
+
+Vsako vhodno sliko pretvorimo v JPEG različice z daljšo stranico npr. 1024,
+2048 in 4032 px (4032 x 3024 = 12 MP, tipična slika telefona). Za vsako
+različico izmerimo čas dekodiranja + detekcije + izreza obraza v obeh načinih
+in za več velikosti proxy slike. Referenčni obraz je obraz, ki ga način "full"
+najde na izvirni sliki, preslikan na velikost različice. Priklic (recall) je
+delež slik, na katerih način najde referenčni obraz (IoU >= 0.5). Tudi "full"
+na povečanih slikah ni popoln: največji zaznan okvir je lahko lažno pozitiven.
+
+Uporaba (iz korena projekta ORV/):
+    python src/benchmark_detection.py --images test/*.png [--sizes 1024 2048 4032]
+                                      [--proxy-sides 480 640 960] [--repeats 5]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from src import config
+from api.face_pipeline import FacePipeline
+
+CASCADE_PATH = os.path.join(project_root, 'haarcascade_frontalface_default.xml')
+
+
+def make_variants(image_paths, sizes, face_cascade, jpeg_quality=90):
+    """
+    Seznam (ime, velikost, JPEG bajti, referenčni okvir) za vse slike in ciljne velikosti.
+    Slike, na katerih v izvirni velikosti ni obraza, se izpustijo.
+    """
+    variants = []
+    for path in image_paths:
+        img = cv2.imread(path)
+        if img is None:
+            print(f"OPOZORILO: Slike ni mogoče naložiti: {path}")
+            continue
+        with open(path, 'rb') as f:
+            native_box = run_detection(f.read(), face_cascade, "full")
+        if native_box is None:
+            print(f"OPOZORILO: Na izvirni sliki ni obraza, preskakujem: {path}")
+            continue
+        for size in sizes:
+            scale = size / max(img.shape[:2])
+            reference = tuple(round(v * scale) for v in native_box)
+            resized = cv2.resize(img, (round(img.shape[1] * scale), round(img.shape[0] * scale)),
+                                 interpolation=cv2.INTER_CUBIC if scale > 1 else cv2.INTER_AREA)
+            ok, encoded = cv2.imencode('.jpg', resized, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+            if ok:
+                variants.append((os.path.basename(path), size, encoded.tobytes(), reference))
+    return variants
+
+
+def run_detection(image_bytes, face_cascade, mode):
+    """Dekodiranje, detekcija in izrez kot v API-ju. Vrne okvir obraza ali None."""
+    pipeline = FacePipeline(image_bytes, face_cascade, detect_mode=mode)
+    if not pipeline.is_valid:
+        return None
+    box = pipeline.face_box
+    if box is not None:
+        pipeline.face_input(config.IMG_WIDTH)
+    return box
+
+
+def time_detection(image_bytes, face_cascade, mode, repeats):
+    """Mediana časa (ms) in okvir obraza."""
+    timings = []
+    box = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        box = run_detection(image_bytes, face_cascade, mode)
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings)), box
+
+
+def iou(box_a, box_b):
+    ax, ay, aw, ah = box_a
+    bx, by, bw, bh = box_b
+    inter_w = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    inter_h = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = inter_w * inter_h
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark načinov detekcije obrazov.")
+    parser.add_argument('--images', nargs='+', required=True, help="Vzorčne slike (poti ali glob vzorci)")
+    parser.add_argument('--sizes', nargs='+', type=int, default=[1024, 2048, 4032],
+                        help="Daljša stranica testnih različic v px")
+    parser.add_argument('--proxy-sides', nargs='+', type=int, default=[480, 640, 960],
+                        help="Velikosti proxy slike za način multires")
+    parser.add_argument('--repeats', type=int, default=5, help="Ponovitve na sliko (mediana)")
+    args = parser.parse_args()
+
+    image_paths = sorted({p for pattern in args.images for p in glob.glob(pattern)})
+    if not image_paths:
+        print("NAPAKA: Ni najdenih slik.")
+        sys.exit(1)
+
+    face_cascade = cv2.CascadeClassifier(CASCADE_PATH)
+    if face_cascade.empty():
+        print(f"NAPAKA: Haar cascade ni mogoče naložiti iz: {CASCADE_PATH}")
+        sys.exit(1)
+
+    variants = make_variants(image_paths, args.sizes, face_cascade)
+    if not variants:
+        print("NAPAKA: Na nobeni sliki ni bil najden obraz.")
+        sys.exit(1)
+    print(f"{len(variants) // len(args.sizes)} slik, {len(variants)} različic, {args.repeats} ponovitev\n")
+
+    print(f"{'velikost':>8} {'način':>14} {'povpr. ms':>10} {'priklic':>8} {'IoU':>6}")
+    for size in args.sizes:
+        size_variants = [v for v in variants if v[1] == size]
+        runs = [("full", "full", None)] + [("multires", f"multires@{side}", side) for side in args.proxy_sides]
+        for mode, label, proxy_side in runs:
+            if proxy_side is not None:
+                config.DETECT_PROXY_MAX_SIDE = proxy_side
+            times, hits, ious = [], 0, []
+            for _, _, image_bytes, ref_box in size_variants:
+                elapsed, box = time_detection(image_bytes, face_cascade, mode, args.repeats)
+                times.append(elapsed)
+                overlap = iou(ref_box, box) if box is not None else 0.0
+                ious.append(overlap)
+                hits += overlap >= 0.5
+            print(f"{size:>8} {label:>14} {np.mean(times):>10.1f} {hits / len(size_variants):>8.2f} "
+                  f"{np.mean(ious):>6.2f}")
+        print()
+
+
+if __name__ == '__main__':
+    main()
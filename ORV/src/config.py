@@ -47,3 +47,97 @@ NUM_VAL_TRIPLETS_PER_EPOCH = 5000  # Število trojčkov za eno epoho validacije
 # --- Nastavitve za shranjevanje modela ---
 EMBEDDING_MODEL_NAME = f"face_embedding_model_dim{EMBEDDING_DIM}.keras"
 TRIPLET_TRAINING_MODEL_NAME = f"face_triplet_training_model_dim{EMBEDDING_DIM}.keras"
+
+# --- Nastavitve za API (inferenca) ---
+# Micro-batching: zahtevki, ki prispejo v kratkem časovnem oknu, se združijo v en klic modela.
+# Vrednosti je mogoče povoziti z okoljskimi spremenljivkami (npr. v Dockerfile ali docker-compose).
+EMBED_BATCH_MAX_SIZE = int(os.environ.get("EMBED_BATCH_MAX_SIZE", "16"))  # Največ obrazov v enem klicu modela
+EMBED_BATCH_MAX_WAIT_MS = float(os.environ.get("EMBED_BATCH_MAX_WAIT_MS", "5"))  # Največje čakanje na poln batch
+
+# Produkcijski strežnik (serve.py): pre-fork gunicorn delavci z vnaprej naloženimi modeli.
+# 0 pomeni samodejno izbiro glede na število jeder (glej serve.recommend_worker_layout).
+API_BIND = os.environ.get("FACE_API_BIND", "0.0.0.0:5000")
+API_WORKERS = int(os.environ.get("FACE_API_WORKERS", "0"))
+API_THREADS_PER_WORKER = int(os.environ.get("FACE_API_THREADS", "4"))  # HTTP niti na delavca
+TF_INTRA_OP_THREADS = int(os.environ.get("TF_INTRA_OP_THREADS", "0"))  # Niti znotraj ene TF operacije
+TF_INTER_OP_THREADS = int(os.environ.get("TF_INTER_OP_THREADS", "0"))  # Vzporedne TF operacije
+API_PRELOAD_MODELS = os.environ.get("FACE_API_PRELOAD", "1") == "1"  # Fork-varne vire naloži pred fork-om
+API_TIMEOUT_S = int(os.environ.get("FACE_API_TIMEOUT", "60"))
+
+# ASGI strežnik (face_recognition_asgi.py): branje zahtevkov ostane na event loop-u,
+# dekodiranje, detekcija in inferenca pa tečejo v omejenem naboru niti.
+ASGI_CPU_WORKERS = int(os.environ.get("FACE_ASGI_CPU_WORKERS", str(min(8, os.cpu_count() or 1))))
+ASGI_MAX_PENDING = int(os.environ.get("FACE_ASGI_MAX_PENDING", "64"))  # Največ CPU opravil v teku/čakanju
+
+# Batch endpointi (/verify/batch, /register/batch)
+API_BATCH_MAX_ITEMS = int(os.environ.get("FACE_API_BATCH_MAX_ITEMS", "64"))  # Največ parov (user_id, slika) na zahtevek
+
+# 1:N identifikacija (/identify)
+IDENTIFY_DEFAULT_TOP_K = int(os.environ.get("FACE_IDENTIFY_TOP_K", "5"))
+IDENTIFY_MAX_TOP_K = 50
+
+# Backend za embedding model v API-ju: "keras" (.keras + TensorFlow), "onnx" (ONNX Runtime, CPU)
+# ali "tflite" (INT8 TFLite, CPU). ONNX model ustvari src/export_onnx_model.py, INT8 pa src/quantize_model.py.
+EMBEDDING_BACKEND = os.environ.get("FACE_EMBEDDING_BACKEND", "keras")
+ONNX_MODEL_NAME = f"face_embedding_model_dim{EMBEDDING_DIM}.onnx"
+ONNX_EXPORT_OPSET = 13
+ONNX_EXPORT_TOLERANCE = 1e-4  # Največja dovoljena absolutna razlika med Keras in ONNX embeddingi
+
+# INT8 kvantizacija (src/quantize_model.py): TFLite model s celoštevilskimi utežmi in aktivacijami za CPU.
+# Kvantiziran model se sprejme samo, če poslabšanje verifikacije na testni množici ostane v proračunu.
+TFLITE_INT8_MODEL_NAME = f"face_embedding_model_dim{EMBEDDING_DIM}_int8.tflite"
+QUANT_CALIBRATION_SAMPLES = 500  # Število učnih slik za kalibracijo obsegov aktivacij
+QUANT_EVAL_MAX_PAIRS = 5000  # Največ parov iste osebe (in enako parov različnih oseb) za ROC/EER
+QUANT_MAX_EER_INCREASE = 0.01  # Največje dovoljeno povečanje EER (absolutno, 0.01 = 1 odstotna točka)
+QUANT_MAX_AUC_DROP = 0.005  # Največji dovoljeni padec ROC AUC
+
+# Profiliranje posameznih zahtevkov (src/profiling.py): Server-Timing glava z razčlenitvijo po korakih.
+# Vklopi se za vse zahtevke (FACE_PROFILING=1) ali za posamezen zahtevek z glavo X-Profile-Token,
+# ki se mora ujemati s FACE_PROFILING_TOKEN (prazen žeton pomeni, da je glava onemogočena).
+PROFILING_ENABLED = os.environ.get("FACE_PROFILING", "0") == "1"
+PROFILING_TOKEN = os.environ.get("FACE_PROFILING_TOKEN", "")
+# Delež profiliranih zahtevkov, za katere se cProfile shrani na disk (glava X-Profile-Dump: 1 ga vsili)
+PROFILING_DUMP_SAMPLE_RATE = float(os.environ.get("FACE_PROFILING_DUMP_RATE", "0"))
+PROFILING_DUMP_DIR = os.environ.get("FACE_PROFILING_DIR", os.path.join(LOG_DIR, "profiles"))
+
+# Zagon API-ja: modeli se naložijo in ogrejejo (prazen klic modela) v ozadju, /ready vrne 200, ko je inferenca pripravljena.
+# serve.py ogrevanje ob uvozu izklopi in ga zažene v vsakem delavcu po fork-u.
+API_WARMUP_ON_IMPORT = os.environ.get("FACE_API_WARMUP_ON_IMPORT", "1") == "1"
+# Augmentacije s FaceNet ob registraciji (uvozi TensorFlow). Z 0 naprave, ki samo verificirajo, TF sploh ne naložijo.
+REGISTER_AUGMENTATION = os.environ.get("FACE_REGISTER_AUGMENTATION", "1") == "1"
+
+# Detekcija obrazov: "full" (privzeto) = kaskada na polni ločljivosti. "multires" dekodira zmanjšano
+# (IMREAD_REDUCED_*) in kaskado požene na proxy sliki z daljšo stranico največ DETECT_PROXY_MAX_SIDE; obraz se
+# izreže iz polne ločljivosti. Pri velikih slikah lahko najde drugačne obraze, zato ga vklopi šele po primerjavi
+# s src/benchmark_detection.py na svojih slikah. Slike, manjše od DETECT_PROXY_MAX_SIDE, se obdelajo enako.
+DETECT_MODE = os.environ.get("FACE_DETECT_MODE", "full")
+DETECT_PROXY_MAX_SIDE = int(os.environ.get("FACE_DETECT_PROXY_MAX_SIDE", "640"))
+DETECT_MIN_FACE_FRACTION = float(os.environ.get("FACE_DETECT_MIN_FACE_FRACTION", "0.08"))  # Najmanjši obraz glede na krajšo stranico
+
+# Predpomnilnik embeddingov (api/embedding_cache.py): ključ = zgoščena vrednost bajtov slike + različica modela.
+# Ponovno poslana ista slika preskoči dekodiranje, detekcijo in inferenco. 0 vnosov izklopi predpomnilnik.
+EMBED_CACHE_MAX_ENTRIES = int(os.environ.get("FACE_EMBED_CACHE_MAX_ENTRIES", "4096"))
+EMBED_CACHE_TTL_S = float(os.environ.get("FACE_EMBED_CACHE_TTL_S", "300"))
+
+# Nadzor sprejema (api/admission.py): največ ADMISSION_MAX_IN_FLIGHT inferenčnih zahtevkov v teku na proces
+# (0 = brez omejitve), ostali takoj dobijo 503 z glavo Retry-After. Glava X-Request-Timeout-Ms poda rok zahtevka;
+# delo zahtevka s preteklim rokom se zavrže pred inferenco (504).
+ADMISSION_MAX_IN_FLIGHT = int(os.environ.get("FACE_MAX_IN_FLIGHT", "32"))
+ADMISSION_RETRY_AFTER_S = int(os.environ.get("FACE_RETRY_AFTER_S", "1"))
+
+# Verifikacija z zaporedjem slik kamere (/verify/burst): slike se obdelajo po vrstnem redu prihoda, v skupinah
+# skozi batch pot, in obdelava se ustavi pri prvi sliki nad VERIFICATION_THRESHOLD ali po BURST_MAX_FRAMES slikah.
+BURST_MAX_FRAMES = int(os.environ.get("FACE_BURST_MAX_FRAMES", "10"))
+BURST_CHUNK_SIZE = int(os.environ.get("FACE_BURST_CHUNK_SIZE", "4"))  # Slike, ki skupaj gredo skozi model (naložene slike)
+BURST_MAX_FRAME_BYTES = 10 * 1024 * 1024  # Največja velikost posamezne slike v MJPEG toku
+
+# Ocena kakovosti obraza po detekciji (face_processing/quality.py): obrazi pod mejami se zavrnejo s kodo napake,
+# preden gredo v model za embedding ali v augmentacijo. Zamegljenost se meri na izrezu 112 x 112 px.
+# Privzeto izklopljeno (FACE_QUALITY_GATE=1 za vklop), ker zavrne tudi obraze, ki jih detektor sprejme.
+# Meji za velikost in sosede sta privzeto enaki mejam detektorja (minSize, minNeighbors=5).
+QUALITY_GATE_ENABLED = os.environ.get("FACE_QUALITY_GATE", "0") == "1"
+QUALITY_MIN_BLUR = float(os.environ.get("FACE_QUALITY_MIN_BLUR", "25"))  # Varianca Laplaceovega operatorja
+QUALITY_MIN_BRIGHTNESS = float(os.environ.get("FACE_QUALITY_MIN_BRIGHTNESS", "40"))  # Povprečna svetlost izreza (0-255)
+QUALITY_MAX_BRIGHTNESS = float(os.environ.get("FACE_QUALITY_MAX_BRIGHTNESS", "220"))
+QUALITY_MIN_SIZE_RATIO = float(os.environ.get("FACE_QUALITY_MIN_SIZE_RATIO", "1.0"))  # Širina obraza / minSize detekcije
+QUALITY_MIN_NEIGHBORS = int(os.environ.get("FACE_QUALITY_MIN_NEIGHBORS", "5"))  # Sosedi kaskade (detectMultiScale2)
@@ -0,0 +1,109 @@
+# src/export_onnx_model.py
+"""
+Izvoz naučenega embedding modela (create_embedding_model) v ONNX format za
+ONNX Runtime backend v API-ju (FACE_EMBEDDING_BACKEND=onnx).
+
+Po izvozu skripta preveri, da ONNX model vrača numerično enake embeddinge
+kot Keras model (znotraj config.ONNX_EXPORT_TOLERANCE). Če preverjanje ne
+uspe, se ONNX datoteka izbriše.
+
+Uporaba (iz korena projekta ORV/):
+    python src/export_onnx_model.py [--model model/face_embedding_model_dim128.keras]
+                                    [--output model/face_embedding_model_dim128.onnx]
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import tensorflow as tf
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from src import config
+from src.model_definition import l2_normalize_layer_func
+
+DEFAULT_MODEL_PATH = os.path.join(project_root, 'model', config.EMBEDDING_MODEL_NAME)
+DEFAULT_OUTPUT_PATH = os.path.join(project_root, 'model', config.ONNX_MODEL_NAME)
+
+
+def load_keras_model(model_path):
+    tf.keras.config.enable_unsafe_deserialization()
+    return tf.keras.models.load_model(
+        model_path,
+        custom_objects={'l2_normalize_layer_func': l2_normalize_layer_func},
+        compile=False
+    )
+
+
+def export_to_onnx(keras_model, output_path, opset=config.ONNX_EXPORT_OPSET):
+    import tf2onnx
+
+    # Dinamična batch dimenzija, da lahko MicroBatcher pošilja batche poljubne velikosti
+    input_signature = (
+        tf.TensorSpec((None, config.IMG_HEIGHT, config.IMG_WIDTH, config.IMG_CHANNELS),
+                      tf.float32, name='input_image'),
+    )
+    tf2onnx.convert.from_keras(keras_model, input_signature=input_signature,
+                               opset=opset, output_path=output_path)
+
+
+def verify_onnx_model(keras_model, onnx_path, num_samples=32, tolerance=config.ONNX_EXPORT_TOLERANCE):
+    """
+    Primerja embeddinge Keras in ONNX modela na naključnih vhodih (in na pravih
+    slikah, če je pripravljen dataset). Vrne (uspeh, največja razlika, najmanjša kosinusna podobnost).
+    """
+    import onnxruntime as ort
+
+    rng = np.random.default_rng(0)
+    inputs = rng.random((num_samples, config.IMG_HEIGHT, config.IMG_WIDTH, config.IMG_CHANNELS),
+                        dtype=np.float32)
+    if os.path.exists(config.FINAL_DATASET_PATH):
+        data = np.load(config.FINAL_DATASET_PATH)
+        test_images = data['test_images'][:num_samples].astype(np.float32)
+        inputs = np.concatenate([inputs, test_images], axis=0)
+
+    keras_out = np.asarray(keras_model.predict_on_batch(inputs))
+    session = ort.InferenceSession(onnx_path, providers=["CPUExecutionProvider"])
+    onnx_out = session.run(None, {session.get_inputs()[0].name: inputs})[0]
+
+    max_abs_diff = float(np.max(np.abs(keras_out - onnx_out)))
+    cosine = np.sum(keras_out * onnx_out, axis=1) / (
+        np.linalg.norm(keras_out, axis=1) * np.linalg.norm(onnx_out, axis=1))
+    return max_abs_diff <= tolerance, max_abs_diff, float(np.min(cosine))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Izvoz embedding modela v ONNX.")
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH, help="Pot do .keras modela")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT_PATH, help="Pot do izhodne .onnx datoteke")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.model):
+        print(f"NAPAKA: Model '{args.model}' ne obstaja. Prosim, najprej naučite model.")
+        sys.exit(1)
+
+    print(f"Nalaganje Keras modela iz: {args.model}")
+    keras_model = load_keras_model(args.model)
+
+    print(f"Izvoz v ONNX (opset {config.ONNX_EXPORT_OPSET}): {args.output}")
+    export_to_onnx(keras_model, args.output)
+
+    print("Preverjanje numerične enakovrednosti...")
+    ok, max_abs_diff, min_cosine = verify_onnx_model(keras_model, args.output)
+    print(f"  Največja absolutna razlika: {max_abs_diff:.2e} (dovoljeno {config.ONNX_EXPORT_TOLERANCE:.0e})")
+    print(f"  Najmanjša kosinusna podobnost: {min_cosine:.6f}")
+    if not ok:
+        os.remove(args.output)
+        print("NAPAKA: ONNX model se razlikuje od Keras modela. Izvoz zavrnjen.")
+        sys.exit(1)
+
+    print(f"ONNX model uspešno shranjen: {args.output}")
+    print("Za uporabo v API-ju nastavi FACE_EMBEDDING_BACKEND=onnx.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+# src/metrics.py
+"""
+Instrumentacija za Prometheus: histogrami trajanja posameznih korakov obdelave
+(dekodiranje, detekcija, ocena kakovosti, predobdelava, augmentacija,
+inferenca, primerjava, shranjevanje) in števci rezultatov.
+
+Korake merimo z `stage_timer`:
+
+    with stage_timer("detect"):
+        faces = cascade.detectMultiScale(...)
+
+ali z dekoratorjem `@timed_stage("persist")`. Če prometheus_client ni
+nameščen, so vse meritve brez učinka, /metrics pa vrne prazen odgovor.
+
+Pri gunicorn z več delavci nastavi PROMETHEUS_MULTIPROC_DIR na prazno mapo,
+da /metrics združi meritve vseh delavcev.
+"""
+import functools
+import os
+import time
+from contextlib import contextmanager
+
+from src.profiling import record_stage
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST,
+        CollectorRegistry,
+        Counter,
+        Gauge,
+        Histogram,
+        generate_latest,
+    )
+    from prometheus_client import multiprocess
+
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+    CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+# Meje košev v sekundah: od dekodiranja majhne slike (~ms) do augmentacije in FaceNet (~s)
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _NoOpMetric:
+    """Nadomestek za metriko, ko prometheus_client ni na voljo."""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+
+if PROMETHEUS_AVAILABLE:
+    STAGE_LATENCY = Histogram(
+        "face_stage_duration_seconds",
+        "Trajanje posameznega koraka obdelave zahtevka",
+        ["stage"],
+        buckets=STAGE_BUCKETS,
+    )
+    NO_FACE_TOTAL = Counter(
+        "face_no_face_total",
+        "Slike, na katerih obraz ni bil zaznan",
+        ["endpoint"],
+    )
+    VERIFICATION_TOTAL = Counter(
+        "face_verification_total",
+        "Rezultati verifikacije (accept/reject)",
+        ["result"],
+    )
+    EMBEDDING_CACHE_TOTAL = Counter(
+        "face_embedding_cache_total",
+        "Iskanja v predpomnilniku embeddingov (hit/miss)",
+        ["result"],
+    )
+    TEMPLATE_CACHE_TOTAL = Counter(
+        "face_template_cache_total",
+        "Iskanja templatov uporabnikov v LRU predpomnilniku (hit/miss) pri stopenjskem nalaganju",
+        ["result"],
+    )
+    TEMPLATE_CACHE_BYTES = Gauge(
+        "face_template_cache_bytes",
+        "Velikost templatov v LRU predpomnilniku v bajtih",
+        multiprocess_mode="liveall",
+    )
+    QUALITY_REJECTED_TOTAL = Counter(
+        "face_quality_rejected_total",
+        "Obrazi, zavrnjeni zaradi slabe kakovosti (pred inferenco)",
+        ["reason"],
+    )
+    ADMISSION_REJECTED_TOTAL = Counter(
+        "face_admission_rejected_total",
+        "Zavrnjeni zahtevki (overload = omejitev sočasnih zahtevkov, deadline = potekel rok)",
+        ["reason"],
+    )
+    IN_FLIGHT = Gauge(
+        "face_in_flight_requests",
+        "Inferenčni zahtevki v teku",
+        multiprocess_mode="livesum",
+    )
+    STORE_USERS = Gauge(
+        "face_store_users",
+        "Število registriranih uporabnikov v shrambi",
+        multiprocess_mode="liveall",
+    )
+    STORE_EMBEDDINGS = Gauge(
+        "face_store_embeddings",
+        "Število shranjenih embeddingov v shrambi",
+        multiprocess_mode="liveall",
+    )
+else:
+    STAGE_LATENCY = NO_FACE_TOTAL = VERIFICATION_TOTAL = EMBEDDING_CACHE_TOTAL = _NoOpMetric()
+    ADMISSION_REJECTED_TOTAL = IN_FLIGHT = QUALITY_REJECTED_TOTAL = _NoOpMetric()
+    STORE_USERS = STORE_EMBEDDINGS = _NoOpMetric()
+    TEMPLATE_CACHE_TOTAL = TEMPLATE_CACHE_BYTES = _NoOpMetric()
+
+
+@contextmanager
+def stage_timer(stage):
+    """
+    Izmeri trajanje bloka in ga zapiše v histogram za korak `stage`
+    (ter v profil zahtevka, če je profiliranje vklopljeno, glej src/profiling.py).
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_LATENCY.labels(stage=stage).observe(elapsed)
+        record_stage(stage, elapsed)
+
+
+def timed_stage(stage):
+    """Dekorator različica `stage_timer`."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage_timer(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_no_face(endpoint):
+    NO_FACE_TOTAL.labels(endpoint=endpoint).inc()
+
+
+def record_verification(accepted):
+    VERIFICATION_TOTAL.labels(result="accept" if accepted else "reject").inc()
+
+
+def record_embedding_cache(hit):
+    EMBEDDING_CACHE_TOTAL.labels(result="hit" if hit else "miss").inc()
+
+
+def record_template_cache(hit):
+    TEMPLATE_CACHE_TOTAL.labels(result="hit" if hit else "miss").inc()
+
+
+def set_template_cache_bytes(num_bytes):
+    TEMPLATE_CACHE_BYTES.set(num_bytes)
+
+
+def record_quality_rejected(reason):
+    QUALITY_REJECTED_TOTAL.labels(reason=reason).inc()
+
+
+def record_rejected(reason):
+    ADMISSION_REJECTED_TOTAL.labels(reason=reason).inc()
+
+
+def set_in_flight(count):
+    IN_FLIGHT.set(count)
+
+
+def set_store_size(num_users, num_embeddings):
+    STORE_USERS.set(num_users)
+    STORE_EMBEDDINGS.set(num_embeddings)
+
+
+def render_metrics():
+    """Vrne (telo, content type) za /metrics v Prometheus text formatu."""
+    if not PROMETHEUS_AVAILABLE:
+        return b"", CONTENT_TYPE_LATEST
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid):
+    """Počisti datoteke meritev končanega gunicorn delavca (multiprocess način)."""
+    if PROMETHEUS_AVAILABLE and os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(pid)
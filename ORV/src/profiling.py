@@ -0,0 +1,127 @@
+# src/profiling.py
+"""
+Profiliranje posameznih zahtevkov.
+
+Ko je profiliranje za zahtevek vklopljeno (config.PROFILING_ENABLED ali glava
+X-Profile-Token od zaupanja vrednega klicatelja), vsak `metrics.stage_timer`
+poleg Prometheus histograma zapiše trajanje tudi v profil trenutnega zahtevka.
+API profil vrne v glavi `Server-Timing`, npr.
+
+    Server-Timing: decode;dur=3.1, detect;dur=41.7, predict;dur=12.0, match;dur=0.4, total;dur=60.2
+
+Izbrani zahtevki (delež PROFILING_DUMP_SAMPLE_RATE ali glava X-Profile-Dump: 1)
+se dodatno profilirajo s cProfile; .prof datoteka se shrani v PROFILING_DUMP_DIR
+(ogled npr. s `snakeviz` ali `python -m pstats`). cProfile zajame samo nit, ki
+obdeluje zahtevek; čas inference v niti MicroBatcher-ja je viden kot čakanje
+(korak `predict`).
+"""
+import contextvars
+import cProfile
+import hmac
+import os
+import random
+import time
+
+from src import config
+
+PROFILE_TOKEN_HEADER = "X-Profile-Token"
+PROFILE_DUMP_HEADER = "X-Profile-Dump"
+
+_current_profile = contextvars.ContextVar("request_profile", default=None)
+
+
+class RequestProfile:
+    """Trajanja korakov enega zahtevka in (po izbiri) cProfile profil."""
+
+    def __init__(self, name, dump=False):
+        self.name = name
+        self.dump = dump
+        self.stages = {}
+        self.dump_path = None
+        self._start = time.perf_counter()
+        self._profiler = None
+
+    def add_stage(self, stage, seconds):
+        # Korak se lahko ponovi (npr. detekcija za več slik v batchu), trajanja seštejemo
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def server_timing(self):
+        """Vrednost glave Server-Timing (trajanja v ms)."""
+        parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.stages.items()]
+        parts.append(f"total;dur={(time.perf_counter() - self._start) * 1000:.1f}")
+        return ", ".join(parts)
+
+    def start_cprofile(self):
+        """Začne cProfile v trenutni niti (samo za izbrane zahtevke)."""
+        if self.dump and self._profiler is None:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError as e:
+                # Od Pythona 3.12 je lahko hkrati aktiven samo en profiler
+                print(f"cProfile ni na voljo za ta zahtevek: {e}")
+                return
+            self._profiler = profiler
+
+    def stop_cprofile(self):
+        """Ustavi cProfile in profil shrani na disk. Vrne pot do datoteke ali None."""
+        if self._profiler is None:
+            return None
+        self._profiler.disable()
+        try:
+            os.makedirs(config.PROFILING_DUMP_DIR, exist_ok=True)
+            filename = f"{time.strftime('%Y%m%d-%H%M%S')}_{self.name}_{os.getpid()}_{id(self):x}.prof"
+            self.dump_path = os.path.join(config.PROFILING_DUMP_DIR, filename)
+            self._profiler.dump_stats(self.dump_path)
+            print(f"Profil zahtevka shranjen: {self.dump_path}")
+        except Exception as e:
+            print(f"Napaka pri shranjevanju profila: {e}")
+            self.dump_path = None
+        self._profiler = None
+        return self.dump_path
+
+    def run(self, fn, *args):
+        """Pokliče fn(*args) pod cProfile (če je zahtevek izbran za dump)."""
+        self.start_cprofile()
+        try:
+            return fn(*args)
+        finally:
+            self.stop_cprofile()
+
+
+def is_profiling_requested(headers):
+    """Ali naj se zahtevek profilira (globalno ali z veljavnim žetonom v glavi)."""
+    if config.PROFILING_ENABLED:
+        return True
+    token = headers.get(PROFILE_TOKEN_HEADER)
+    return bool(config.PROFILING_TOKEN and token
+                and hmac.compare_digest(token, config.PROFILING_TOKEN))
+
+
+def start_request_profile(name, headers):
+    """
+    Začne profil za trenutni zahtevek, če je profiliranje zahtevano.
+    Vrne (profil, žeton za `end_request_profile`) ali (None, None).
+    """
+    if not is_profiling_requested(headers):
+        return None, None
+    dump = (headers.get(PROFILE_DUMP_HEADER) == "1"
+            or random.random() < config.PROFILING_DUMP_SAMPLE_RATE)
+    profile = RequestProfile(name, dump=dump)
+    return profile, _current_profile.set(profile)
+
+
+def end_request_profile(token):
+    if token is not None:
+        _current_profile.reset(token)
+
+
+def current_profile():
+    return _current_profile.get()
+
+
+def record_stage(stage, seconds):
+    """Zapiše trajanje koraka v profil trenutnega zahtevka (če obstaja)."""
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.add_stage(stage, seconds)
@@ -0,0 +1,168 @@
+# src/quantize_model.py
+"""
+INT8 post-training kvantizacija embedding modela za CPU inferenco (TFLite).
+
+Obsegi aktivacij se kalibrirajo na vzorcu učnih slik iz pripravljenega LFW
+dataseta (data_loader.load_prepared_dataset). Nato skripta na testni množici
+primerja verifikacijo (ROC AUC in EER na parih iste/različne osebe) med float
+in INT8 modelom. Če poslabšanje preseže proračun iz config
+(QUANT_MAX_EER_INCREASE, QUANT_MAX_AUC_DROP), se INT8 model zavrne in ne shrani.
+
+Uporaba (iz korena projekta ORV/):
+    python src/quantize_model.py [--model model/face_embedding_model_dim128.keras]
+                                 [--output model/face_embedding_model_dim128_int8.tflite]
+                                 [--data data/lfw_final_dataset_denoise-false.npz]
+
+Sprejet model uporablja API z FACE_EMBEDDING_BACKEND=tflite.
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import tensorflow as tf
+from sklearn.metrics import roc_auc_score, roc_curve
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from src import config
+from src.data_loader import load_prepared_dataset
+from src.export_onnx_model import load_keras_model
+
+DEFAULT_MODEL_PATH = os.path.join(project_root, 'model', config.EMBEDDING_MODEL_NAME)
+DEFAULT_OUTPUT_PATH = os.path.join(project_root, 'model', config.TFLITE_INT8_MODEL_NAME)
+
+
+def quantize_to_int8(keras_model, calibration_images):
+    """
+    Vrne TFLite INT8 model (bajti). Vhod in izhod ostaneta float32, da API
+    pošilja enake vhode kot pri float modelu.
+    """
+    def representative_dataset():
+        for image in calibration_images:
+            yield [np.expand_dims(image.astype(np.float32), axis=0)]
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    return converter.convert()
+
+
+def predict_tflite(tflite_model, images, batch_size=64):
+    """Embeddingi za `images` s TFLite interpreterjem."""
+    interpreter = tf.lite.Interpreter(model_content=tflite_model)
+    input_index = interpreter.get_input_details()[0]['index']
+    output_index = interpreter.get_output_details()[0]['index']
+
+    outputs = []
+    current_size = None
+    for start in range(0, len(images), batch_size):
+        batch = images[start:start + batch_size].astype(np.float32)
+        if len(batch) != current_size:
+            interpreter.resize_tensor_input(input_index, batch.shape)
+            interpreter.allocate_tensors()
+            current_size = len(batch)
+        interpreter.set_tensor(input_index, batch)
+        interpreter.invoke()
+        outputs.append(interpreter.get_tensor(output_index).copy())
+    return np.concatenate(outputs, axis=0)
+
+
+def predict_keras(keras_model, images, batch_size=64):
+    outputs = [np.asarray(keras_model.predict_on_batch(images[start:start + batch_size].astype(np.float32)))
+               for start in range(0, len(images), batch_size)]
+    return np.concatenate(outputs, axis=0)
+
+
+def build_verification_pairs(labels, max_pairs=config.QUANT_EVAL_MAX_PAIRS, seed=0):
+    """
+    Pari indeksov (i, j) in oznake (1 = ista oseba, 0 = različni osebi).
+    Parov različnih oseb je enako kot parov iste osebe.
+    """
+    rng = np.random.default_rng(seed)
+    label_to_indices = {}
+    for idx, label in enumerate(labels):
+        label_to_indices.setdefault(label, []).append(idx)
+
+    genuine = [(a, b) for indices in label_to_indices.values()
+               for i, a in enumerate(indices) for b in indices[i + 1:]]
+    if len(genuine) > max_pairs:
+        genuine = [genuine[i] for i in rng.choice(len(genuine), max_pairs, replace=False)]
+
+    impostor = []
+    while len(impostor) < len(genuine):
+        a, b = rng.integers(0, len(labels), size=2)
+        if labels[a] != labels[b]:
+            impostor.append((a, b))
+
+    pairs = np.array(genuine + impostor, dtype=np.int64).reshape(-1, 2)
+    is_same = np.concatenate([np.ones(len(genuine)), np.zeros(len(impostor))])
+    return pairs, is_same
+
+
+def verification_metrics(embeddings, pairs, is_same):
+    """ROC AUC in EER kosinusne podobnosti na danih parih."""
+    normalized = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+    scores = np.sum(normalized[pairs[:, 0]] * normalized[pairs[:, 1]], axis=1)
+
+    fpr, tpr, _ = roc_curve(is_same, scores)
+    fnr = 1.0 - tpr
+    eer_idx = int(np.nanargmin(np.abs(fnr - fpr)))
+    eer = float((fpr[eer_idx] + fnr[eer_idx]) / 2.0)
+    return float(roc_auc_score(is_same, scores)), eer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="INT8 kvantizacija embedding modela (TFLite).")
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH, help="Pot do .keras modela")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT_PATH, help="Pot do izhodne .tflite datoteke")
+    parser.add_argument('--data', default=config.FINAL_DATASET_PATH, help="Pot do pripravljenega .npz dataseta")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.model):
+        print(f"NAPAKA: Model '{args.model}' ne obstaja. Prosim, najprej naučite model.")
+        sys.exit(1)
+
+    dataset = load_prepared_dataset(args.data)
+    if dataset is None:
+        sys.exit(1)
+    train_images, _, _, _, test_images, test_labels = dataset
+
+    pairs, is_same = build_verification_pairs(test_labels)
+    if is_same.sum() == 0:
+        print("NAPAKA: V testni množici ni oseb z vsaj dvema slikama, ROC/EER ni mogoče izračunati.")
+        sys.exit(1)
+
+    print(f"Nalaganje Keras modela iz: {args.model}")
+    keras_model = load_keras_model(args.model)
+
+    rng = np.random.default_rng(0)
+    num_calibration = min(config.QUANT_CALIBRATION_SAMPLES, len(train_images))
+    calibration_images = train_images[rng.choice(len(train_images), num_calibration, replace=False)]
+    print(f"Kvantizacija v INT8 (kalibracija na {num_calibration} učnih slikah)...")
+    tflite_model = quantize_to_int8(keras_model, calibration_images)
+
+    print(f"Primerjava verifikacije na testni množici ({len(pairs)} parov)...")
+    float_auc, float_eer = verification_metrics(predict_keras(keras_model, test_images), pairs, is_same)
+    int8_auc, int8_eer = verification_metrics(predict_tflite(tflite_model, test_images), pairs, is_same)
+    print(f"  Float: AUC={float_auc:.4f}  EER={float_eer:.4f}")
+    print(f"  INT8:  AUC={int8_auc:.4f}  EER={int8_eer:.4f}")
+    print(f"  Razlika: AUC {int8_auc - float_auc:+.4f} (dovoljeno -{config.QUANT_MAX_AUC_DROP}), "
+          f"EER {int8_eer - float_eer:+.4f} (dovoljeno +{config.QUANT_MAX_EER_INCREASE})")
+
+    if (int8_eer - float_eer > config.QUANT_MAX_EER_INCREASE
+            or float_auc - int8_auc > config.QUANT_MAX_AUC_DROP):
+        print("NAPAKA: INT8 model preveč poslabša verifikacijo. Model zavrnjen (ni shranjen).")
+        sys.exit(1)
+
+    with open(args.output, 'wb') as f:
+        f.write(tflite_model)
+    print(f"INT8 model uspešno shranjen: {args.output} ({len(tflite_model) / 1024:.0f} KiB)")
+    print("Za uporabo v API-ju nastavi FACE_EMBEDDING_BACKEND=tflite.")
+
+
+if __name__ == '__main__':
+    main()
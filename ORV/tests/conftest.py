@@ -0,0 +1,56 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+ORV_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Moduli projekta se uvažajo kot paketi iz korena ORV (api, user_management, src)
+sys.path.insert(0, ORV_DIR)
+
+# Aplikacije se v testih uvažajo brez ozadnega nalaganja in ogrevanja pravih modelov
+os.environ.setdefault("FACE_API_WARMUP_ON_IMPORT", "0")
+
+
+def _script_env(tmp_path, env):
+    process_env = dict(os.environ, PYTHONPATH=ORV_DIR, FACE_DATA_STORAGE_DIR=str(tmp_path / "data"),
+                       FACE_STORE_FSYNC="0", FACE_STORE_SYNC_INTERVAL_S="0")
+    process_env.update(env)
+    return process_env
+
+
+@pytest.fixture
+def run_python(tmp_path):
+    """
+    Požene skripto v svežem procesu: user_management.db se nastavi ob uvozu iz
+    okolja, zato ima vsak scenarij svoj proces in svojo mapo s podatki.
+    Vrne izpis skripte; če se skripta ne konča uspešno, test pade.
+    """
+    def run(source, timeout=60, **env):
+        result = subprocess.run([sys.executable, "-c", textwrap.dedent(source)], cwd=ORV_DIR,
+                                env=_script_env(tmp_path, env), capture_output=True, text=True, timeout=timeout)
+        assert result.returncode == 0, result.stdout + result.stderr
+        return result.stdout
+
+    return run
+
+
+@pytest.fixture
+def start_python(tmp_path):
+    """Kot run_python, a skripta teče v ozadju; vrne subprocess.Popen (stdout in stderr kot besedilo)."""
+    processes = []
+
+    def start(source, **env):
+        process = subprocess.Popen([sys.executable, "-c", textwrap.dedent(source)], cwd=ORV_DIR,
+                                   env=_script_env(tmp_path, env), stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE, text=True)
+        processes.append(process)
+        return process
+
+    yield start
+    for process in processes:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
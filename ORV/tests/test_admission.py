@@ -0,0 +1,97 @@
+import threading
+import time
+
+import pytest
+
+from api import admission
+from api.admission import AdmissionController, DeadlineExceeded
+
+
+def test_in_flight_limit_and_release():
+    controller = AdmissionController(max_in_flight=2, retry_after_s=3)
+    assert controller.try_acquire() and controller.try_acquire()
+    assert not controller.try_acquire()
+    controller.release()
+    assert controller.try_acquire()
+
+    stats = controller.get_stats()
+    assert stats == {"max_in_flight": 2, "in_flight": 2, "admitted_total": 3, "rejected_total": 1,
+                     "retry_after_s": 3}
+
+
+def test_zero_means_unlimited():
+    controller = AdmissionController(max_in_flight=0)
+    assert all(controller.try_acquire() for _ in range(100))
+
+
+def test_parse_deadline():
+    before = time.monotonic()
+    deadline = admission.parse_deadline({admission.DEADLINE_HEADER: "250"})
+    assert before + 0.25 <= deadline <= time.monotonic() + 0.25
+    assert admission.parse_deadline({}) is None
+    assert admission.parse_deadline({admission.DEADLINE_HEADER: "soon"}) is None
+
+
+def test_deadline_is_scoped_to_context():
+    token = admission.start_deadline(time.monotonic() - 1)
+    try:
+        with pytest.raises(DeadlineExceeded):
+            admission.check_deadline()
+        # Druga nit ima svoj kontekst in roka ne vidi
+        errors = []
+        thread = threading.Thread(target=lambda: errors.append(admission.current_deadline()))
+        thread.start()
+        thread.join()
+        assert errors == [None]
+    finally:
+        admission.end_deadline(token)
+    admission.check_deadline()
+    assert admission.start_deadline(None) is None
+
+
+@pytest.fixture
+def asgi_client(monkeypatch):
+    pytest.importorskip("fastapi")
+    pytest.importorskip("multipart")
+    from fastapi.testclient import TestClient
+
+    import face_recognition_asgi as asgi_app
+    from api import face_service
+
+    monkeypatch.setattr(asgi_app, "is_user_registered", lambda user_id: True)
+    monkeypatch.setattr(face_service, "is_user_registered", lambda user_id: True)
+    with TestClient(asgi_app.app) as client:
+        yield client
+
+
+def _upload():
+    return {"data": {"user_id": "alice"}, "files": {"image": ("face.jpg", b"x", "image/jpeg")}}
+
+
+def test_overloaded_request_gets_503_with_retry_after(asgi_client, monkeypatch):
+    from api import face_service
+
+    controller = AdmissionController(max_in_flight=1, retry_after_s=7)
+    monkeypatch.setattr(face_service, "admission", controller)
+    assert controller.try_acquire()
+
+    response = asgi_client.post("/verify", **_upload())
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "7"
+    assert asgi_client.get("/health").status_code == 200
+
+    controller.release()
+    monkeypatch.setattr(face_service, "verify_face_image", lambda user_id, image_bytes: ({"success": True}, 200))
+    assert asgi_client.post("/verify", **_upload()).status_code == 200
+    assert controller.get_stats()["in_flight"] == 0
+
+
+def test_expired_deadline_returns_504(asgi_client, monkeypatch):
+    from api import face_service
+
+    monkeypatch.setattr(face_service, "get_embeddings_from_pipelines",
+                        lambda pipelines: admission.check_deadline() or [None] * len(pipelines))
+    monkeypatch.setattr(face_service, "create_face_pipeline", lambda image_bytes: object())
+    response = asgi_client.post("/verify", headers={admission.DEADLINE_HEADER: "0"}, **_upload())
+    assert response.status_code == 504
+    assert response.json()["message"] == "Request deadline exceeded"
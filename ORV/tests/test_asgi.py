@@ -0,0 +1,96 @@
+import threading
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("multipart")
+
+from fastapi.testclient import TestClient
+
+import face_recognition_asgi as asgi_app
+from api import face_service
+
+
+@pytest.fixture
+def client(monkeypatch):
+    registered = {"alice"}
+    monkeypatch.setattr(asgi_app, "is_user_registered", lambda user_id: user_id in registered)
+    with TestClient(asgi_app.app) as test_client:
+        yield test_client, registered
+
+
+def _upload(user_id="bob", data=b"image-bytes"):
+    return {"data": {"user_id": user_id}, "files": {"image": ("face.jpg", data, "image/jpeg")}}
+
+
+def test_register_runs_cpu_stage_in_bounded_pool(client, monkeypatch):
+    test_client, _ = client
+    calls = []
+
+    def register(user_id, image_bytes):
+        calls.append((user_id, image_bytes, threading.current_thread().name))
+        return {"success": True, "embeddings_count": 1}, 200
+
+    monkeypatch.setattr(face_service, "register_face_image", register)
+    response = test_client.post("/register", **_upload())
+
+    assert response.status_code == 200
+    assert response.json() == {"success": True, "embeddings_count": 1}
+    [(user_id, image_bytes, thread_name)] = calls
+    assert (user_id, image_bytes) == ("bob", b"image-bytes")
+    assert thread_name.startswith("face-cpu")
+
+
+def test_service_status_is_passed_through(client, monkeypatch):
+    test_client, _ = client
+    monkeypatch.setattr(face_service, "verify_face_image",
+                        lambda user_id, image_bytes: ({"success": False, "message": "No face"}, 400))
+    response = test_client.post("/verify", **_upload("alice"))
+    assert response.status_code == 400
+    assert response.json()["message"] == "No face"
+
+
+def test_request_validation(client, monkeypatch):
+    test_client, _ = client
+    monkeypatch.setattr(face_service, "register_face_image",
+                        lambda *args: pytest.fail("CPU stage must not run for invalid requests"))
+    assert test_client.post("/register", data={"image": "x"}).status_code == 400
+    assert test_client.post("/register", data={"user_id": "bob"}).status_code == 400
+    assert test_client.post("/register", **_upload("alice")).status_code == 409
+    assert test_client.post("/verify", **_upload("carol")).status_code == 404
+
+
+def test_service_error_returns_500(client, monkeypatch):
+    test_client, _ = client
+
+    def delete(user_id):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(face_service, "delete_user_face", delete)
+    response = test_client.delete("/user/alice")
+    assert response.status_code == 500
+    assert "disk full" in response.json()["message"]
+
+
+def test_registration_lookup_runs_off_the_event_loop(client, monkeypatch):
+    test_client, registered = client
+    lookups = []
+
+    def is_user_registered(user_id):
+        # S shrambo sqlite je to poizvedba v bazi, ki ne sme blokirati zanke dogodkov
+        lookups.append(threading.current_thread().name)
+        return user_id in registered
+
+    monkeypatch.setattr(asgi_app, "is_user_registered", is_user_registered)
+    assert test_client.post("/verify", **_upload("carol")).status_code == 404
+    assert test_client.post("/register", **_upload("alice")).status_code == 409
+    assert len(lookups) == 2 and all(name.startswith("face-cpu") for name in lookups)
+
+
+def test_index_and_stats_match_flask_app(client):
+    import face_recognition_api as flask_app
+
+    test_client, _ = client
+    flask_client = flask_app.app.test_client()
+    assert test_client.get("/").json() == flask_client.get("/").get_json()
+    assert test_client.get("/stats").json().keys() == flask_client.get("/stats").get_json().keys()
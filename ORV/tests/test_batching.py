@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from api.admission import DeadlineExceeded
+from api.batching import MicroBatcher
+
+
+def _double(batch):
+    return batch * 2
+
+
+@pytest.fixture
+def make_batcher():
+    batchers = []
+
+    def make(predict_fn=_double, **kwargs):
+        batcher = MicroBatcher(predict_fn, **kwargs)
+        batchers.append(batcher)
+        return batcher
+
+    yield make
+    for batcher in batchers:
+        batcher.stop()
+
+
+def test_concurrent_inputs_share_one_model_call(make_batcher):
+    calls = []
+
+    def predict(batch):
+        calls.append(len(batch))
+        return batch + 1
+
+    batcher = make_batcher(predict, max_batch_size=4, max_wait_ms=500)
+    futures = [batcher.submit(np.full(3, i, dtype=np.float32)) for i in range(4)]
+    for i, future in enumerate(futures):
+        np.testing.assert_array_equal(future.result(timeout=5), np.full(3, i + 1))
+    assert calls == [4]
+    stats = batcher.get_stats()
+    assert stats["batches_total"] == 1 and stats["items_total"] == 4
+
+
+def test_partial_batch_runs_after_wait_window(make_batcher):
+    batcher = make_batcher(max_batch_size=16, max_wait_ms=20)
+    np.testing.assert_array_equal(batcher.predict(np.ones(2), timeout=5), np.full(2, 2.0))
+    assert batcher.get_stats()["max_batch_size_seen"] == 1
+
+
+def test_model_error_fails_batch_and_worker_survives(make_batcher):
+    fail = threading.Event()
+    fail.set()
+
+    def predict(batch):
+        if fail.is_set():
+            raise ValueError("broken model")
+        return batch
+
+    batcher = make_batcher(predict, max_batch_size=2, max_wait_ms=200)
+    futures = [batcher.submit(np.ones(2)) for _ in range(2)]
+    for future in futures:
+        with pytest.raises(ValueError, match="broken model"):
+            future.result(timeout=5)
+
+    fail.clear()
+    np.testing.assert_array_equal(batcher.predict(np.ones(2), timeout=5), np.ones(2))
+
+
+def test_wrong_number_of_outputs_fails_whole_batch(make_batcher):
+    batcher = make_batcher(lambda batch: batch[:1], max_batch_size=2, max_wait_ms=200)
+    futures = [batcher.submit(np.ones(2)) for _ in range(2)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="1 outputs for a batch of 2"):
+            future.result(timeout=5)
+
+
+def test_cancelled_future_does_not_break_the_batch(make_batcher):
+    release = threading.Event()
+
+    def predict(batch):
+        release.wait(5)
+        return batch
+
+    batcher = make_batcher(predict, max_batch_size=1, max_wait_ms=0)
+    blocker = batcher.submit(np.zeros(2))
+    cancelled = batcher.submit(np.ones(2))
+    assert cancelled.cancel()
+    kept = batcher.submit(np.full(2, 3.0))
+    release.set()
+
+    blocker.result(timeout=5)
+    np.testing.assert_array_equal(kept.result(timeout=5), np.full(2, 3.0))
+    assert cancelled.cancelled()
+
+
+def test_submit_after_stop_is_rejected(make_batcher):
+    batcher = make_batcher()
+    batcher.stop()
+    with pytest.raises(RuntimeError):
+        batcher.submit(np.ones(2))
+
+
+@pytest.mark.parametrize("kwargs", [{"max_batch_size": 0}, {"max_wait_ms": -1}])
+def test_invalid_configuration(kwargs):
+    with pytest.raises(ValueError):
+        MicroBatcher(_double, **kwargs)
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="fork() ni na voljo")
+def test_worker_is_restarted_in_forked_child(make_batcher):
+    batcher = make_batcher(max_batch_size=2, max_wait_ms=1)
+    np.testing.assert_array_equal(batcher.predict(np.ones(2), timeout=5), np.full(2, 2.0))
+
+    pid = os.fork()
+    if pid == 0:
+        # Otrok: brez ponovnega zagona delavca bi predict obvisel do timeouta
+        try:
+            ok = np.array_equal(batcher.predict(np.ones(2), timeout=5), np.full(2, 2.0))
+        except BaseException:
+            ok = False
+        os._exit(0 if ok else 1)
+
+    _, status = os.waitpid(pid, 0)
+    assert os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0
+    np.testing.assert_array_equal(batcher.predict(np.ones(2), timeout=5), np.full(2, 2.0))
+
+
+def test_expired_inputs_are_dropped_before_the_model(make_batcher):
+    seen = []
+
+    def predict(batch):
+        seen.append(batch.copy())
+        return batch * 2
+
+    batcher = make_batcher(predict, max_batch_size=4, max_wait_ms=50)
+    expired = batcher.submit(np.full(2, 1.0), deadline=time.monotonic() - 1)
+    live = batcher.submit(np.full(2, 3.0), deadline=time.monotonic() + 30)
+    no_deadline = batcher.submit(np.full(2, 5.0))
+
+    with pytest.raises(DeadlineExceeded):
+        expired.result(timeout=5)
+    np.testing.assert_array_equal(live.result(timeout=5), np.full(2, 6.0))
+    np.testing.assert_array_equal(no_deadline.result(timeout=5), np.full(2, 10.0))
+    assert sorted(row[0] for batch in seen for row in batch) == [3.0, 5.0]
+
+
+def test_batch_of_only_expired_inputs_skips_the_model(make_batcher):
+    calls = []
+    batcher = make_batcher(lambda batch: calls.append(batch) or batch, max_batch_size=2, max_wait_ms=1)
+    future = batcher.submit(np.ones(2), deadline=time.monotonic() - 1)
+    with pytest.raises(DeadlineExceeded):
+        future.result(timeout=5)
+    # Delavec ostane živ in obdela naslednji vhod
+    np.testing.assert_array_equal(batcher.predict(np.ones(2), timeout=5), np.ones(2))
+    assert len(calls) == 1
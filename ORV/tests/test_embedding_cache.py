@@ -0,0 +1,111 @@
+from concurrent.futures import Future
+
+import numpy as np
+import pytest
+
+from api import embedding_cache as cache_module
+from api.embedding_cache import EmbeddingCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_key_depends_on_content_and_model_version():
+    key = EmbeddingCache.make_key(b"image", "keras:1")
+    assert key == EmbeddingCache.make_key(b"image", "keras:1")
+    assert key != EmbeddingCache.make_key(b"image!", "keras:1")
+    assert key != EmbeddingCache.make_key(b"image", "onnx:1")
+
+
+def test_hit_returns_read_only_copy():
+    cache = EmbeddingCache(max_entries=4)
+    embedding = np.arange(4, dtype=np.float32)
+    cache.put("k", (1, 2, 3, 4), embedding)
+    embedding[0] = 99
+
+    face_box, cached, quality = cache.get("k")
+    assert face_box == (1, 2, 3, 4) and quality is None
+    np.testing.assert_array_equal(cached, np.arange(4))
+    with pytest.raises(ValueError):
+        cached[0] = 1
+
+
+def test_no_face_results_are_cached():
+    cache = EmbeddingCache(max_entries=4)
+    cache.put("k", None, None)
+    assert cache.get("k") == (None, None, None)
+    assert cache.get("missing") is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = EmbeddingCache(max_entries=2)
+    cache.put("a", None, None)
+    cache.put("b", None, None)
+    assert cache.get("a") is not None
+    cache.put("c", None, None)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    stats = cache.get_stats()
+    assert stats["size"] == 2 and stats["evictions"] == 1
+    assert stats["hits"] == 3 and stats["misses"] == 1
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = EmbeddingCache(max_entries=4, ttl_s=10)
+    cache.put("k", None, None)
+    clock[0] += 9
+    assert cache.get("k") is not None
+    clock[0] += 2
+    assert cache.get("k") is None
+    assert cache.get_stats()["expirations"] == 1
+
+
+def test_disabled_cache_stores_nothing():
+    cache = EmbeddingCache(max_entries=0)
+    cache.put("k", None, None)
+    assert not cache.enabled and cache.get("k") is None
+    assert cache.get_stats()["misses"] == 0
+
+
+def test_repeated_upload_skips_detection_and_inference(monkeypatch):
+    import cv2
+
+    from api import face_embedder
+    from api.face_pipeline import FacePipeline
+
+    class Cascade:
+        calls = 0
+
+        def detectMultiScale2(self, gray, **kwargs):
+            Cascade.calls += 1
+            return np.array([[10, 10, 60, 60]], dtype=np.int32), np.array([9], dtype=np.int32)
+
+    class Batcher:
+        calls = 0
+
+        def submit(self, model_input, deadline=None):
+            Batcher.calls += 1
+            future = Future()
+            future.set_result(np.ones(4, dtype=np.float32))
+            return future
+
+    monkeypatch.setattr(face_embedder, "_is_initialized", True)
+    monkeypatch.setattr(face_embedder, "_batcher", Batcher())
+    monkeypatch.setattr(face_embedder, "_cache_version", "test")
+    monkeypatch.setattr(face_embedder, "embedding_cache", EmbeddingCache(max_entries=8))
+
+    ok, encoded = cv2.imencode(".png", np.full((120, 120, 3), 90, dtype=np.uint8))
+    image_bytes = encoded.tobytes()
+    first = face_embedder.get_embeddings_from_pipelines([FacePipeline(image_bytes, Cascade())])
+    second_pipeline = FacePipeline(image_bytes, Cascade())
+    second = face_embedder.get_embeddings_from_pipelines([second_pipeline])
+
+    np.testing.assert_array_equal(first[0], second[0])
+    assert Cascade.calls == 1 and Batcher.calls == 1
+    # Okvir obraza iz predpomnilnika uporabijo tudi nadaljnji koraki
+    assert second_pipeline.face_box == (10, 10, 60, 60)
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("keras_facenet")
+
+from face_processing import embedding_model  # noqa: E402
+
+
+class _CountingModel:
+    def __init__(self):
+        self.batch_sizes = []
+
+    def embeddings(self, batch):
+        assert batch.dtype == np.float32 and batch.shape[1:] == (160, 160, 3)
+        self.batch_sizes.append(len(batch))
+        return batch.reshape(len(batch), -1)[:, :4]
+
+
+@pytest.fixture
+def model(monkeypatch):
+    model = _CountingModel()
+    monkeypatch.setattr(embedding_model, "embedder_model", model)
+    return model
+
+
+def test_all_faces_go_through_one_model_call(model):
+    faces = np.random.default_rng(0).random((6, 160, 160, 3))
+    embeddings = embedding_model.get_face_embeddings_batch(faces)
+    assert embeddings.shape == (6, 4)
+    assert model.batch_sizes == [6]
+
+
+def test_faces_of_other_sizes_are_resized(model):
+    faces = [np.ones((120, 100, 3), dtype=np.float32), np.ones((200, 200, 3), dtype=np.float32)]
+    assert embedding_model.get_face_embeddings_batch(faces).shape == (2, 4)
+    assert model.batch_sizes == [2]
+
+
+def test_single_face_delegates_to_batch(model):
+    embedding = embedding_model.get_face_embedding(np.ones((160, 160, 3), dtype=np.float32))
+    assert embedding.shape == (4,)
+    assert model.batch_sizes == [1]
+
+
+def test_model_error_returns_none(monkeypatch):
+    class _BrokenModel:
+        def embeddings(self, batch):
+            raise RuntimeError("inference failed")
+
+    monkeypatch.setattr(embedding_model, "embedder_model", _BrokenModel())
+    assert embedding_model.get_face_embeddings_batch(np.ones((2, 160, 160, 3), dtype=np.float32)) is None
@@ -0,0 +1,62 @@
+import cv2
+import numpy as np
+import pytest
+
+from api.face_pipeline import FacePipeline
+
+
+class _FakeCascade:
+    """Vrne vnaprej dane okvirje in šteje klice detekcije."""
+
+    def __init__(self, boxes):
+        self.boxes = boxes
+        self.calls = 0
+
+    def detectMultiScale2(self, gray, **kwargs):
+        self.calls += 1
+        boxes = np.array(self.boxes, dtype=np.int32).reshape(-1, 4)
+        return boxes, np.full(len(boxes), 9, dtype=np.int32)
+
+
+@pytest.fixture
+def image_bytes():
+    image = np.zeros((240, 320, 3), dtype=np.uint8)
+    image[:, :, 2] = 200
+    ok, encoded = cv2.imencode(".png", image)
+    assert ok
+    return encoded.tobytes()
+
+
+def test_image_is_decoded_and_detected_once(image_bytes):
+    cascade = _FakeCascade([(10, 10, 40, 40), (100, 50, 120, 100)])
+    pipeline = FacePipeline(image_bytes, cascade)
+
+    assert pipeline.is_valid
+    assert pipeline.image_bgr is pipeline.image_bgr
+    # Največji obraz je prvi, detekcija teče samo enkrat ne glede na število izrezov
+    assert pipeline.face_box == (100, 50, 120, 100)
+    small = pipeline.face_crop(64)
+    padded = pipeline.face_input(160, padded=True)
+    assert pipeline.face_crop(64) is small
+    assert cascade.calls == 1
+
+    assert small.shape == (64, 64, 3) and small.dtype == np.uint8
+    assert padded.shape == (160, 160, 3) and padded.dtype == np.float32
+    assert 0.0 <= padded.min() and padded.max() <= 1.0
+    # Barve so v RGB (slika je rdeča v BGR zapisu)
+    assert small[..., 0].mean() == pytest.approx(200, abs=1)
+
+
+def test_padded_box_stays_inside_image(image_bytes):
+    pipeline = FacePipeline(image_bytes, _FakeCascade([(0, 0, 100, 100)]))
+    x, y, w, h = pipeline._padded_box()
+    assert x == 0 and y == 0 and w > 100 and h > 100
+
+
+def test_invalid_bytes_and_no_face(image_bytes):
+    invalid = FacePipeline(b"not an image", _FakeCascade([(0, 0, 10, 10)]))
+    assert not invalid.is_valid and invalid.faces == [] and invalid.face_crop(64) is None
+
+    cascade = _FakeCascade([])
+    no_face = FacePipeline(image_bytes, cascade)
+    assert no_face.face_box is None and no_face.face_input(160) is None
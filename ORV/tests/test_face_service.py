@@ -0,0 +1,94 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from api import face_service
+
+
+class _FakePipeline:
+    def __init__(self, image_bytes):
+        self.image_bytes = image_bytes
+        self.face_box = None if image_bytes == b"no-face" else (0, 0, 8, 8)
+        self.quality = None
+        self.quality_error = None
+
+    def face_input(self, size, padded=False):
+        # Prazen izrez povzroči napako pri augmentaciji
+        size = 0 if self.image_bytes == b"bad-crop" else size
+        return np.zeros((size, size, 3), dtype=np.float32)
+
+
+@pytest.fixture
+def service(monkeypatch):
+    """face_service with fake models and an in-memory store."""
+    stored = {}
+
+    def register(user_id, embeddings):
+        if user_id == "broken":
+            raise IOError("store unavailable")
+        stored[user_id] = embeddings
+
+    def embed(pipelines):
+        return [None if p.image_bytes == b"no-face" else np.ones((1, 4), dtype=np.float32) for p in pipelines]
+
+    def augment(face):
+        if face.shape[0] == 0:
+            raise ValueError("bad face")
+        return [face, face]
+
+    monkeypatch.setattr(face_service, "FACE_PROCESSING_AVAILABLE", True)
+    monkeypatch.setattr(face_service, "_augmentation", SimpleNamespace(generate_augmented_faces=augment))
+    monkeypatch.setattr(face_service, "_facenet", SimpleNamespace(
+        EXPECTED_EMBEDDING_SHAPE=(8, 8),
+        get_face_embeddings_batch=lambda faces: [np.full(4, 2.0, dtype=np.float32) for _ in faces],
+    ))
+    monkeypatch.setattr(face_service, "create_face_pipeline", _FakePipeline)
+    monkeypatch.setattr(face_service, "get_embeddings_from_pipelines", embed)
+    monkeypatch.setattr(face_service, "register_user_embeddings", register)
+    monkeypatch.setattr(face_service, "is_user_registered", lambda user_id: user_id in stored)
+    return stored
+
+
+def test_register_batch_embeds_augmentations(service):
+    results = face_service.register_faces_batch([("a", b"img"), ("b", b"img")])
+    assert [status for _, status in results] == [200, 200]
+    assert all(payload["embeddings_count"] == 3 for payload, _ in results)
+    assert len(service["a"]) == 3
+
+
+def test_failed_augmentation_inference_is_reported(service, monkeypatch):
+    monkeypatch.setattr(face_service._facenet, "get_face_embeddings_batch", lambda faces: None)
+    [(payload, status)] = face_service.register_faces_batch([("a", b"img")])
+    assert status == 200
+    assert payload["embeddings_count"] == 1
+    assert "(augmentation failed)" in payload["message"]
+
+
+def test_failed_augmentation_only_affects_its_item(service):
+    results = face_service.register_faces_batch([("a", b"bad-crop"), ("b", b"img")])
+    assert "(augmentation failed)" in results[0][0]["message"]
+    assert results[1][0]["embeddings_count"] == 3
+
+
+def test_register_batch_reports_each_item(service):
+    service["taken"] = []
+    items = [("a", b"img"), ("taken", b"img"), ("broken", b"img"), ("c", b"no-face"), ("", b"img"), ("d", b"img")]
+    results = face_service.register_faces_batch(items)
+    assert [status for _, status in results] == [200, 409, 500, 400, 400, 200]
+    assert "store unavailable" in results[2][0]["message"]
+    assert set(service) == {"taken", "a", "d"}
+
+    response = face_service.batch_response(items, results)
+    assert response["count"] == len(items)
+    assert [r["status"] for r in response["results"]] == [200, 409, 500, 400, 400, 200]
+
+
+def test_model_error_fails_pending_items_only(service, monkeypatch):
+    def embed(pipelines):
+        raise RuntimeError("model crashed")
+
+    monkeypatch.setattr(face_service, "get_embeddings_from_pipelines", embed)
+    results = face_service.register_faces_batch([("a", b"img"), ("", b"img")])
+    assert [status for _, status in results] == [500, 400]
+    assert "model crashed" in results[0][0]["message"]
@@ -0,0 +1,137 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from api.frame_stream import MultipartFrameParser, boundary_from_content_type
+
+
+def _part(frame, with_length=True):
+    headers = b"Content-Type: image/jpeg\r\n"
+    if with_length:
+        headers += b"Content-Length: %d\r\n" % len(frame)
+    return b"--frame\r\n" + headers + b"\r\n" + frame + b"\r\n"
+
+
+def _feed_in_chunks(parser, body, size):
+    frames = []
+    for start in range(0, len(body), size):
+        frames.extend(parser.feed(body[start:start + size]))
+    return frames + parser.close()
+
+
+def test_boundary_from_content_type():
+    assert boundary_from_content_type("multipart/x-mixed-replace; boundary=frame") == "frame"
+    assert boundary_from_content_type('multipart/x-mixed-replace; Boundary="abc"') == "abc"
+    assert boundary_from_content_type("multipart/x-mixed-replace") is None
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+@pytest.mark.parametrize("with_length", [True, False])
+def test_frames_are_split_regardless_of_chunking(chunk_size, with_length):
+    frames = [b"first", b"\r\n--not-a-boundary\r\n" if with_length else b"second", b"x" * 300]
+    body = b"".join(_part(f, with_length) for f in frames) + b"--frame--\r\n"
+    parser = MultipartFrameParser("frame", max_frame_bytes=1024)
+    assert _feed_in_chunks(parser, body, chunk_size) == frames
+    assert parser.finished
+
+
+def test_frames_are_returned_as_soon_as_they_arrive():
+    parser = MultipartFrameParser("frame", max_frame_bytes=1024)
+    assert parser.feed(_part(b"one")) == [b"one"]
+    assert parser.feed(_part(b"two")[:10]) == []
+    assert parser.feed(_part(b"two")[10:]) == [b"two"]
+
+
+def test_unterminated_stream_returns_last_frame_on_close():
+    parser = MultipartFrameParser("frame", max_frame_bytes=1024)
+    assert parser.feed(_part(b"one") + b"--frame\r\n\r\nlast") == [b"one"]
+    assert parser.close() == [b"last"]
+    assert parser.feed(_part(b"late")) == []
+
+
+def test_declared_length_over_limit_is_rejected_immediately():
+    parser = MultipartFrameParser("frame", max_frame_bytes=100)
+    with pytest.raises(ValueError):
+        parser.feed(b"--frame\r\nContent-Length: 101\r\n\r\n")
+
+
+def test_buffer_without_length_cannot_grow_without_bound():
+    parser = MultipartFrameParser("frame", max_frame_bytes=100)
+    parser.feed(b"--frame\r\n\r\n")
+    with pytest.raises(ValueError):
+        for _ in range(100):
+            parser.feed(b"y" * 100)
+
+
+@pytest.fixture(params=["asgi", "flask"])
+def burst_client(request, monkeypatch):
+    from api import face_service
+
+    def pipeline(image_bytes):
+        face_box = None if image_bytes == b"blank" else (0, 0, 8, 8)
+        return SimpleNamespace(face_box=face_box, quality=None, quality_error=None)
+
+    monkeypatch.setattr(face_service, "create_face_pipeline", pipeline)
+    monkeypatch.setattr(face_service, "get_embeddings_from_pipelines",
+                        lambda pipelines: [None if p.face_box is None else np.ones((1, 4)) for p in pipelines])
+    if request.param == "flask":
+        pytest.importorskip("flask_cors")
+        import face_recognition_api as flask_app
+
+        monkeypatch.setattr(flask_app, "is_user_registered", lambda user_id: True)
+        yield flask_app.app.test_client(), face_service
+        return
+
+    pytest.importorskip("fastapi")
+    from fastapi.testclient import TestClient
+
+    import face_recognition_asgi as asgi_app
+
+    monkeypatch.setattr(asgi_app, "is_user_registered", lambda user_id: True)
+    with TestClient(asgi_app.app) as client:
+        yield client, face_service
+
+
+def _post_stream(client, body):
+    # Flaskov testni odjemalec surovo telo sprejme kot data=, Starlettov kot content=
+    body_arg = "data" if hasattr(client, "application") else "content"
+    return client.post("/verify/burst?user_id=alice", **{body_arg: body},
+                       headers={"Content-Type": "multipart/x-mixed-replace; boundary=frame"})
+
+
+def _payload(response):
+    return response.get_json() if hasattr(response, "get_json") else response.json()
+
+
+def test_stream_stops_at_first_match(burst_client, monkeypatch):
+    client, face_service = burst_client
+    scores = iter([0.2, 0.9, 0.95])
+    monkeypatch.setattr(face_service, "verify_user_by_embeddings",
+                        lambda user_id, embeddings: [(s >= 0.65, s) for s in (next(scores) for _ in embeddings)])
+    body = b"".join(_part(f) for f in (b"blank", b"a", b"b", b"c")) + b"--frame--\r\n"
+    response = _post_stream(client, body)
+    payload = _payload(response)
+    assert response.status_code == 200 and payload["verified"]
+    assert payload["matched_frame"] == 2 and payload["frames_processed"] == 3
+
+
+def test_oversized_stream_frame_is_413(burst_client, monkeypatch):
+    client, face_service = burst_client
+    from src import config
+
+    monkeypatch.setattr(config, "BURST_MAX_FRAME_BYTES", 16)
+    response = _post_stream(client, _part(b"z" * 17))
+    assert response.status_code == 413
+
+
+def test_scoring_error_is_500_not_413(burst_client, monkeypatch):
+    client, face_service = burst_client
+
+    def verify(user_id, embeddings):
+        raise ValueError("embedding dimension mismatch")
+
+    monkeypatch.setattr(face_service, "verify_user_by_embeddings", verify)
+    response = _post_stream(client, _part(b"a") + b"--frame--\r\n")
+    assert response.status_code == 500
+    assert "embedding dimension mismatch" in _payload(response)["message"]
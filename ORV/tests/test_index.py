@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from user_management.index import ExactIndex, GalleryIndex, IVFIndex
+from user_management.matrix_store import MatrixStore
+
+
+def _gallery(num_users=300, per_user=3, dim=32, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(num_users, dim)).astype(np.float32)
+    return {
+        f"user{u}": [centers[u] + 0.05 * rng.normal(size=dim).astype(np.float32) for _ in range(per_user)]
+        for u in range(num_users)
+    }, centers
+
+
+def _build(index, store):
+    index.add_many((user_id, np.stack(embeddings)) for user_id, embeddings in store.items())
+    return index
+
+
+def test_ivf_probing_all_lists_matches_exact():
+    store, centers = _gallery()
+    exact = _build(ExactIndex(32, block_size=64), store)
+    ivf = _build(IVFIndex(32, nlist=16, nprobe=16, block_size=64), store)
+    for query in centers[:50]:
+        expected, got = exact.search(query, top_k=5), ivf.search(query, top_k=5)
+        assert [u for u, _ in got] == [u for u, _ in expected]
+        np.testing.assert_allclose([s for _, s in got], [s for _, s in expected], rtol=1e-5)
+
+
+def test_gallery_exact_and_ivf_agree_on_top1():
+    store, centers = _gallery()
+    exact, ivf = GalleryIndex(mode="exact"), GalleryIndex(mode="ivf", nlist=16, nprobe=4)
+    exact.rebuild(store)
+    ivf.rebuild(store)
+    assert ivf.stats()["32"]["type"] == "IVFIndex"
+    for u, query in enumerate(centers):
+        assert exact.search(query, top_k=1)[0][0] == f"user{u}"
+        assert ivf.search(query, top_k=1)[0][0] == f"user{u}"
+
+
+def test_ivf_remove_and_replace_keep_lists_consistent():
+    store, centers = _gallery(num_users=100)
+    index = _build(IVFIndex(32, nlist=8, nprobe=8), store)
+    for u in range(0, 100, 2):
+        assert index.remove(f"user{u}")
+    index.add("user1", np.stack(store["user3"]))
+
+    listed = np.sort(np.concatenate([inverted.rows() for inverted in index._lists]))
+    np.testing.assert_array_equal(listed, np.sort(np.fromiter(index._row_list, dtype=np.int64)))
+    assert len(listed) == len(index) == 50 * 3
+    for row, (c, position) in index._row_list.items():
+        assert index._lists[c].rows()[position] == row
+
+    for u in range(0, 100, 2):
+        assert f"user{u}" not in [user_id for user_id, _ in index.search(centers[u], top_k=3)]
+    assert {user_id for user_id, _ in index.search(centers[3], top_k=2)} == {"user1", "user3"}
+
+
+def test_auto_mode_upgrades_to_ivf():
+    store, centers = _gallery(num_users=50)
+    gallery = GalleryIndex(mode="auto", ivf_min_rows=100, nlist=4, nprobe=4)
+    gallery.rebuild(dict(list(store.items())[:20]))
+    assert gallery.stats()["32"]["type"] == "ExactIndex"
+    for user_id, embeddings in list(store.items())[20:]:
+        gallery.add(user_id, embeddings)
+    assert gallery.stats()["32"] == {"type": "IVFIndex", "templates": 150, "users": 50}
+    assert gallery.search(centers[7], top_k=1)[0][0] == "user7"
+
+
+def test_invalid_mode():
+    with pytest.raises(ValueError):
+        GalleryIndex(mode="hnsw")
+
+
+@pytest.mark.parametrize("mode", ["exact", "ivf"])
+def test_index_over_shared_matrix_matches_copied_rows(tmp_path, mode):
+    store, centers = _gallery(num_users=60)
+    matrix_store = MatrixStore(str(tmp_path), fsync=False)
+    matrix_store.load()
+    for user_id, embeddings in store.items():
+        matrix_store.put(user_id, embeddings)
+    stored = MatrixStore(str(tmp_path), fsync=False).load()
+
+    shared, copied = GalleryIndex(mode=mode, nlist=8, nprobe=8), GalleryIndex(mode=mode, nlist=8, nprobe=8)
+    shared.rebuild(stored)
+    copied.rebuild(store)
+    # Indeks uporabi memmap shrambe neposredno, brez lastne kopije vrstic
+    assert len(shared._indexes[32]._base) and not len(shared._indexes[32]._matrix)
+
+    # Spremembe po zagonu gredo v lasten rep; deljene vrstice se samo označijo kot proste
+    for index in (shared, copied):
+        index.remove("user1")
+        index.add("user2", [centers[1]])
+    for query in centers[:20]:
+        expected, got = copied.search(query, top_k=3), shared.search(query, top_k=3)
+        assert [u for u, _ in got] == [u for u, _ in expected]
+        np.testing.assert_allclose([s for _, s in got], [s for _, s in expected], rtol=1e-5)
+    assert len(shared._indexes[32]) == len(copied._indexes[32])
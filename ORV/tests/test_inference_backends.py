@@ -0,0 +1,46 @@
+import os
+
+import numpy as np
+import pytest
+
+from api.inference_backends import load_backend
+from src import config
+
+
+def _write_matmul_model(path, weights):
+    """Majhen ONNX graf (batch, d) @ W z dinamično dimenzijo batcha."""
+    onnx = pytest.importorskip("onnx")
+    from onnx import TensorProto, helper, numpy_helper
+
+    graph = helper.make_graph(
+        [helper.make_node("MatMul", ["input", "weights"], ["output"])],
+        "embedding",
+        [helper.make_tensor_value_info("input", TensorProto.FLOAT, ["batch", weights.shape[0]])],
+        [helper.make_tensor_value_info("output", TensorProto.FLOAT, ["batch", weights.shape[1]])],
+        initializer=[numpy_helper.from_array(weights, name="weights")],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", config.ONNX_EXPORT_OPSET)])
+    model.ir_version = 8
+    onnx.save(model, path)
+
+
+def test_onnx_backend_predicts_any_batch_size(tmp_path):
+    pytest.importorskip("onnxruntime")
+    weights = np.random.default_rng(0).normal(size=(6, 4)).astype(np.float32)
+    _write_matmul_model(os.path.join(tmp_path, config.ONNX_MODEL_NAME), weights)
+
+    backend = load_backend("onnx", str(tmp_path))
+    assert backend.name == "onnx"
+    for batch_size in (1, 3, 16):
+        batch = np.random.default_rng(batch_size).normal(size=(batch_size, 6))
+        np.testing.assert_allclose(backend.predict(batch), batch.astype(np.float32) @ weights, rtol=1e-5)
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        load_backend("tensorrt", "/nonexistent")
+
+
+def test_missing_model_file(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        load_backend("onnx", str(tmp_path))
@@ -0,0 +1,148 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+from user_management.log_store import LogStore
+
+
+def _embeddings(value, count=2, dim=8):
+    return [np.full(dim, value + i, dtype=np.float32) for i in range(count)]
+
+
+def _assert_users(users, expected):
+    assert set(users) == set(expected)
+    for user_id, embeddings_list in expected.items():
+        assert len(users[user_id]) == len(embeddings_list)
+        for stored, original in zip(users[user_id], embeddings_list):
+            np.testing.assert_array_equal(stored, original)
+
+
+def test_torn_tail_is_truncated_and_store_stays_writable(tmp_path):
+    store = LogStore(str(tmp_path), fsync=False)
+    store.load()
+    store.put("a", _embeddings(1))
+    store.put("b", _embeddings(2))
+    log_path = store._log_path(store._generation)
+    intact_size = os.path.getsize(log_path)
+
+    # Prekinjen zapis: začetek naslednjega zapisa brez konca
+    with open(log_path, "ab") as f:
+        f.write(b"\x01\x02\x03\x04partial")
+
+    reopened = LogStore(str(tmp_path), fsync=False)
+    _assert_users(reopened.load(), {"a": _embeddings(1), "b": _embeddings(2)})
+    assert os.path.getsize(log_path) == intact_size
+
+    # Zapis po popravilu pristane za zadnjim celim zapisom in je berljiv
+    reopened.put("c", _embeddings(3))
+    _assert_users(LogStore(str(tmp_path), fsync=False).load(),
+                  {"a": _embeddings(1), "b": _embeddings(2), "c": _embeddings(3)})
+
+
+def test_clear_hands_new_generation_to_other_instance(tmp_path):
+    first = LogStore(str(tmp_path), fsync=False)
+    first.load()
+    second = LogStore(str(tmp_path), fsync=False)
+    second.load()
+
+    first.put("old", _embeddings(1))
+    second.clear()
+    # first še piše v generacijo, ki jo je clear pobrisal; zapis mora iti v novo
+    first.put("new", _embeddings(5))
+
+    _assert_users(LogStore(str(tmp_path), fsync=False).load(), {"new": _embeddings(5)})
+    assert first._generation == second._generation
+
+
+def test_put_without_load_appends_to_latest_generation(tmp_path):
+    store = LogStore(str(tmp_path), fsync=False)
+    store.load()
+    store.put("a", _embeddings(1))
+
+    LogStore(str(tmp_path), fsync=False).put("b", _embeddings(2))
+    _assert_users(LogStore(str(tmp_path), fsync=False).load(), {"a": _embeddings(1), "b": _embeddings(2)})
+
+
+def test_compaction_keeps_state_and_removes_sealed_logs(tmp_path):
+    store = LogStore(str(tmp_path), fsync=False)
+    store.load()
+    store.put("a", _embeddings(1))
+    store.put("b", _embeddings(2))
+    store.delete("a")
+    sealed = store._generation
+
+    store.compact()
+    assert os.path.exists(store.snapshot_path)
+    assert all(g > sealed for g in store._log_generations())
+    store.put("c", _embeddings(3))
+    _assert_users(LogStore(str(tmp_path), fsync=False).load(), {"b": _embeddings(2), "c": _embeddings(3)})
+
+
+def test_load_during_compaction_sees_every_user(tmp_path):
+    store = LogStore(str(tmp_path), fsync=False)
+    store.load()
+    expected = {}
+    for i in range(20):
+        expected[f"user{i}"] = _embeddings(i)
+        store.put(f"user{i}", expected[f"user{i}"])
+
+    # Bralec v drugi niti istega procesa nalaga, medtem ko stiskanje menja posnetek in briše dnevnike;
+    # premor med branjem posnetka in naštevanjem dnevnikov razširi okno tekme
+    reader = LogStore(str(tmp_path), fsync=False)
+    read_snapshot = reader._read_snapshot
+
+    def slow_read_snapshot(users):
+        next_generation = read_snapshot(users)
+        time.sleep(0.002)
+        return next_generation
+
+    reader._read_snapshot = slow_read_snapshot
+    stop = threading.Event()
+    loaded = []
+
+    def load_repeatedly():
+        while not stop.is_set():
+            loaded.append(set(reader.load()))
+
+    thread = threading.Thread(target=load_repeatedly)
+    thread.start()
+    try:
+        for i in range(30):
+            store.put("user0", expected["user0"])
+            store.compact()
+    finally:
+        stop.set()
+        thread.join()
+
+    assert loaded and all(users == set(expected) for users in loaded)
+def test_torn_tail_is_not_reported_as_change(tmp_path):
+    writer = LogStore(str(tmp_path), fsync=False)
+    writer.load()
+    reader = LogStore(str(tmp_path), fsync=False)
+    reader.load()
+
+    writer.put("a", _embeddings(1))
+    with open(writer._log_path(writer._generation), "ab") as f:
+        f.write(b"\x01\x02")
+    changes = reader.poll_changes()
+    assert list(changes) == ["a"]
+    assert reader.poll_changes() == {}
+
+
+def test_clear_makes_readers_reload(tmp_path):
+    writer = LogStore(str(tmp_path), fsync=False)
+    writer.load()
+    reader = LogStore(str(tmp_path), fsync=False)
+    reader.load()
+
+    writer.put("a", _embeddings(1))
+    assert set(reader.poll_changes()) == {"a"}
+    writer.clear()
+    writer.put("b", _embeddings(2))
+    # Zgodovina je pobrisana (vrzel v generacijah), bralec mora stanje naložiti na novo
+    assert reader.poll_changes() is None
+    _assert_users(reader.load(), {"b": _embeddings(2)})
+
+
@@ -0,0 +1,41 @@
+import numpy as np
+
+from user_management import db
+from user_management.matching import best_template_scores, template_matrices
+
+
+def _cosine(a, b):
+    return float(a @ b / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+
+def test_best_template_scores_match_cosine_similarity():
+    rng = np.random.default_rng(0)
+    templates = rng.normal(size=(6, 16)).astype(np.float32)
+    queries = rng.normal(size=(4, 16)).astype(np.float32)
+
+    scores, best = best_template_scores(template_matrices(list(templates))[16], queries)
+    for query, score, index in zip(queries, scores, best):
+        expected = [_cosine(query, template) for template in templates]
+        assert index == int(np.argmax(expected))
+        assert abs(score - max(expected)) < 1e-5
+
+
+def test_templates_are_grouped_by_dimension():
+    templates = template_matrices([np.full(8, 2.0), np.full(16, 1.0), np.full(8, -3.0)])
+    assert {dim: matrix.shape for dim, matrix in templates.items()} == {8: (2, 8), 16: (1, 16)}
+    np.testing.assert_allclose(np.linalg.norm(templates[8], axis=1), 1.0, rtol=1e-6)
+
+
+def test_mixed_user_batch_keeps_request_order(monkeypatch):
+    alice, bob = np.eye(8, dtype=np.float32)[0], np.eye(8, dtype=np.float32)[1]
+    monkeypatch.setattr(db, "embedding_store", type("Store", (), {"lazy": False})())
+    monkeypatch.setattr(db, "_snapshot", db.StoreSnapshot({}, {
+        "alice": template_matrices([alice]),
+        "bob": template_matrices([bob, np.ones(4, dtype=np.float32)]),
+    }))
+
+    results = db.verify_users_by_embeddings([("alice", alice), ("bob", alice), ("alice", bob), ("bob", bob)])
+    assert [verified for verified, _ in results] == [True, False, False, True]
+    # Poizvedba dimenzije, za katero uporabnik nima templatov, ne uspe
+    assert db.verify_user_by_embeddings("alice", np.ones((1, 4), dtype=np.float32)) == [(False, -1.0)]
+    assert db.verify_user_by_embedding("carol", alice) == (False, 0.0)
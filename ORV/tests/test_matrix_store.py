@@ -0,0 +1,152 @@
+import multiprocessing
+import os
+
+import numpy as np
+
+from user_management.matrix_store import MatrixStore, TemplateRows
+
+DIM = 8
+
+
+def _embedding(value):
+    # Vrednost je zapisana v smeri vektorja, da preživi L2-normalizacijo ob zapisu
+    embedding = np.zeros(DIM, dtype=np.float32)
+    embedding[0], embedding[1] = value, 1.0
+    return embedding
+
+
+def _value(embedding):
+    return float(embedding[0] / embedding[1])
+
+
+def _writes(tag, count):
+    """Zaporedje zapisov pisca: (user_id, vrednost) ali (user_id, None) za izbris."""
+    for i in range(count):
+        yield f"{tag}{i % 40}", i
+        if i % 7 == 0:
+            yield f"{tag}{(i * 3) % 40}", None
+
+
+def _write_all(directory, tag, count):
+    store = MatrixStore(directory, fsync=False, compact_min_rows=32)
+    store.load()
+    for user_id, value in _writes(tag, count):
+        if value is None:
+            store.delete(user_id)
+        else:
+            store.put(user_id, [_embedding(value), _embedding(-1.0)])
+
+
+def _expected(tags, count):
+    expected = {}
+    for tag in tags:
+        for user_id, value in _writes(tag, count):
+            if value is None:
+                expected.pop(user_id, None)
+            else:
+                expected[user_id] = value
+    return expected
+
+
+def test_compaction_while_other_processes_write(tmp_path):
+    directory = str(tmp_path)
+    MatrixStore(directory, fsync=False).load()
+    context = multiprocessing.get_context("fork")
+    writers = [context.Process(target=_write_all, args=(directory, tag, 400)) for tag in "ab"]
+    for writer in writers:
+        writer.start()
+
+    # Poleg samodejnega stiskanja v piscih stiska še ta proces, dokler pisci pišejo
+    compactor = MatrixStore(directory, fsync=False, compact_min_rows=1)
+    compactor.load()
+    while any(writer.is_alive() for writer in writers):
+        compactor.compact()
+    for writer in writers:
+        writer.join()
+        assert writer.exitcode == 0
+
+    store = MatrixStore(directory, fsync=False)
+    users = store.load()
+    expected = _expected("ab", 400)
+    assert set(users) == set(expected)
+    for user_id, value in expected.items():
+        assert len(users[user_id]) == 2
+        assert abs(_value(users[user_id][0]) - value) < 1e-3
+
+    # Na disku ostane samo trenutna generacija
+    suffix = f".{store._generation:08d}."
+    data_files = [name for name in os.listdir(directory) if name.endswith((".npy", ".jsonl"))]
+    assert data_files and all(suffix in name for name in data_files)
+
+
+def test_torn_index_tail_is_truncated(tmp_path):
+    store = MatrixStore(str(tmp_path), fsync=False)
+    store.load()
+    store.put("a", [_embedding(1.0)])
+    index_path = store._index_path()
+    intact_size = os.path.getsize(index_path)
+    with open(index_path, "ab") as f:
+        f.write(b'{"u": "b", "r"')
+
+    reopened = MatrixStore(str(tmp_path), fsync=False)
+    assert list(reopened.load()) == ["a"]
+    assert os.path.getsize(index_path) == intact_size
+    reopened.put("b", [_embedding(2.0)])
+    users = MatrixStore(str(tmp_path), fsync=False).load()
+    assert sorted(users) == ["a", "b"]
+    assert abs(_value(users["b"][0]) - 2.0) < 1e-3
+
+
+def test_templates_are_normalized_read_only_views(tmp_path):
+    store = MatrixStore(str(tmp_path), fsync=False)
+    store.load()
+    store.put("a", [np.full(DIM, 3.0, dtype=np.float32), np.full(16, -2.0, dtype=np.float32)])
+
+    rows = MatrixStore(str(tmp_path), fsync=False).load()["a"]
+    assert isinstance(rows, TemplateRows) and len(rows) == 2
+    for row in rows:
+        assert not row.flags.writeable and not row.flags.owndata
+        np.testing.assert_allclose(np.linalg.norm(row), 1.0, rtol=1e-6)
+
+
+def test_matrices_are_shared_views(tmp_path):
+    store = MatrixStore(str(tmp_path), fsync=False)
+    store.load()
+    store.put("a", [np.full(DIM, 3.0, dtype=np.float32), np.full(16, -2.0, dtype=np.float32)])
+
+    rows = MatrixStore(str(tmp_path), fsync=False).load()["a"]
+    matrices = rows.matrices()
+    assert sorted(matrices) == [DIM, 16]
+    for matrix in matrices.values():
+        assert not matrix.flags.writeable and not matrix.flags.owndata
+        np.testing.assert_allclose(np.linalg.norm(matrix, axis=1), 1.0, rtol=1e-6)
+
+
+def test_poll_after_compaction_requests_reload(tmp_path):
+    writer = MatrixStore(str(tmp_path), fsync=False)
+    writer.load()
+    reader = MatrixStore(str(tmp_path), fsync=False)
+    reader.load()
+
+    writer.put("a", [_embedding(1.0)])
+    assert set(reader.poll_changes()) == {"a"}
+    writer.put("a", [_embedding(2.0)])
+    writer.compact()
+    # Po novi generaciji so vse vrstice drugje; db mora poglede prebrati na novo
+    assert reader.poll_changes() is None
+    assert abs(_value(reader.load()["a"][0]) - 2.0) < 1e-3
+    assert reader.poll_changes() == {}
+
+
+def test_single_user_reads_without_load(tmp_path):
+    writer = MatrixStore(str(tmp_path), fsync=False)
+    writer.load()
+    writer.put("a", [_embedding(1.0), _embedding(2.0)])
+    writer.put("b", [_embedding(3.0)])
+    writer.delete("a")
+
+    reader = MatrixStore(str(tmp_path), fsync=False)
+    assert reader.user_ids() == ["b"]
+    assert reader.contains("b") and not reader.contains("a")
+    assert reader.count() == (1, 1)
+    assert abs(_value(reader.get("b")[0]) - 3.0) < 1e-3 and reader.get("a") == []
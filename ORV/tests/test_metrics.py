@@ -0,0 +1,51 @@
+import pytest
+
+from src import metrics
+
+pytestmark = pytest.mark.skipif(not metrics.PROMETHEUS_AVAILABLE, reason="prometheus_client ni nameščen")
+
+
+def _sample(name, **labels):
+    from prometheus_client import REGISTRY
+
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_stage_timer_observes_also_on_error():
+    before = _sample("face_stage_duration_seconds_count", stage="test-stage")
+    with metrics.stage_timer("test-stage"):
+        pass
+    with pytest.raises(RuntimeError):
+        with metrics.stage_timer("test-stage"):
+            raise RuntimeError("boom")
+    assert _sample("face_stage_duration_seconds_count", stage="test-stage") == before + 2
+
+
+def test_timed_stage_decorator():
+    @metrics.timed_stage("test-decorated")
+    def work(x):
+        return x * 2
+
+    before = _sample("face_stage_duration_seconds_count", stage="test-decorated")
+    assert work(21) == 42
+    assert work.__name__ == "work"
+    assert _sample("face_stage_duration_seconds_count", stage="test-decorated") == before + 1
+
+
+def test_counters_gauges_and_rendering():
+    no_face = _sample("face_no_face_total", endpoint="test")
+    accepted = _sample("face_verification_total", result="accept")
+    metrics.record_no_face("test")
+    metrics.record_verification(True)
+    metrics.set_store_size(3, 12)
+    with metrics.stage_timer("test-render"):
+        pass
+
+    assert _sample("face_no_face_total", endpoint="test") == no_face + 1
+    assert _sample("face_verification_total", result="accept") == accepted + 1
+    assert _sample("face_store_embeddings") == 12
+
+    body, content_type = metrics.render_metrics()
+    assert content_type.startswith("text/plain")
+    assert b'face_stage_duration_seconds_bucket{le="0.001",stage="test-render"}' in body
+    assert b"face_store_users 3.0" in body
@@ -0,0 +1,115 @@
+import threading
+
+import numpy as np
+import pytest
+
+from user_management import db
+from user_management.persistence import PersistQueue
+
+
+class _FailingStore:
+    lazy = False
+    read_only = False
+
+    def put(self, user_id, embeddings_list):
+        raise IOError("disk full")
+
+    def delete(self, user_id):
+        raise IOError("disk full")
+
+
+@pytest.fixture
+def failing_store(monkeypatch):
+    monkeypatch.setattr(db, "embedding_store", _FailingStore())
+    monkeypatch.setattr(db, "_snapshot", db.StoreSnapshot({"kept": (np.ones(4, dtype=np.float32),)}, {}))
+
+
+def test_failed_store_write_is_raised_before_memory_changes(monkeypatch, failing_store):
+    monkeypatch.setattr(db, "STORE_ASYNC_PERSIST", False)
+
+    with pytest.raises(IOError):
+        db.register_user_embeddings("new", [np.ones(4, dtype=np.float32)])
+    assert not db.is_user_registered("new")
+
+    # Uporabnik, ki ga ni bilo mogoče izbrisati iz shrambe, ostane tudi v pomnilniku
+    with pytest.raises(IOError):
+        db.delete_user("kept")
+    assert db.is_user_registered("kept")
+
+
+def test_failed_background_write_is_logged(monkeypatch, failing_store, capsys):
+    monkeypatch.setattr(db, "STORE_ASYNC_PERSIST", True)
+
+    # Zahtevek je že uspel; napaka zapisa v ozadju se samo izpiše in ne ustavi vrste
+    db.register_user_embeddings("new", [np.ones(4, dtype=np.float32)])
+    assert db.persist_queue.flush(timeout=5)
+    assert db.is_user_registered("new")
+    assert "Error persisting change of user new in the background: disk full" in capsys.readouterr().out
+
+
+def test_jobs_run_in_submission_order_and_flush_waits():
+    queue = PersistQueue(name="test-persist")
+    release = threading.Event()
+    done = []
+    queue.submit(release.wait)
+    for i in range(5):
+        queue.submit(done.append, i)
+
+    assert not queue.flush(timeout=0.1)
+    release.set()
+    assert queue.flush(timeout=5)
+    assert done == [0, 1, 2, 3, 4]
+    queue.stop()
+
+
+def test_failing_job_does_not_stop_worker():
+    queue = PersistQueue(name="test-persist")
+    done = []
+    queue.submit(lambda: 1 / 0)
+    queue.submit(done.append, "after")
+    assert queue.flush(timeout=5)
+    assert done == ["after"]
+    queue.stop()
+
+
+def test_snapshot_isolation_during_background_persist(run_python):
+    # Zapis v shrambo obvisi, dokler ga test ne sprosti: stanje v pomnilniku in bralci ga ne smejo čakati
+    run_python("""
+        import threading
+        import numpy as np
+        from user_management import db
+        from user_management.log_store import LogStore
+
+        started, release = threading.Event(), threading.Event()
+        store_put = db.embedding_store.put
+
+        def slow_put(user_id, embeddings_list):
+            started.set()
+            assert release.wait(10)
+            store_put(user_id, embeddings_list)
+
+        db.embedding_store.put = slow_put
+        first, second = np.ones(8, np.float32), np.arange(8, dtype=np.float32) + 1
+
+        before = db.get_snapshot()
+        db.register_user_embeddings("a", [first])
+        assert started.wait(5)
+        after = db.get_snapshot()
+
+        # Star posnetek je nespremenjen, nov (in vsi bralci) že vidi uporabnika, čeprav še ni na disku
+        assert "a" not in before.users and "a" in after.users
+        assert db.is_user_registered("a") and db.verify_user_by_embedding("a", first)[0]
+        assert "a" not in LogStore(db.DATA_STORAGE_DIR, fsync=False).load()
+
+        # Drug proces je medtem zapisal starejše stanje istega uporabnika; lokalni zapis v vrsti ima prednost
+        LogStore(db.DATA_STORAGE_DIR, fsync=False).put("a", [-first])
+        db.register_user_embeddings("a", [second])
+        db.sync_store_changes()
+        assert db.verify_user_by_embedding("a", second)[0]
+        np.testing.assert_array_equal(after.users["a"][0], first)
+
+        release.set()
+        assert db.persist_queue.flush(timeout=10)
+        stored = LogStore(db.DATA_STORAGE_DIR, fsync=False).load()
+        np.testing.assert_array_equal(stored["a"][0], second)
+    """)
@@ -0,0 +1,81 @@
+import os
+
+import pytest
+
+from src import config, profiling
+from src.metrics import stage_timer
+
+
+@pytest.fixture
+def token(monkeypatch):
+    monkeypatch.setattr(config, "PROFILING_ENABLED", False)
+    monkeypatch.setattr(config, "PROFILING_TOKEN", "secret")
+    monkeypatch.setattr(config, "PROFILING_DUMP_SAMPLE_RATE", 0.0)
+    return "secret"
+
+
+def test_profiling_requires_matching_token(token, monkeypatch):
+    assert not profiling.is_profiling_requested({})
+    assert not profiling.is_profiling_requested({profiling.PROFILE_TOKEN_HEADER: "wrong"})
+    assert profiling.is_profiling_requested({profiling.PROFILE_TOKEN_HEADER: token})
+
+    # Brez nastavljenega žetona glava ne vklopi profiliranja
+    monkeypatch.setattr(config, "PROFILING_TOKEN", "")
+    assert not profiling.is_profiling_requested({profiling.PROFILE_TOKEN_HEADER: ""})
+
+
+def test_stage_timer_feeds_request_profile(token):
+    with stage_timer("outside"):
+        pass
+    profile, ctx_token = profiling.start_request_profile("verify", {profiling.PROFILE_TOKEN_HEADER: token})
+    try:
+        for _ in range(2):
+            with stage_timer("detect"):
+                pass
+        assert profiling.current_profile() is profile
+    finally:
+        profiling.end_request_profile(ctx_token)
+
+    assert profiling.current_profile() is None
+    assert set(profile.stages) == {"detect"}
+    header = profile.server_timing()
+    assert header.startswith("detect;dur=") and ", total;dur=" in header
+
+
+def test_dump_writes_cprofile_file(token, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "PROFILING_DUMP_DIR", str(tmp_path))
+    profile, ctx_token = profiling.start_request_profile(
+        "register", {profiling.PROFILE_TOKEN_HEADER: token, profiling.PROFILE_DUMP_HEADER: "1"})
+    try:
+        assert profile.dump
+        assert profile.run(sum, [1, 2, 3]) == 6
+    finally:
+        profiling.end_request_profile(ctx_token)
+    if profile.dump_path is None:
+        pytest.skip("cProfile je že aktiven (npr. pod profilerjem testov)")
+    assert os.path.dirname(profile.dump_path) == str(tmp_path)
+    assert profile.dump_path.endswith(".prof") and os.path.getsize(profile.dump_path) > 0
+
+
+def test_asgi_server_timing_includes_executor_stages(token, monkeypatch):
+    pytest.importorskip("fastapi")
+    pytest.importorskip("multipart")
+    from fastapi.testclient import TestClient
+
+    import face_recognition_asgi as asgi_app
+    from api import face_service
+
+    def verify(user_id, image_bytes):
+        # Teče v niti izvajalnika; profil mora priti tja prek kopiranega konteksta
+        with stage_timer("match"):
+            pass
+        return {"success": True}, 200
+
+    monkeypatch.setattr(asgi_app, "is_user_registered", lambda user_id: True)
+    monkeypatch.setattr(face_service, "verify_face_image", verify)
+    upload = {"data": {"user_id": "alice"}, "files": {"image": ("face.jpg", b"x", "image/jpeg")}}
+    with TestClient(asgi_app.app) as client:
+        assert "Server-Timing" not in client.post("/verify", **upload).headers
+        response = client.post("/verify", headers={profiling.PROFILE_TOKEN_HEADER: token}, **upload)
+    assert response.status_code == 200
+    assert "match;dur=" in response.headers["Server-Timing"]
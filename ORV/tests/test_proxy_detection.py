@@ -0,0 +1,109 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from api.face_pipeline import FacePipeline
+from face_processing.proxy_detection import (
+    HAAR_WINDOW_SIZE,
+    choose_reduction,
+    decode_for_detection,
+    detection_size_limits,
+    fit_to_max_side,
+    map_boxes_to_full,
+)
+
+
+class _RecordingCascade:
+    """Vrne dane okvirje (v koordinatah slike, ki jo dobi) in si zapomni vhod detekcije."""
+
+    def __init__(self, boxes):
+        self.boxes = boxes
+        self.calls = []
+
+    def detectMultiScale2(self, gray, **kwargs):
+        self.calls.append((gray.shape, kwargs))
+        boxes = np.array(self.boxes, dtype=np.int32).reshape(-1, 4)
+        return boxes, np.full(len(boxes), 9, dtype=np.int32)
+
+
+def _jpeg(width, height):
+    image = np.zeros((height, width, 3), dtype=np.uint8)
+    image[:, :, 1] = 120
+    ok, encoded = cv2.imencode(".jpg", image)
+    assert ok
+    return encoded.tobytes()
+
+
+def test_choose_reduction_keeps_long_side_above_proxy():
+    assert choose_reduction((4000, 3000), 640) == 4
+    assert choose_reduction((1280, 960), 640) == 2
+    assert choose_reduction((1000, 800), 640) == 1
+    assert choose_reduction(None, 640) == 1
+
+
+def test_fit_to_max_side():
+    image = np.zeros((300, 1200, 3), dtype=np.uint8)
+    assert fit_to_max_side(image, 600).shape == (150, 600, 3)
+    small = np.zeros((100, 200, 3), dtype=np.uint8)
+    assert fit_to_max_side(small, 600) is small
+
+
+def test_decode_for_detection_reports_scale_to_full():
+    pytest.importorskip("PIL")
+    proxy, scale = decode_for_detection(_jpeg(2560, 1920), 640)
+    assert max(proxy.shape[:2]) == 640
+    assert scale == pytest.approx(4.0)
+    assert decode_for_detection(b"not an image", 640) == (None, 1.0)
+
+
+def test_detection_size_limits():
+    min_size, max_size = detection_size_limits((480, 640), 4.0, (30, 30), 0.08)
+    assert min_size == (max(HAAR_WINDOW_SIZE, int(np.ceil(0.08 * 480))),) * 2
+    assert max_size == (480, 480)
+    # Najmanjši obraz iz polne ločljivosti se preslika na proxy, a nikoli pod okno kaskade
+    assert detection_size_limits((480, 640), 1.0, (200, 200), 0.0)[0] == (200, 200)
+    assert detection_size_limits((480, 640), 100.0, (30, 30), 0.0)[0] == (HAAR_WINDOW_SIZE,) * 2
+
+
+def test_map_boxes_to_full_clamps_to_image():
+    mapped = map_boxes_to_full([(10, 20, 30, 40), (600, 460, 40, 20)], (480, 640), (1920, 2560))
+    assert mapped[0] == (40, 80, 120, 160)
+    x, y, w, h = mapped[1]
+    assert x + w <= 2560 and y + h <= 1920
+
+
+def test_multires_pipeline_detects_on_proxy_and_crops_full_resolution(monkeypatch):
+    pytest.importorskip("PIL")
+    from src import config
+
+    monkeypatch.setattr(config, "DETECT_PROXY_MAX_SIDE", 640)
+    cascade = _RecordingCascade([(100, 100, 80, 80)])
+    pipeline = FacePipeline(_jpeg(2560, 1920), cascade, detect_mode="multires")
+
+    assert pipeline.face_box == (400, 400, 320, 320)
+    [(gray_shape, kwargs)] = cascade.calls
+    assert gray_shape == (480, 640)
+    assert "maxSize" in kwargs
+    assert pipeline.image_bgr.shape[:2] == (1920, 2560)
+    assert pipeline.face_crop(64).shape == (64, 64, 3)
+
+
+def test_multires_does_not_decode_full_image_without_face(monkeypatch):
+    pytest.importorskip("PIL")
+    from src import config
+
+    monkeypatch.setattr(config, "DETECT_PROXY_MAX_SIDE", 640)
+    pipeline = FacePipeline(_jpeg(2560, 1920), _RecordingCascade([]), detect_mode="multires")
+    assert pipeline.faces == []
+    assert not pipeline._decoded
+
+
+@pytest.mark.skipif("FACE_DETECT_MODE" in os.environ, reason="način detekcije je nastavljen v okolju")
+def test_full_resolution_is_default_mode():
+    cascade = _RecordingCascade([])
+    pipeline = FacePipeline(_jpeg(1280, 960), cascade)
+    assert pipeline.detect_mode == "full" and pipeline.faces == []
+    [(gray_shape, kwargs)] = cascade.calls
+    assert gray_shape == (960, 1280) and "maxSize" not in kwargs
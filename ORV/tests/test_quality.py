@@ -0,0 +1,105 @@
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+import pytest
+
+from api import face_service
+from api.face_pipeline import FacePipeline
+from face_processing.quality import quality_error, score_face_quality
+from src import config
+
+BOX = (20, 20, 112, 112)
+
+
+def _textured(brightness=128):
+    # Naključni šum da visoko varianco Laplaceovega operatorja (ostra slika)
+    rng = np.random.default_rng(0)
+    return np.clip(rng.normal(brightness, 40, size=(160, 160, 3)), 0, 255).astype(np.uint8)
+
+
+def test_blurred_face_scores_lower_than_sharp():
+    sharp = _textured()
+    blurred = cv2.GaussianBlur(sharp, (31, 31), 10)
+    sharp_quality = score_face_quality(sharp, BOX, min_face_side=56, neighbors=10)
+    blurred_quality = score_face_quality(blurred, BOX, min_face_side=56, neighbors=10)
+
+    assert blurred_quality["blur"] < sharp_quality["blur"]
+    assert blurred_quality["score"] < sharp_quality["score"]
+    assert sharp_quality["size_ratio"] == 2.0 and sharp_quality["neighbors"] == 10
+    assert quality_error(sharp_quality) is None
+    assert quality_error(blurred_quality) == "FACE_TOO_BLURRY"
+
+
+def test_empty_crop_has_no_quality():
+    assert score_face_quality(_textured(), (500, 500, 10, 10), min_face_side=56) is None
+    assert quality_error(None) is None
+
+
+@pytest.mark.parametrize("overrides, expected", [
+    ({"brightness": 10.0, "blur": 0.0}, "FACE_UNDEREXPOSED"),  # Osvetlitev ima prednost pred zamegljenostjo
+    ({"brightness": 250.0}, "FACE_OVEREXPOSED"),
+    ({"size_ratio": 0.5}, "FACE_TOO_SMALL"),
+    ({"neighbors": 1}, "FACE_LOW_CONFIDENCE"),
+    ({"neighbors": None}, None),
+])
+def test_quality_error_codes(overrides, expected):
+    quality = {"blur": 500.0, "brightness": 128.0, "size_ratio": 2.0, "neighbors": 20, **overrides}
+    assert quality_error(quality) == expected
+
+
+class _Cascade:
+    def detectMultiScale2(self, gray, **kwargs):
+        return np.array([BOX], dtype=np.int32), np.array([3], dtype=np.int32)
+
+
+def _encoded(image):
+    ok, encoded = cv2.imencode(".png", image)
+    assert ok
+    return encoded.tobytes()
+
+
+def test_gate_is_off_by_default():
+    assert not config.QUALITY_GATE_ENABLED
+    pipeline = FacePipeline(_encoded(_textured(brightness=15)), _Cascade())
+    assert pipeline.quality["neighbors"] == 3
+    assert pipeline.quality_error is None
+
+
+def test_pipeline_reports_gate_error_when_enabled(monkeypatch):
+    monkeypatch.setattr(config, "QUALITY_GATE_ENABLED", True)
+    dark = FacePipeline(_encoded(_textured(brightness=15)), _Cascade())
+    assert dark.quality_error == "FACE_UNDEREXPOSED"
+
+    # Detektorjeva meja sosedov (5) je privzeto tudi meja ocene kakovosti
+    assert FacePipeline(_encoded(_textured()), _Cascade()).quality_error == "FACE_LOW_CONFIDENCE"
+
+
+def test_rejected_face_is_422_and_missing_face_is_400(monkeypatch):
+    quality = {"blur": 3.0, "brightness": 120.0, "size_ratio": 2.0, "neighbors": 9, "score": 0.4}
+    pipelines = {
+        b"blurry": SimpleNamespace(face_box=BOX, quality=quality, quality_error="FACE_TOO_BLURRY"),
+        b"empty": SimpleNamespace(face_box=None, quality=None, quality_error=None),
+    }
+    monkeypatch.setattr(face_service, "is_user_registered", lambda user_id: True)
+    monkeypatch.setattr(face_service, "create_face_pipeline", pipelines.__getitem__)
+    monkeypatch.setattr(face_service, "get_embeddings_from_pipelines", lambda items: [None] * len(items))
+
+    (blurry, blurry_status), (empty, empty_status) = face_service.verify_faces_batch(
+        [("alice", b"blurry"), ("alice", b"empty")])
+    assert blurry_status == 422 and blurry["error_code"] == "FACE_TOO_BLURRY"
+    assert blurry["quality"] == quality
+    assert empty_status == 400 and "error_code" not in empty
+
+
+def test_burst_names_best_rejected_frame(monkeypatch):
+    def pipeline(image_bytes):
+        quality = {"score": float(image_bytes.decode())}
+        return SimpleNamespace(face_box=BOX, quality=quality, quality_error="FACE_TOO_BLURRY")
+
+    monkeypatch.setattr(face_service, "create_face_pipeline", pipeline)
+    monkeypatch.setattr(face_service, "get_embeddings_from_pipelines", lambda items: [None] * len(items))
+
+    payload, status = face_service.verify_face_burst("alice", [b"0.2", b"0.7", b"0.5"])
+    assert status == 422
+    assert payload["best_quality_frame"] == 1 and payload["frames_processed"] == 3
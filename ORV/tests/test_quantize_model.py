@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow")
+
+from src.quantize_model import (
+    build_verification_pairs,
+    predict_keras,
+    predict_tflite,
+    quantize_to_int8,
+    verification_metrics,
+)
+
+
+def test_verification_pairs_are_balanced():
+    labels = np.array([0, 0, 0, 1, 1, 2, 3, 3])
+    pairs, is_same = build_verification_pairs(labels, max_pairs=100)
+    assert is_same.sum() == 3 + 1 + 1
+    assert len(pairs) == 2 * is_same.sum()
+    same = labels[pairs[:, 0]] == labels[pairs[:, 1]]
+    np.testing.assert_array_equal(same, is_same.astype(bool))
+
+
+def test_verification_metrics_separable_embeddings():
+    labels = np.repeat(np.arange(10), 4)
+    rng = np.random.default_rng(0)
+    embeddings = np.eye(16)[labels] + 0.01 * rng.normal(size=(len(labels), 16))
+    pairs, is_same = build_verification_pairs(labels)
+    auc, eer = verification_metrics(embeddings, pairs, is_same)
+    assert auc == pytest.approx(1.0)
+    assert eer == pytest.approx(0.0)
+
+    auc, eer = verification_metrics(rng.normal(size=(len(labels), 16)), pairs, is_same)
+    assert auc < 0.8 and eer > 0.2
+
+
+def test_int8_model_stays_close_to_float_model():
+    rng = np.random.default_rng(0)
+    model = tf.keras.Sequential([
+        tf.keras.Input(shape=(8, 8, 3)),
+        tf.keras.layers.Conv2D(4, 3, activation="relu"),
+        tf.keras.layers.Flatten(),
+        tf.keras.layers.Dense(16),
+    ])
+    images = rng.uniform(size=(40, 8, 8, 3)).astype(np.float32)
+    tflite_model = quantize_to_int8(model, images[:20])
+
+    float_embeddings = predict_keras(model, images, batch_size=16)
+    int8_embeddings = predict_tflite(tflite_model, images, batch_size=16)
+    assert int8_embeddings.dtype == np.float32 and int8_embeddings.shape == float_embeddings.shape
+    cosine = np.sum(float_embeddings * int8_embeddings, axis=1) / (
+        np.linalg.norm(float_embeddings, axis=1) * np.linalg.norm(int8_embeddings, axis=1))
+    assert cosine.min() > 0.95
@@ -0,0 +1,55 @@
+FOLLOWER = """
+    import sys
+    import time
+    import numpy as np
+    from user_management import db
+    from user_management.store import ReadOnlyStoreError
+
+    assert db.is_read_only() and not db.is_user_registered("replicated")
+    print("ready", flush=True)
+
+    # Vodja registrira šele zdaj: uporabnik mora priti prek sledenja dnevniku, ne ob nalaganju
+    deadline = time.monotonic() + 20
+    while not db.is_user_registered("replicated"):
+        assert time.monotonic() < deadline, "registracija vodje ni prišla do sledilca"
+        time.sleep(0.05)
+    embedding = np.asarray(db.get_user_embeddings("replicated")[0])
+    assert db.verify_user_by_embedding("replicated", embedding)[0]
+
+    for write in (lambda: db.register_user_embeddings("local", [embedding]), lambda: db.delete_user("replicated")):
+        try:
+            write()
+        except ReadOnlyStoreError:
+            pass
+        else:
+            sys.exit("sledilec je sprejel zapis")
+    assert db.is_user_registered("replicated") and not db.is_user_registered("local")
+    print("ok", flush=True)
+"""
+
+LEADER = """
+    import numpy as np
+    from user_management import db
+
+    db.register_user_embeddings("replicated", [np.arange(8, dtype=np.float32) + 1])
+    db.persist_queue.flush()
+"""
+
+
+def test_follower_applies_leader_writes_and_rejects_its_own(tmp_path, run_python, start_python):
+    shared = str(tmp_path / "shared")
+    follower = start_python(FOLLOWER, FACE_REPLICATION_ROLE="follower", FACE_REPLICATION_DIR=shared,
+                            FACE_DATA_STORAGE_DIR=str(tmp_path / "follower"), FACE_STORE_SYNC_INTERVAL_S="0.1")
+    # Izpisi ob nalaganju pred "ready" niso pomembni
+    for line in follower.stdout:
+        if line.strip() == "ready":
+            break
+    else:
+        raise AssertionError(follower.stderr.read())
+
+    run_python(LEADER, FACE_REPLICATION_ROLE="leader", FACE_REPLICATION_DIR=shared,
+               FACE_DATA_STORAGE_DIR=str(tmp_path / "leader"))
+
+    stdout, stderr = follower.communicate(timeout=60)
+    assert follower.returncode == 0, stdout + stderr
+    assert stdout.strip().endswith("ok")
@@ -0,0 +1,111 @@
+import multiprocessing
+
+import numpy as np
+
+from user_management.sqlite_store import SqliteStore
+
+
+def _embeddings(value, count=2, dim=8):
+    return [np.full(dim, value + i, dtype=np.float32) for i in range(count)]
+
+
+def _scanned_counts(store):
+    return tuple(store._conn().execute(
+        "SELECT COUNT(DISTINCT user_id), COUNT(*) FROM user_embeddings").fetchone())
+
+
+def _write_users(path, tag):
+    store = SqliteStore(path, fsync=False)
+    for i in range(50):
+        store.put(f"{tag}{i % 10}", _embeddings(i, count=1 + i % 3))
+        if i % 4 == 0:
+            store.delete(f"{tag}{(i * 7) % 10}")
+
+
+def test_counts_follow_writes(tmp_path):
+    store = SqliteStore(str(tmp_path / "store.sqlite3"), fsync=False)
+    store.put("a", _embeddings(1, count=3))
+    store.put("b", _embeddings(2, count=2))
+    store.put("a", _embeddings(3, count=1))
+    assert store.delete("b")
+    assert not store.delete("missing")
+    store.put("c", _embeddings(4, count=4, dim=16))
+    assert store.count() == (2, 5) == _scanned_counts(store)
+
+    store.clear()
+    assert store.count() == (0, 0) == _scanned_counts(store)
+
+
+def test_counts_with_concurrent_writers(tmp_path):
+    path = str(tmp_path / "store.sqlite3")
+    SqliteStore(path, fsync=False)
+    context = multiprocessing.get_context("fork")
+    writers = [context.Process(target=_write_users, args=(path, tag)) for tag in "abc"]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+        assert writer.exitcode == 0
+
+    store = SqliteStore(path, fsync=False)
+    assert store.count() == _scanned_counts(store)
+    assert store.count()[0] == len(store.load())
+
+
+def _import_once(path, imported):
+    def import_from():
+        imported.put(1)
+        return {"old": _embeddings(7, count=3)}
+
+    SqliteStore(path, import_from=import_from, fsync=False)
+
+
+def test_previous_store_is_imported_once(tmp_path):
+    path = str(tmp_path / "store.sqlite3")
+    context = multiprocessing.get_context("fork")
+    imported = context.Queue()
+    # Delavci, ki se zaženejo hkrati, uvozijo prejšnjo shrambo le enkrat
+    workers = [context.Process(target=_import_once, args=(path, imported)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    store = SqliteStore(path, fsync=False)
+    assert store.count() == (1, 3) == _scanned_counts(store)
+    assert imported.get(timeout=1) == 1 and imported.empty()
+
+
+def test_cleared_store_is_not_imported_again(tmp_path):
+    path = str(tmp_path / "store.sqlite3")
+    store = SqliteStore(path, import_from=lambda: {"old": _embeddings(1)}, fsync=False)
+    assert store.contains("old")
+    store.clear()
+    store.close()
+
+    reopened = SqliteStore(path, import_from=lambda: {"old": _embeddings(1)}, fsync=False)
+    assert not reopened.contains("old") and reopened.count() == (0, 0)
+
+
+def test_poll_changes_sees_other_instance(tmp_path):
+    path = str(tmp_path / "store.sqlite3")
+    writer = SqliteStore(path, fsync=False)
+    reader = SqliteStore(path, fsync=False)
+
+    writer.put("a", _embeddings(1))
+    writer.put("b", _embeddings(2))
+    writer.delete("b")
+    changes = reader.poll_changes()
+    assert set(changes) == {"a", "b"} and changes["b"] is None
+    np.testing.assert_array_equal(changes["a"][1], _embeddings(1)[1])
+    assert reader.poll_changes() == {}
+
+
+def test_user_ids_lists_registered_users(tmp_path):
+    store = SqliteStore(str(tmp_path / "store.sqlite3"), fsync=False)
+    store.put("a", _embeddings(1, count=3))
+    store.put("b", _embeddings(2))
+    store.delete("a")
+    store.put("c", _embeddings(3))
+    assert sorted(store.user_ids()) == ["b", "c"]
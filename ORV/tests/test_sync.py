@@ -0,0 +1,77 @@
+import pytest
+
+BACKENDS = ["log", "matrix", "sqlite"]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_worker_sees_registration_of_other_worker(run_python, backend):
+    run_python("""
+        import os
+        import time
+        import numpy as np
+        from user_management import db
+
+        embedding = np.arange(8, dtype=np.float32) + 1
+        pid = os.fork()
+        if pid == 0:
+            db.register_user_embeddings("from_child", [embedding])
+            db.persist_queue.flush()
+            os._exit(0)
+        assert os.waitstatus_to_exitcode(os.waitpid(pid, 0)[1]) == 0
+
+        deadline = time.monotonic() + 10
+        while not db.is_user_registered("from_child"):
+            assert time.monotonic() < deadline, "sprememba drugega delavca ni prišla"
+            time.sleep(0.05)
+        assert db.verify_user_by_embedding("from_child", embedding)[0]
+        assert db.identify_by_embedding(embedding, top_k=1)[0][0] == "from_child"
+
+        # Izbris v tem procesu dobi tudi delavec, ustvarjen za tem
+        db.delete_user("from_child")
+        db.persist_queue.flush()
+        pid = os.fork()
+        if pid == 0:
+            db.sync_store_changes()
+            os._exit(0 if not db.is_user_registered("from_child") else 1)
+        assert os.waitstatus_to_exitcode(os.waitpid(pid, 0)[1]) == 0
+    """, FACE_STORE_BACKEND=backend, FACE_STORE_SYNC_INTERVAL_S="0.1")
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_fork_while_background_thread_holds_locks(run_python, backend):
+    # Kot gunicorn s preload_app: nit starša (sinhronizacija, zapis) drži zaklepe ravno ob fork-u
+    run_python("""
+        import os
+        import threading
+        import numpy as np
+        from user_management import db
+
+        holding, release = threading.Event(), threading.Event()
+
+        def hold_locks():
+            store_lock = getattr(db.embedding_store, "_lock", threading.Lock())
+            with db._write_lock, db._gallery_lock, db.gallery_index._lock, store_lock:
+                holding.set()
+                release.wait()
+
+        threading.Thread(target=hold_locks, daemon=True).start()
+        assert holding.wait(5)
+        pid = os.fork()
+        if pid == 0:
+            done = threading.Event()
+
+            def work():
+                embedding = np.ones(8, np.float32)
+                db.register_user_embeddings("forked", [embedding])
+                db.persist_queue.flush()
+                assert db.identify_by_embedding(embedding, top_k=1)[0][0] == "forked"
+                db.delete_user("forked")
+                db.persist_queue.flush()
+                done.set()
+
+            threading.Thread(target=work, daemon=True).start()
+            os._exit(0 if done.wait(10) else 1)
+        status = os.waitstatus_to_exitcode(os.waitpid(pid, 0)[1])
+        release.set()
+        assert status == 0, "zaklepi starša so v otroku ostali zaklenjeni"
+    """, FACE_STORE_BACKEND=backend, FACE_STORE_SYNC_INTERVAL_S="0.1")
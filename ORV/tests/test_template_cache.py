@@ -0,0 +1,84 @@
+import numpy as np
+
+from user_management.template_cache import TemplateCache
+
+
+def _templates(rows, dim=8):
+    # float32: rows * dim * 4 bajtov
+    return {dim: np.ones((rows, dim), dtype=np.float32)}
+
+
+def test_least_recently_used_entries_are_evicted_by_bytes():
+    cache = TemplateCache(max_bytes=3 * 32)
+    for user_id in ("a", "b", "c"):
+        cache.put(user_id, _templates(1))
+    assert cache.get("a", lambda user_id: {}) is not None  # "a" je zdaj najnovejši
+
+    cache.put("d", _templates(1))
+    stats = cache.get_stats()
+    assert (stats["size"], stats["bytes"], stats["evictions"]) == (3, 96, 1)
+    assert cache.get("b", lambda user_id: {}) == {}  # Izrinjen najstarejši ("b"), ne "a"
+    assert cache.get("a", lambda user_id: {})[8].shape == (1, 8)
+
+
+def test_entry_larger_than_limit_is_not_stored():
+    cache = TemplateCache(max_bytes=32)
+    loads = []
+
+    def loader(user_id):
+        loads.append(user_id)
+        return _templates(2)
+
+    assert cache.get("big", loader)[8].shape == (2, 8)
+    cache.get("big", loader)
+    assert loads == ["big", "big"] and cache.get_stats()["bytes"] == 0
+
+
+def test_load_overtaken_by_write_is_not_cached():
+    cache = TemplateCache(max_bytes=1024)
+
+    def stale_loader(user_id):
+        # Sočasna registracija med branjem iz shrambe: prebrano stanje je že zastarelo
+        cache.invalidate(user_id)
+        return _templates(1)
+
+    cache.get("a", stale_loader)
+    assert cache.get_stats()["size"] == 0
+    fresh = _templates(2)
+    assert cache.get("a", lambda user_id: fresh) is fresh
+    assert cache.get("a", lambda user_id: {}) is fresh
+    assert cache.get_stats()["hits"] == 1
+
+
+def test_tiered_loading_reads_templates_on_demand(run_python):
+    run_python("""
+        import numpy as np
+        from user_management import db
+
+        assert db.TIERED_LOADING
+        embedding = np.arange(8, dtype=np.float32) + 1
+        db.register_user_embeddings("a", [embedding])
+        db.template_cache.clear()
+
+        assert db.is_user_registered("a") and db.template_cache.get_stats()["size"] == 0
+        assert db.verify_user_by_embedding("a", embedding)[0]
+        assert db.template_cache.get_stats()["misses"] == 1
+        assert db.verify_user_by_embedding("a", embedding)[0]
+        assert db.template_cache.get_stats()["hits"] == 1
+
+        # Zapis, ki ne uspe, ne spremeni množice user_id in predpomnilnika
+        def failing_put(user_id, embeddings_list):
+            raise IOError("disk full")
+
+        db.embedding_store.put = failing_put
+        try:
+            db.register_user_embeddings("b", [embedding])
+        except IOError:
+            pass
+        else:
+            raise AssertionError("napaka zapisa ni prišla do klicatelja")
+        assert not db.is_user_registered("b") and db.template_cache.get_stats()["size"] == 1
+
+        assert db.delete_user("a") and not db.is_user_registered("a")
+        assert db.verify_user_by_embedding("a", embedding) == (False, 0.0)
+    """, FACE_STORE_BACKEND="matrix", FACE_STORE_TEMPLATE_CACHE_MB="1")
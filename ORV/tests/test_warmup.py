@@ -0,0 +1,80 @@
+import threading
+
+import numpy as np
+import pytest
+
+from api import face_embedder, face_service
+from api.batching import MicroBatcher
+from src import config
+
+
+@pytest.fixture
+def readiness(monkeypatch):
+    monkeypatch.setattr(face_service, "_readiness", {"status": "starting", "error": None, "warmup_seconds": None})
+    monkeypatch.setattr(face_service, "_load_face_processing", lambda: False)
+    return face_service._readiness
+
+
+def test_not_ready_until_warm_up_finishes(readiness, monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(face_embedder, "warm_up", lambda: release.wait(5))
+
+    assert face_service.get_readiness()[1] == 503
+    face_service.start_warmup()
+    payload, status = face_service.get_readiness()
+    assert status == 503 and payload["status"] == "warming"
+    # Drugi klic med ogrevanjem ne zažene nove niti
+    face_service.start_warmup()
+
+    release.set()
+    for _ in range(500):
+        if readiness["status"] != "warming":
+            break
+        threading.Event().wait(0.01)
+    payload, status = face_service.get_readiness()
+    assert status == 200 and payload["ready"] and payload["warmup_seconds"] is not None
+
+
+def test_failed_warm_up_is_reported(readiness, monkeypatch):
+    def fail():
+        raise RuntimeError("model missing")
+
+    monkeypatch.setattr(face_embedder, "warm_up", fail)
+    assert face_service.warm_up() is False
+    payload, status = face_service.get_readiness()
+    assert status == 503
+    assert payload["status"] == "failed" and payload["error"] == "model missing"
+
+
+def test_embedder_warm_up_calls_model_only_from_batcher_thread(monkeypatch):
+    calls = []
+
+    class Backend:
+        name = "fake"
+
+        def predict(self, batch):
+            calls.append((len(batch), threading.current_thread().name))
+            return np.zeros((len(batch), 4), dtype=np.float32)
+
+    backend = Backend()
+    batcher = MicroBatcher(backend.predict, max_batch_size=config.EMBED_BATCH_MAX_SIZE, max_wait_ms=5,
+                           name="warmup-test")
+    try:
+        monkeypatch.setattr(face_embedder, "_initialize_resources", lambda load_model=True: None)
+        monkeypatch.setattr(face_embedder, "_backend", backend)
+        monkeypatch.setattr(face_embedder, "_batcher", batcher)
+        face_embedder.warm_up()
+    finally:
+        batcher.stop()
+
+    assert sum(size for size, _ in calls) == 1 + config.EMBED_BATCH_MAX_SIZE
+    assert {thread for _, thread in calls} == {batcher._worker.name}
+
+
+@pytest.mark.parametrize("backend, loads_model", [("keras", False), ("tflite", False), ("onnx", True)])
+def test_preload_loads_only_fork_safe_models(monkeypatch, backend, loads_model):
+    calls = []
+    monkeypatch.setattr(config, "EMBEDDING_BACKEND", backend)
+    monkeypatch.setattr(face_embedder, "_initialize_resources", lambda load_model=True: calls.append(load_model))
+    face_embedder.preload_resources()
+    assert calls == [loads_model]
@@ -0,0 +1,494 @@
+import atexit
+import numpy as np
+import os
+import threading
+from collections import Counter, namedtuple
+from types import MappingProxyType
+
+from user_management.index import GalleryIndex
+from user_management.matching import best_template_scores, template_matrices
+from user_management.matrix_store import TemplateRows
+from user_management.persistence import PersistQueue
+from user_management.log_store import LogStore
+from user_management.store import ReadOnlyStoreError, open_store
+from user_management.sync import StoreSync
+from user_management.template_cache import TemplateCache
+from src.metrics import stage_timer, timed_stage, set_store_size
+
+# Pot do datoteke za shranjevanje
+# Pravilna pot glede na strukturo projekta: ../data_storage/
+script_dir = os.path.dirname(os.path.abspath(__file__))
+# FACE_DATA_STORAGE_DIR jo prestavi drugam (npr. ločena mapa za teste)
+DATA_STORAGE_DIR = os.environ.get("FACE_DATA_STORAGE_DIR", os.path.join(script_dir, '..', 'data_storage'))
+USER_DATA_FILE = os.path.join(DATA_STORAGE_DIR, 'user_embeddings.json')  # Stari format (backend "json")
+
+# Zagotovi, da direktorij data_storage obstaja
+os.makedirs(DATA_STORAGE_DIR, exist_ok=True)
+
+# Stanje v pomnilniku je nespremenljiv posnetek (copy-on-write): bralci (verify, is_user_registered) preberejo
+# trenutni _snapshot brez zaklepanja, pisci (register, delete) pod _write_lock naredijo spremenjeno kopijo in
+# zamenjajo referenco. users: user_id -> embeddingi; templates: user_id -> {dim: L2-normalizirana matrika}.
+StoreSnapshot = namedtuple("StoreSnapshot", ["users", "templates"])
+_snapshot = StoreSnapshot(MappingProxyType({}), MappingProxyType({}))
+_write_lock = threading.RLock()
+VERIFICATION_THRESHOLD = 0.65  # Prag za kosinusno podobnost (začni s tem, prilagajaj!)
+
+# 1:N identifikacija: indeks čez vse shranjene embeddinge, usklajen z register/delete
+IDENTIFY_INDEX_MODE = os.environ.get("FACE_INDEX_MODE", "auto")  # auto | exact | ivf
+IDENTIFY_IVF_MIN_ROWS = int(os.environ.get("FACE_INDEX_IVF_MIN_ROWS", "20000"))  # 'auto' preklopi na IVF nad tem
+IDENTIFY_IVF_NPROBE = int(os.environ.get("FACE_INDEX_IVF_NPROBE", "8"))
+gallery_index = GalleryIndex(mode=IDENTIFY_INDEX_MODE, ivf_min_rows=IDENTIFY_IVF_MIN_ROWS,
+                             nprobe=IDENTIFY_IVF_NPROBE)
+_gallery_lock = threading.Lock()
+_gallery_loaded = False  # Pri leni shrambi se indeks zgradi šele ob prvi identifikaciji
+
+# Trajna shramba: "log" = dnevnik sprememb (O(1) zapis) + posnetek, stiskan v ozadju; "json" = ena JSON datoteka,
+# zapisana na novo ob vsaki spremembi; "matrix" = strnjene float32 matrike (.npy memmap) z indeksom in bitno masko
+# izbrisanih, ki jih delavci delijo prek page cache; "sqlite" = SQLite baza (WAL), iz katere se uporabniki berejo
+# sproti (ob zagonu se ne nalaga). Obstoječi podatki se ob prvem zagonu prenesejo v izbrani format.
+STORE_BACKEND = os.environ.get("FACE_STORE_BACKEND", "log")
+STORE_FSYNC = os.environ.get("FACE_STORE_FSYNC", "1") == "1"  # fsync po vsakem zapisu (preživi izpad napajanja)
+STORE_COMPACT_MIN_BYTES = int(os.environ.get("FACE_STORE_COMPACT_MIN_BYTES", str(4 * 1024 * 1024)))
+
+# Replikacija med vozlišči prek dnevnika sprememb v skupni mapi FACE_REPLICATION_DIR (brez posrednika):
+# "leader" vsako spremembo zapiše še v ta dnevnik (LogStore); "follower" ta dnevnik odpre samo za branje kot svojo
+# shrambo (posnetek + dnevnik ob zagonu) in mu sledi kot spremembam drugih procesov (FACE_STORE_SYNC_INTERVAL_S).
+# Sledilec ne sprejema registracij in brisanj.
+REPLICATION_ROLE = os.environ.get("FACE_REPLICATION_ROLE", "")  # "" | leader | follower
+REPLICATION_DIR = os.environ.get("FACE_REPLICATION_DIR", os.path.join(DATA_STORAGE_DIR, 'replication'))
+if REPLICATION_ROLE not in ("", "leader", "follower"):
+    raise ValueError(f"Unknown replication role: {REPLICATION_ROLE}")
+
+if REPLICATION_ROLE == "follower":
+    embedding_store = open_store("log", REPLICATION_DIR, read_only=True)
+else:
+    embedding_store = open_store(STORE_BACKEND, DATA_STORAGE_DIR, fsync=STORE_FSYNC,
+                                 compact_min_bytes=STORE_COMPACT_MIN_BYTES)
+replication_log = None  # LogStore v REPLICATION_DIR na vodji, odpre se po nalaganju
+
+# Stopenjsko nalaganje za zelo velike galerije: v pomnilniku je samo množica user_id (is_user_registered v O(1)),
+# templati uporabnika se preberejo iz shrambe ob njegovi prvi verifikaciji in ostanejo v LRU predpomnilniku z
+# omejitvijo FACE_STORE_TEMPLATE_CACHE_MB. Deluje s shrambami, ki znajo brati posamezne uporabnike ("matrix",
+# "sqlite"). 0 = izklopljeno (vsi uporabniki v pomnilniku oz. pri "sqlite" branje iz baze ob vsaki zahtevi).
+TEMPLATE_CACHE_MB = float(os.environ.get("FACE_STORE_TEMPLATE_CACHE_MB", "0"))
+TIERED_LOADING = TEMPLATE_CACHE_MB > 0 and embedding_store.random_access
+if TEMPLATE_CACHE_MB > 0 and not TIERED_LOADING:
+    print(f"Store backend '{embedding_store.name}' cannot read single users; "
+          f"FACE_STORE_TEMPLATE_CACHE_MB is ignored and all users are loaded into memory.")
+template_cache = TemplateCache(int(TEMPLATE_CACHE_MB * 1024 * 1024)) if TIERED_LOADING else None
+_resident_user_ids = set()  # Pri stopenjskem nalaganju: vsi registrirani user_id (spreminja se pod _write_lock)
+# Uporabniki niso v posnetku, ampak se berejo iz shrambe (lena shramba ali stopenjsko nalaganje)
+_reads_from_store = embedding_store.lazy or TIERED_LOADING
+
+# Zapis v shrambo v ozadju (ne na niti zahtevka); lena shramba ("sqlite") je vir resnice, zato vanjo pišemo takoj
+STORE_ASYNC_PERSIST = os.environ.get("FACE_STORE_ASYNC_PERSIST", "1") == "1"
+_pending_writes = Counter()  # user_id -> število zapisov, ki še čakajo v persist_queue (pod _write_lock)
+
+
+def _reset_after_fork():
+    """
+    V otroku po fork-u (gunicorn s preload_app): niti starša (persist_queue, store_sync, stiskanje) so ob fork-u
+    morda držale zaklepe modula, shrambe ali indeksa, ki bi v otroku ostali zaklenjeni za vedno; ustvarimo jih na
+    novo. Zapise, ki so čakali ob fork-u, zapiše starš.
+    """
+    global _write_lock, _gallery_lock
+    _write_lock = threading.RLock()
+    _gallery_lock = threading.Lock()
+    _pending_writes.clear()
+    embedding_store.reset_after_fork()
+    if replication_log is not None:
+        replication_log.reset_after_fork()
+    if template_cache is not None:
+        template_cache.reset_after_fork()
+    gallery_index.reset_after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    # Registrirano pred persist_queue in store_sync: zaklepi so novi, preden se njune niti v otroku znova zaženejo
+    os.register_at_fork(after_in_child=_reset_after_fork)
+persist_queue = PersistQueue()
+atexit.register(persist_queue.stop)
+
+# Več delavcev (gunicorn) nad isto shrambo: vsak proces vsakih FACE_STORE_SYNC_INTERVAL_S sekund prebere spremembe
+# drugih procesov (dnevnik / indeks / tabela sprememb) in posodobi samo spremenjene uporabnike. 0 = izklopljeno.
+STORE_SYNC_INTERVAL_S = float(os.environ.get("FACE_STORE_SYNC_INTERVAL_S", "1.0"))
+store_sync = None  # StoreSync, ustvari se na koncu modula
+
+
+def _publish(users, templates):
+    """Objavi nov posnetek stanja (kliče se samo pod _write_lock)."""
+    global _snapshot
+    _snapshot = StoreSnapshot(MappingProxyType(users), MappingProxyType(templates))
+
+
+def _frozen_embeddings(embeddings_list):
+    # Seznam v posnetku se ne sme spreminjati; pogledi iz shrambe "matrix" (TemplateRows) so že nespremenljivi
+    return tuple(embeddings_list) if isinstance(embeddings_list, list) else embeddings_list
+
+
+def _frozen_templates(embeddings_list):
+    if isinstance(embeddings_list, TemplateRows):
+        # Vrstice shrambe "matrix" so že L2-normalizirane: pogledi v skupni memmap, brez kopije na proces
+        return embeddings_list.matrices()
+    templates = template_matrices(embeddings_list)
+    for matrix in templates.values():
+        matrix.setflags(write=False)
+    return templates
+
+
+def get_snapshot():
+    """Trenutni posnetek stanja (za več branj, ki morajo videti isto stanje)."""
+    return _snapshot
+
+
+def _load_embeddings_from_file():
+    global _gallery_loaded
+    # Zapisi v ozadju morajo biti v shrambi, preden jo beremo znova
+    persist_queue.flush()
+    with _write_lock:
+        if _reads_from_store:
+            # Uporabnike beremo iz shrambe ob zahtevi, v pomnilniku je kvečjemu seznam user_id in LRU templatov
+            _publish({}, {})
+            if TIERED_LOADING:
+                _load_resident_user_ids()
+            else:
+                print(f"Using {embedding_store.describe()} (users are read on demand)")
+            with _gallery_lock:
+                _gallery_loaded = False
+            _update_store_size()
+            return
+        try:
+            users = embedding_store.load()
+            print(f"Loaded {len(users)} users from {embedding_store.describe()}")
+        except Exception as e:
+            print(f"Could not load embeddings from store: {e}. Starting with an empty store.")
+            users = {}
+        users = {user_id: _frozen_embeddings(embeddings_list) for user_id, embeddings_list in users.items()}
+        _publish(users, {user_id: _frozen_templates(embeddings_list) for user_id, embeddings_list in users.items()})
+        with _gallery_lock:
+            gallery_index.rebuild(users)
+            _gallery_loaded = True
+        _update_store_size()
+
+
+def _load_resident_user_ids():
+    global _resident_user_ids
+    try:
+        user_ids = embedding_store.user_ids()
+    except Exception as e:
+        print(f"Could not read user ids from store: {e}. Starting with an empty store.")
+        user_ids = []
+    _resident_user_ids = set(user_ids)
+    template_cache.clear()
+    print(f"Indexed {len(_resident_user_ids)} users from {embedding_store.describe()} "
+          f"(templates are loaded on demand, cache limit {TEMPLATE_CACHE_MB:g} MB)")
+
+
+def _ensure_gallery():
+    """Ob prvi identifikaciji zgradi 1:N indeks iz vseh uporabnikov v shrambi (lena shramba, stopenjsko nalaganje)."""
+    global _gallery_loaded
+    with _gallery_lock:
+        if not _gallery_loaded:
+            if embedding_store.lazy:
+                users = embedding_store.load()
+            else:
+                # "matrix": load() bi shrambo odprl na novo; get vrne poglede v preslikane matrike
+                users = {user_id: embedding_store.get(user_id) for user_id in list(_resident_user_ids)}
+            gallery_index.rebuild(users)
+            _gallery_loaded = True
+
+
+def _update_store_size():
+    if _reads_from_store:
+        set_store_size(*embedding_store.count())
+        return
+    users = _snapshot.users
+    set_store_size(len(users), sum(len(embeddings) for embeddings in users.values()))
+
+
+# Zapis v shrambo je pred objavo posnetka in posodobitvijo indeksa: če ne uspe, napaka pride do API-ja (500),
+# stanje v pomnilniku pa ostane enako tistemu v shrambi. Napake zapisa v ozadju izpiše _run_persist.
+@timed_stage("persist")
+def _persist_register(user_id, embeddings_list):
+    embedding_store.put(user_id, embeddings_list)
+    _replicate("put", user_id, embeddings_list)
+
+
+@timed_stage("persist")
+def _persist_delete(user_id):
+    found = embedding_store.delete(user_id)
+    _replicate("delete", user_id)
+    return found
+
+
+def _replicate(operation, user_id, *args):
+    """Na vodji zapiše spremembo še v replikacijski dnevnik (v istem vrstnem redu kot v shrambo)."""
+    if replication_log is None:
+        return
+    try:
+        getattr(replication_log, operation)(user_id, *args)
+    except Exception as e:
+        print(f"Error writing change of user {user_id} to the replication log: {e}")
+
+
+def _open_replication_log():
+    """Vodja: odpre replikacijski dnevnik; prazen dnevnik napolni s trenutnimi uporabniki (začetni posnetek)."""
+    global replication_log
+    log = LogStore(REPLICATION_DIR, fsync=STORE_FSYNC, compact_min_bytes=STORE_COMPACT_MIN_BYTES)
+    users = embedding_store.load() if _reads_from_store else _snapshot.users
+    if log.seed(users):
+        print(f"Seeded replication log {REPLICATION_DIR} with {len(users)} users")
+    log.load()
+    replication_log = log
+    print(f"Replicating store changes to {log.describe()}")
+
+
+def is_read_only():
+    """Ali to vozlišče ne sprejema registracij/brisanj (sledilec replikacije)."""
+    return embedding_store.read_only
+
+
+# Naloži ob zagonu modula
+_load_embeddings_from_file()
+if REPLICATION_ROLE == "leader":
+    _open_replication_log()
+
+
+def register_user_embeddings(user_id, embeddings_list):
+    """Shrani/posodobi seznam embeddingov za uporabnika."""
+    if not all(isinstance(e, np.ndarray) for e in embeddings_list):
+        raise ValueError("All embeddings in the list must be NumPy arrays.")
+    if embedding_store.read_only:
+        raise ReadOnlyStoreError("This node is a read-only replica; register users on the leader.")
+    # Kosi, ki ne potrebujejo zaklepa, se izračunajo pred njim
+    embeddings = _frozen_embeddings(list(embeddings_list))
+    templates = _frozen_templates(embeddings) if not embedding_store.lazy or TIERED_LOADING else None
+    with _write_lock:
+        if _reads_from_store:
+            # Shramba je vir resnice (iz nje se bere ob zgrešitvi v predpomnilniku), zato pišemo takoj
+            _persist_register(user_id, embeddings)
+            if TIERED_LOADING:
+                _resident_user_ids.add(user_id)
+                template_cache.put(user_id, templates)
+        else:
+            _schedule_persist(_persist_register, user_id, embeddings)
+            _publish({**_snapshot.users, user_id: embeddings}, {**_snapshot.templates, user_id: templates})
+        with _gallery_lock:
+            if _gallery_loaded:
+                gallery_index.add(user_id, embeddings_list)
+        _update_store_size()
+    print(f"Registered/updated embeddings for user: {user_id} with {len(embeddings_list)} embeddings.")
+
+
+def _schedule_persist(fn, user_id, *args):
+    """
+    Zapis v shrambo (kliče se pod _write_lock): v ozadju (PersistQueue, v vrstnem redu sprememb) ali takoj
+    (napaka gre do klicatelja).
+    """
+    if not STORE_ASYNC_PERSIST:
+        fn(user_id, *args)
+        return
+    _pending_writes[user_id] += 1
+    persist_queue.submit(_run_persist, fn, user_id, *args)
+
+
+def _run_persist(fn, user_id, *args):
+    # Zahtevek je že odgovoril; napake zapisa v ozadju lahko samo izpišemo
+    try:
+        fn(user_id, *args)
+    except Exception as e:
+        print(f"Error persisting change of user {user_id} in the background: {e}")
+    finally:
+        with _write_lock:
+            _pending_writes[user_id] -= 1
+            if not _pending_writes[user_id]:
+                del _pending_writes[user_id]
+
+
+def _apply_store_changes(changes):
+    """
+    Vnese spremembe iz shrambe (tudi drugih procesov) v posnetek in 1:N indeks; templati
+    se na novo izračunajo samo za spremenjene uporabnike.
+    :param changes: slovar user_id -> embeddingi (None = izbrisan).
+    :return: število vnesenih sprememb.
+    """
+    with _write_lock:
+        # Lokalni zapis, ki še čaka v vrsti, bo v dnevniku za tem in ima prednost
+        changes = {user_id: embeddings_list for user_id, embeddings_list in changes.items()
+                   if not _pending_writes.get(user_id)}
+        if not changes:
+            return 0
+        if TIERED_LOADING:
+            for user_id, embeddings_list in changes.items():
+                if embeddings_list is None:
+                    _resident_user_ids.discard(user_id)
+                else:
+                    _resident_user_ids.add(user_id)
+                template_cache.invalidate(user_id)
+        elif not embedding_store.lazy:
+            users, templates = dict(_snapshot.users), dict(_snapshot.templates)
+            for user_id, embeddings_list in changes.items():
+                if embeddings_list is None:
+                    users.pop(user_id, None)
+                    templates.pop(user_id, None)
+                else:
+                    users[user_id] = _frozen_embeddings(embeddings_list)
+                    templates[user_id] = _frozen_templates(embeddings_list)
+            _publish(users, templates)
+        with _gallery_lock:
+            if _gallery_loaded:
+                for user_id, embeddings_list in changes.items():
+                    if embeddings_list is None:
+                        gallery_index.remove(user_id)
+                    else:
+                        gallery_index.add(user_id, embeddings_list)
+        _update_store_size()
+    return len(changes)
+
+
+def sync_store_changes():
+    """Prevzame spremembe, ki so jih v shrambo zapisali drugi procesi (None = stanje naloženo na novo)."""
+    changes = embedding_store.poll_changes()
+    if changes is None:
+        print(f"Change history of {embedding_store.describe()} is no longer available; reloading the store.")
+        _load_embeddings_from_file()
+        return None
+    return _apply_store_changes(changes)
+
+
+def get_user_embeddings(user_id):
+    """Pridobi shranjene embeddinge za uporabnika."""
+    if _reads_from_store:
+        return embedding_store.get(user_id)
+    return _snapshot.users.get(user_id, [])
+
+
+def get_user_templates(user_id):
+    """Templati uporabnika kot {dim: L2-normalizirana matrika (n, dim)}; prazen slovar, če ga ni."""
+    if TIERED_LOADING:
+        if user_id not in _resident_user_ids:
+            return {}
+        return template_cache.get(user_id, _read_user_templates)
+    if embedding_store.lazy:
+        embeddings_list = embedding_store.get(user_id)
+        return template_matrices(embeddings_list) if embeddings_list else {}
+    return _snapshot.templates.get(user_id, {})
+
+
+@timed_stage("match")
+def verify_user_by_embeddings(user_id_to_verify, query_embeddings):
+    """
+    Preveri več poizvedb za istega uporabnika z enim matričnim množenjem.
+    :param query_embeddings: (q, dim) array ali seznam q embeddingov.
+    :return: seznam (bool, float) parov - (ali je verifikacija uspešna, najvišja podobnost) za vsako poizvedbo.
+    """
+    queries = np.asarray(query_embeddings, dtype=np.float32)
+    queries = queries.reshape(len(queries), -1)
+    templates = get_user_templates(user_id_to_verify)
+    if not templates:
+        print(f"No embeddings found for user: {user_id_to_verify}. Cannot verify.")
+        return [(False, 0.0)] * len(queries)
+
+    matrix = templates.get(queries.shape[1])
+    if matrix is None:
+        # Shranjeni embeddingi so iz drugega modela (druga dimenzija)
+        print(f"No {queries.shape[1]}-d embeddings stored for user: {user_id_to_verify}. Cannot verify.")
+        return [(False, -1.0)] * len(queries)
+
+    scores, _ = best_template_scores(matrix, queries)
+    print(f"Verification for {user_id_to_verify}: Max similarity = {scores.max():.4f}, "
+          f"Threshold = {VERIFICATION_THRESHOLD}")
+    return [(bool(score >= VERIFICATION_THRESHOLD), float(score)) for score in scores]
+
+
+def verify_users_by_embeddings(pairs):
+    """
+    Paketna verifikacija: (user_id, query_embedding) pari; poizvedbe istega
+    uporabnika gredo v eno matrično množenje.
+    :return: seznam (bool, float) parov v istem vrstnem redu.
+    """
+    positions_by_user = {}
+    for position, (user_id, _) in enumerate(pairs):
+        positions_by_user.setdefault(user_id, []).append(position)
+
+    results = [None] * len(pairs)
+    for user_id, positions in positions_by_user.items():
+        user_results = verify_user_by_embeddings(user_id, [pairs[p][1] for p in positions])
+        for position, result in zip(positions, user_results):
+            results[position] = result
+    return results
+
+
+def verify_user_by_embedding(user_id_to_verify, query_embedding_np):
+    """
+    Preveri, ali dani query_embedding pripada uporabniku.
+    :return: (bool, float) - (Ali je verifikacija uspešna, najvišja dosežena podobnost)
+    """
+    if not isinstance(query_embedding_np, np.ndarray):
+        print("Error: query_embedding must be a NumPy array.")
+        return False, 0.0
+    return verify_user_by_embeddings(user_id_to_verify, query_embedding_np.reshape(1, -1))[0]
+
+
+def identify_by_embedding(query_embedding_np, top_k=5):
+    """
+    1:N identifikacija: poišče uporabnike, ki jim query_embedding najbolj ustreza.
+    :return: seznam (user_id, podobnost) parov, urejen po padajoči podobnosti.
+    """
+    if not isinstance(query_embedding_np, np.ndarray):
+        print("Error: query_embedding must be a NumPy array.")
+        return []
+    _ensure_gallery()
+    with stage_timer("search"):
+        return gallery_index.search(query_embedding_np, top_k=top_k)
+
+
+def _read_user_templates(user_id):
+    embeddings_list = embedding_store.get(user_id)
+    return _frozen_templates(embeddings_list) if embeddings_list else {}
+
+
+def is_user_registered(user_id):
+    if TIERED_LOADING:
+        return user_id in _resident_user_ids
+    if embedding_store.lazy:
+        return embedding_store.contains(user_id)
+    return user_id in _snapshot.users
+
+
+def delete_user(user_id):
+    if embedding_store.read_only:
+        raise ReadOnlyStoreError("This node is a read-only replica; delete users on the leader.")
+    with _write_lock:
+        if _reads_from_store:
+            found = _persist_delete(user_id)
+            if TIERED_LOADING:
+                _resident_user_ids.discard(user_id)
+                template_cache.invalidate(user_id)
+        else:
+            found = user_id in _snapshot.users
+            if found:
+                users, templates = dict(_snapshot.users), dict(_snapshot.templates)
+                del users[user_id]
+                templates.pop(user_id, None)
+                _schedule_persist(_persist_delete, user_id)
+                _publish(users, templates)
+        if found:
+            with _gallery_lock:
+                gallery_index.remove(user_id)
+            _update_store_size()
+    if found:
+        print(f"Deleted user {user_id} from store.")
+        return True
+    print(f"User {user_id} not found for deletion.")
+    return False
+
+
+# Sinhronizacija s spremembami drugih procesov (po definiciji vseh funkcij, ki jih uporablja)
+if STORE_SYNC_INTERVAL_S > 0:
+    if embedding_store.tracks_changes:
+        store_sync = StoreSync(sync_store_changes, STORE_SYNC_INTERVAL_S)
+        atexit.register(store_sync.stop)
+    else:
+        print(f"Store backend '{embedding_store.name}' cannot list changes; "
+              f"registrations from other worker processes are not picked up until restart.")
@@ -0,0 +1,473 @@
+import threading
+
+import numpy as np
+
+from user_management.matching import group_by_dim, normalize_rows
+
+# Privzete nastavitve indeksa (user_management.db jih lahko povozi z okoljskimi spremenljivkami)
+DEFAULT_BLOCK_SIZE = 8192  # Vrstic na en blok matričnega množenja pri natančnem iskanju
+DEFAULT_IVF_MIN_ROWS = 20000  # Pod tem številom templatov je natančno iskanje dovolj hitro
+DEFAULT_IVF_NLIST = 0  # Število gruč; 0 = samodejno (~sqrt(N))
+DEFAULT_IVF_TRAIN_POINTS_PER_LIST = 40  # Velikost vzorca za učenje centroidov (na gručo)
+DEFAULT_IVF_NPROBE = 8  # Število najbližjih gruč, ki jih preiščemo pri poizvedbi
+
+
+class ExactIndex:
+    """
+    Natančen 1:N indeks nad L2-normaliziranimi templati enega uporabnika ali več.
+
+    Vsi templati so v strnjenih float32 matrikah; iskanje je blokovno
+    matrično-vektorsko množenje (kosinusna podobnost = skalarni produkt).
+    Odstranjene vrstice se označijo kot proste in ponovno uporabijo.
+
+    Vrstice 0 .. len(_base) so lahko deljena matrika samo za branje (memmap
+    shrambe "matrix", glej attach_shared), ki se ne kopira; vrstice za njo so
+    v lastni matriki _matrix (dodani in spremenjeni uporabniki po zagonu).
+    """
+
+    def __init__(self, dim, block_size=DEFAULT_BLOCK_SIZE):
+        self.dim = dim
+        self.block_size = block_size
+        self._base = np.zeros((0, dim), dtype=np.float32)  # Deljene, že normalizirane vrstice (samo za branje)
+        self._matrix = np.zeros((0, dim), dtype=np.float32)  # Lastne vrstice za _base
+        self._owners = np.zeros(0, dtype=np.int64)  # Indeks uporabnika za vsako vrstico, -1 = prosta
+        self._size = 0  # Število uporabljenih (tudi prostih) vrstic na začetku matrike
+        self._free_rows = []
+        self._dead_base_rows = 0  # Proste vrstice v _base (se ne uporabijo znova)
+        self._user_rows = {}  # user_id -> seznam vrstic
+        self._labels = []  # Indeks uporabnika -> user_id
+        self._label_of = {}  # user_id -> indeks uporabnika
+        self._max_templates = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return self._size - len(self._free_rows) - self._dead_base_rows
+
+    @property
+    def num_users(self):
+        return len(self._user_rows)
+
+    def _label(self, user_id):
+        label = self._label_of.get(user_id)
+        if label is None:
+            label = len(self._labels)
+            self._labels.append(user_id)
+            self._label_of[user_id] = label
+        return label
+
+    def _allocate_row(self):
+        if self._free_rows:
+            return self._free_rows.pop()
+        base = len(self._base)
+        if self._size - base == len(self._matrix):
+            capacity = max(1024, 2 * len(self._matrix))
+            matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+            matrix[:len(self._matrix)] = self._matrix
+            owners = np.full(base + capacity, -1, dtype=np.int64)
+            owners[:self._size] = self._owners[:self._size]
+            self._matrix, self._owners = matrix, owners
+        self._size += 1
+        return self._size - 1
+
+    def _take(self, rows):
+        """Vrstice z danimi indeksi (iz deljene ali lastne matrike) kot nova matrika."""
+        rows = np.asarray(rows, dtype=np.int64)
+        base = len(self._base)
+        if not base:
+            return self._matrix[rows]
+        result = np.empty((len(rows), self.dim), dtype=np.float32)
+        in_base = rows < base
+        result[in_base] = self._base[rows[in_base]]
+        result[~in_base] = self._matrix[rows[~in_base] - base]
+        return result
+
+    def _blocks(self):
+        """(prva vrstica, blok) po vseh uporabljenih vrsticah, brez kopiranja."""
+        base = len(self._base)
+        for matrix, offset, used in ((self._base, 0, base), (self._matrix, base, self._size - base)):
+            for start in range(0, used, self.block_size):
+                yield offset + start, matrix[start:min(start + self.block_size, used)]
+
+    def attach_shared(self, base, user_segments):
+        """
+        Za vrstice indeksa uporabi deljeno matriko brez kopiranja (ob zagonu/ponovnem nalaganju).
+        :param base: (n, dim) matrika že L2-normaliziranih vrstic (npr. memmap shrambe "matrix").
+        :param user_segments: (user_id, začetna vrstica, število vrstic) za vse žive vrstice; ostale so mrtve.
+        """
+        with self._lock:
+            self._base = base
+            self._matrix = np.zeros((0, self.dim), dtype=np.float32)
+            self._owners = np.full(len(base), -1, dtype=np.int64)
+            self._size = len(base)
+            self._free_rows, self._user_rows = [], {}
+            self._labels, self._label_of = [], {}
+            self._max_templates = 0
+            for user_id, start, count in user_segments:
+                self._owners[start:start + count] = self._label(user_id)
+                rows = self._user_rows.setdefault(user_id, [])
+                rows.extend(range(start, start + count))
+                self._max_templates = max(self._max_templates, len(rows))
+            self._dead_base_rows = len(base) - int((self._owners >= 0).sum())
+            self._on_bulk_added()
+
+    def adopt(self, other):
+        """Prevzame vrstice drugega indeksa iste dimenzije brez kopiranja (preklop na IVF)."""
+        with self._lock:
+            self._base, self._matrix, self._owners = other._base, other._matrix, other._owners
+            self._size, self._free_rows, self._user_rows = other._size, other._free_rows, other._user_rows
+            self._dead_base_rows = other._dead_base_rows
+            self._labels, self._label_of = other._labels, other._label_of
+            self._max_templates = other._max_templates
+            self._on_bulk_added()
+
+    def add(self, user_id, embeddings):
+        """Doda (ali zamenja) templata uporabnika. embeddings: (n, dim)."""
+        with self._lock:
+            rows = self._add_rows(user_id, embeddings)
+            self._on_rows_added(rows)
+
+    def add_many(self, items):
+        """Doda več uporabnikov naenkrat (npr. ob zagonu). items: iterable (user_id, embeddings)."""
+        with self._lock:
+            for user_id, embeddings in items:
+                self._add_rows(user_id, embeddings)
+            self._on_bulk_added()
+
+    def _add_rows(self, user_id, embeddings):
+        embeddings = normalize_rows(np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim))
+        with self._lock:
+            self.remove(user_id)
+            label = self._label(user_id)
+            rows = []
+            for embedding in embeddings:
+                row = self._allocate_row()
+                self._matrix[row - len(self._base)] = embedding
+                self._owners[row] = label
+                rows.append(row)
+            self._user_rows[user_id] = rows
+            self._max_templates = max(self._max_templates, len(rows))
+            return rows
+
+    def remove(self, user_id):
+        with self._lock:
+            rows = self._user_rows.pop(user_id, None)
+            if not rows:
+                return False
+            self._on_rows_removed(rows)
+            base = len(self._base)
+            for row in rows:
+                self._owners[row] = -1
+                if row >= base:
+                    self._matrix[row - base] = 0.0
+                    self._free_rows.append(row)
+                else:
+                    # Deljenih vrstic ne spreminjamo in ne uporabimo znova, ostanejo samo označene kot proste
+                    self._dead_base_rows += 1
+            return True
+
+    def _on_rows_added(self, rows):
+        pass
+
+    def _on_bulk_added(self):
+        pass
+
+    def _on_rows_removed(self, rows):
+        pass
+
+    def _candidate_rows(self, query):
+        """Vrstice, ki jih preišče poizvedba (None = vse)."""
+        return None
+
+    def search(self, query, top_k=5):
+        """
+        Vrne do `top_k` (user_id, podobnost) parov, urejenih po padajoči podobnosti.
+        Podobnost uporabnika je največja podobnost med njegovimi templati.
+        """
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(query)
+        if norm == 0 or top_k <= 0:
+            return []
+        query = query / norm
+
+        with self._lock:
+            if not self._user_rows:
+                return []
+            # Top-k različnih uporabnikov je zagotovo med top (k * max_templatov) vrsticami
+            num_rows = top_k * max(1, self._max_templates)
+            candidates = self._candidate_rows(query)
+            if candidates is None:
+                rows, scores = self._scan_blocks(query, num_rows)
+            else:
+                rows, scores = self._scan_rows(query, candidates, num_rows)
+            owners = self._owners[rows]
+
+            results = []
+            seen = set()
+            for row_owner, score in zip(owners, scores):
+                if row_owner < 0 or row_owner in seen:
+                    continue
+                seen.add(row_owner)
+                results.append((self._labels[row_owner], float(score)))
+                if len(results) == top_k:
+                    break
+            return results
+
+    def _scan_blocks(self, query, num_rows):
+        best_rows = np.zeros(0, dtype=np.int64)
+        best_scores = np.zeros(0, dtype=np.float32)
+        for start, block in self._blocks():
+            end = start + len(block)
+            scores = block @ query
+            scores[self._owners[start:end] < 0] = -np.inf
+            best_rows = np.concatenate([best_rows, np.arange(start, end)])
+            best_scores = np.concatenate([best_scores, scores])
+            if len(best_scores) > num_rows:
+                keep = np.argpartition(-best_scores, num_rows)[:num_rows]
+                best_rows, best_scores = best_rows[keep], best_scores[keep]
+        order = np.argsort(-best_scores)
+        return best_rows[order], best_scores[order]
+
+    def _scan_rows(self, query, rows, num_rows):
+        if len(rows) == 0:
+            return rows, np.zeros(0, dtype=np.float32)
+        scores = self._take(rows) @ query
+        if len(scores) > num_rows:
+            keep = np.argpartition(-scores, num_rows)[:num_rows]
+            rows, scores = rows[keep], scores[keep]
+        order = np.argsort(-scores)
+        return rows[order], scores[order]
+
+
+class _InvertedList:
+    """
+    Vrstice ene IVF gruče v rastočem NumPy arrayu. Položaj vsake vrstice hrani
+    IVFIndex, zato je brisanje O(1): na izpraznjeno mesto se premakne zadnja vrstica.
+    """
+
+    __slots__ = ("_rows", "_size")
+
+    def __init__(self):
+        self._rows = np.zeros(16, dtype=np.int64)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def append(self, row):
+        """Doda vrstico in vrne njen položaj v gruči."""
+        if self._size == len(self._rows):
+            rows = np.zeros(2 * len(self._rows), dtype=np.int64)
+            rows[:self._size] = self._rows
+            self._rows = rows
+        self._rows[self._size] = row
+        self._size += 1
+        return self._size - 1
+
+    def remove_at(self, position):
+        """Odstrani vrstico na danem položaju; vrne vrstico, ki se je premaknila nanj (ali None)."""
+        self._size -= 1
+        if position == self._size:
+            return None
+        moved = int(self._rows[self._size])
+        self._rows[position] = moved
+        return moved
+
+    def rows(self):
+        return self._rows[:self._size]
+
+
+class IVFIndex(ExactIndex):
+    """
+    Približni indeks (IVF): templati so razdeljeni v gruče okoli centroidov
+    (k-means), poizvedba pa preišče samo `nprobe` najbližjih gruč.
+
+    Dodajanje in brisanje sta inkrementalna; centroidi se ponovno naučijo,
+    ko se število templatov od zadnjega učenja podvoji.
+    """
+
+    def __init__(self, dim, nlist=DEFAULT_IVF_NLIST, nprobe=DEFAULT_IVF_NPROBE,
+                 block_size=DEFAULT_BLOCK_SIZE):
+        super().__init__(dim, block_size=block_size)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self._centroids = None
+        self._lists = []  # Gruča -> _InvertedList
+        self._row_list = {}  # vrstica -> (indeks gruče, položaj v gruči)
+        self._trained_size = 0
+
+    def _target_nlist(self):
+        if self.nlist > 0:
+            return self.nlist
+        return max(1, int(np.sqrt(max(1, len(self)))))
+
+    def train(self, iterations=10, seed=0):
+        """Nauči centroide s sferičnim k-means nad trenutnimi templati in razporedi vrstice."""
+        with self._lock:
+            live_rows = np.flatnonzero(self._owners[:self._size] >= 0)
+            if len(live_rows) == 0:
+                self._centroids = None
+                self._lists, self._row_list = [], {}
+                return
+            nlist = min(self._target_nlist(), len(live_rows))
+            rng = np.random.default_rng(seed)
+            # Centroide učimo na vzorcu, razporedimo pa vse vrstice
+            sample_size = min(len(live_rows), nlist * DEFAULT_IVF_TRAIN_POINTS_PER_LIST)
+            data = self._take(rng.choice(live_rows, sample_size, replace=False))
+            centroids = data[rng.choice(len(data), nlist, replace=False)].copy()
+            for _ in range(iterations):
+                assignment = np.argmax(data @ centroids.T, axis=1)
+                order = np.argsort(assignment, kind="stable")
+                clusters, starts = np.unique(assignment[order], return_index=True)
+                centroids[clusters] = np.add.reduceat(data[order], starts, axis=0)
+                centroids = normalize_rows(centroids)
+
+            self._centroids = centroids
+            assignment = np.concatenate([
+                np.argmax(self._take(live_rows[i:i + self.block_size]) @ centroids.T, axis=1)
+                for i in range(0, len(live_rows), self.block_size)
+            ])
+            self._lists = [_InvertedList() for _ in range(nlist)]
+            self._row_list = {}
+            self._assign(live_rows, assignment)
+            self._trained_size = len(live_rows)
+
+    def _assign(self, rows, assignment):
+        for row, c in zip(rows, assignment):
+            row, c = int(row), int(c)
+            self._row_list[row] = (c, self._lists[c].append(row))
+
+    def _on_rows_added(self, rows):
+        if self._centroids is None or len(self) >= 2 * max(1, self._trained_size):
+            self.train()
+            return
+        assignment = np.argmax(self._take(rows) @ self._centroids.T, axis=1)
+        self._assign(rows, assignment)
+
+    def _on_bulk_added(self):
+        self.train()
+
+    def _on_rows_removed(self, rows):
+        for row in rows:
+            entry = self._row_list.pop(row, None)
+            if entry is None:
+                continue
+            c, position = entry
+            moved = self._lists[c].remove_at(position)
+            if moved is not None:
+                self._row_list[moved] = (c, position)
+
+    def _candidate_rows(self, query):
+        if self._centroids is None:
+            return None
+        nprobe = min(self.nprobe, len(self._centroids))
+        probe = np.argpartition(-(self._centroids @ query), nprobe - 1)[:nprobe]
+        return np.concatenate([self._lists[c].rows() for c in probe])
+
+
+class GalleryIndex:
+    """
+    Indeks čez vse shranjene embeddinge, ločeno po dimenziji (v shrambi so lahko
+    embeddingi različnih modelov). Glede na način in velikost galerije uporabi
+    natančen ali IVF indeks.
+    """
+
+    def __init__(self, mode="auto", ivf_min_rows=DEFAULT_IVF_MIN_ROWS, nlist=DEFAULT_IVF_NLIST,
+                 nprobe=DEFAULT_IVF_NPROBE, block_size=DEFAULT_BLOCK_SIZE):
+        if mode not in ("auto", "exact", "ivf"):
+            raise ValueError(f"Unknown index mode: {mode}")
+        self.mode = mode
+        self.ivf_min_rows = ivf_min_rows
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.block_size = block_size
+        self._indexes = {}  # dim -> ExactIndex/IVFIndex
+        self._lock = threading.RLock()
+
+    def reset_after_fork(self):
+        """V otroku po fork-u: nove zaklepe (ob fork-u jih je morda držala nit starša, npr. sinhronizacija)."""
+        self._lock = threading.RLock()
+        for index in self._indexes.values():
+            index._lock = threading.RLock()
+
+    def _new_index(self, dim):
+        if self.mode == "ivf":
+            return IVFIndex(dim, nlist=self.nlist, nprobe=self.nprobe, block_size=self.block_size)
+        return ExactIndex(dim, block_size=self.block_size)
+
+    def _maybe_upgrade(self, dim):
+        """V načinu 'auto' preklopi na IVF, ko galerija preseže ivf_min_rows."""
+        index = self._indexes[dim]
+        if self.mode != "auto" or isinstance(index, IVFIndex) or len(index) < self.ivf_min_rows:
+            return
+        upgraded = IVFIndex(dim, nlist=self.nlist, nprobe=self.nprobe, block_size=self.block_size)
+        upgraded.adopt(index)
+        self._indexes[dim] = upgraded
+
+    def add(self, user_id, embeddings_list):
+        """Doda/zamenja templata uporabnika (seznam NumPy arrayev)."""
+        by_dim = group_by_dim(embeddings_list)
+        with self._lock:
+            self.remove(user_id)
+            for dim, embeddings in by_dim.items():
+                if dim not in self._indexes:
+                    self._indexes[dim] = self._new_index(dim)
+                self._indexes[dim].add(user_id, embeddings)
+                self._maybe_upgrade(dim)
+
+    def remove(self, user_id):
+        with self._lock:
+            removed = False
+            for index in self._indexes.values():
+                removed = index.remove(user_id) or removed
+            return removed
+
+    def rebuild(self, store):
+        """
+        Zgradi indeks na novo iz slovarja user_id -> seznam embeddingov. Če so vsi templati
+        ene dimenzije pogledi v isto matriko shrambe "matrix" (TemplateRows), indeks to
+        matriko uporabi neposredno, brez kopije.
+        """
+        items_by_dim, shared_by_dim = {}, {}
+        for user_id, embeddings_list in store.items():
+            segments = getattr(embeddings_list, "segments", None)
+            if segments is None:
+                for dim, embeddings in group_by_dim(embeddings_list).items():
+                    items_by_dim.setdefault(dim, []).append((user_id, embeddings))
+                continue
+            for matrix, start, count in segments:
+                shared_by_dim.setdefault(matrix.shape[1], {}).setdefault(id(matrix), (matrix, []))[1].append(
+                    (user_id, start, count))
+
+        shared = {}
+        for dim, by_matrix in shared_by_dim.items():
+            if len(by_matrix) == 1 and dim not in items_by_dim:
+                shared[dim] = next(iter(by_matrix.values()))
+                continue
+            for matrix, user_segments in by_matrix.values():
+                for user_id, start, count in user_segments:
+                    items_by_dim.setdefault(dim, []).append((user_id, matrix[start:start + count]))
+
+        with self._lock:
+            self._indexes = {}
+            for dim, (matrix, user_segments) in shared.items():
+                self._indexes[dim] = self._new_index(dim)
+                self._indexes[dim].attach_shared(
+                    matrix[:max(start + count for _, start, count in user_segments)], user_segments)
+                self._maybe_upgrade(dim)
+            for dim, items in items_by_dim.items():
+                self._indexes[dim] = self._new_index(dim)
+                self._indexes[dim].add_many(items)
+                self._maybe_upgrade(dim)
+
+    def search(self, query, top_k=5):
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        index = self._indexes.get(query.shape[0])
+        if index is None:
+            return []
+        return index.search(query, top_k=top_k)
+
+    def stats(self):
+        return {
+            str(dim): {"type": type(index).__name__, "templates": len(index), "users": index.num_users}
+            for dim, index in self._indexes.items()
+        }
@@ -0,0 +1,479 @@
+import os
+import re
+import struct
+import threading
+import zlib
+
+import numpy as np
+
+from user_management.store import EmbeddingStore, ReadOnlyStoreError, read_json_embeddings
+
+try:
+    import fcntl
+except ImportError:  # Windows: brez zaklepanja med procesi
+    fcntl = None
+
+OP_REGISTER = 1
+OP_DELETE = 2
+
+SNAPSHOT_MAGIC = b"FEMBSNAP"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_NAME = "embeddings.snapshot"
+LOG_NAME_FORMAT = "embeddings.{:08d}.log"
+LOG_NAME_PATTERN = re.compile(r"^embeddings\.(\d{8})\.log$")
+LOCK_NAME = "embeddings.lock"
+COMPACT_LOCK_NAME = "embeddings.compact.lock"
+
+_FRAME_HEADER = struct.Struct("<II")  # dolžina zapisa, CRC32 zapisa
+_SNAPSHOT_HEADER = struct.Struct("<8sHQ")  # magic, verzija, prva generacija dnevnika, ki ni v posnetku
+DEFAULT_COMPACT_MIN_BYTES = 4 * 1024 * 1024
+READ_ONLY_LOAD_ATTEMPTS = 5  # Nalaganje brez zaklepa ponovimo, če pisec vmes stisne dnevnik
+
+
+def encode_record(op, user_id, embeddings_list=()):
+    """Binarni zapis ene spremembe (z glavo dolžine in CRC32)."""
+    uid = user_id.encode("utf-8")
+    parts = [struct.pack("<BH", op, len(uid)), uid]
+    if op == OP_REGISTER:
+        parts.append(struct.pack("<H", len(embeddings_list)))
+        for embedding in embeddings_list:
+            embedding = np.asarray(embedding, dtype="<f4").reshape(-1)
+            parts.append(struct.pack("<I", embedding.shape[0]))
+            parts.append(embedding.tobytes())
+    payload = b"".join(parts)
+    return _FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def decode_record(payload):
+    """(op, user_id, seznam embeddingov) iz vsebine zapisa."""
+    op, uid_len = struct.unpack_from("<BH", payload, 0)
+    offset = 3
+    user_id = payload[offset:offset + uid_len].decode("utf-8")
+    offset += uid_len
+    embeddings_list = []
+    if op == OP_REGISTER:
+        (count,) = struct.unpack_from("<H", payload, offset)
+        offset += 2
+        for _ in range(count):
+            (dim,) = struct.unpack_from("<I", payload, offset)
+            offset += 4
+            embeddings_list.append(np.frombuffer(payload, dtype="<f4", count=dim, offset=offset).astype(np.float32))
+            offset += 4 * dim
+    return op, user_id, embeddings_list
+
+
+def read_records(f):
+    """
+    Bere zapise iz odprte datoteke do konca ali do prvega nepopolnega/poškodovanega zapisa.
+    Vrača (op, user_id, embeddingi, odmik za zapisom).
+    """
+    offset = f.tell()
+    while True:
+        header = f.read(_FRAME_HEADER.size)
+        if len(header) < _FRAME_HEADER.size:
+            return
+        length, crc = _FRAME_HEADER.unpack(header)
+        payload = f.read(length)
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            return
+        offset += _FRAME_HEADER.size + length
+        op, user_id, embeddings_list = decode_record(payload)
+        yield op, user_id, embeddings_list, offset
+
+
+def apply_record(users, op, user_id, embeddings_list):
+    if op == OP_REGISTER:
+        users[user_id] = embeddings_list
+    elif op == OP_DELETE:
+        users.pop(user_id, None)
+
+
+class LogStore(EmbeddingStore):
+    """
+    Shramba kot dnevnik sprememb (append-only) in občasni posnetek stanja.
+
+    Vsaka registracija ali brisanje je en binarni zapis (dolžina, CRC32,
+    vsebina), dodan na konec trenutnega dnevnika, zato je zapis O(1) ne glede
+    na število uporabnikov. Nepopoln zapis na koncu dnevnika (prekinitev med
+    pisanjem) se ob zagonu zazna po CRC in odreže.
+
+    Ko dnevnik preraste posnetek (in vsaj compact_min_bytes), nit v ozadju
+    naredi nov posnetek: pisanje preklopi na naslednjo generacijo dnevnika,
+    posnetek + zaprti dnevniki se združijo v začasno datoteko, ki atomarno
+    (os.replace) zamenja stari posnetek, nato se zaprti dnevniki pobrišejo.
+    Ob zagonu se naloži posnetek in predvajajo dnevniki od generacije, ki jo
+    posnetek navaja naprej.
+
+    Dodajanje in preklop generacije sta zaščitena z zaklepom datoteke (flock),
+    zato lahko več gunicorn delavcev piše v isto mapo. Dnevnik je hkrati
+    zaporedje sprememb za ostale delavce: `poll_changes` bere zapise od
+    zadnjega prebranega odmika naprej.
+
+    Z read_only=True shramba ničesar ne zapisuje (ne popravlja, ne seli in ne
+    briše datotek); tako replikacijski sledilec bere dnevnik vodje v skupni mapi.
+    """
+
+    name = "log"
+    tracks_changes = True
+
+    def __init__(self, directory, legacy_json_path=None, fsync=True,
+                 compact_min_bytes=DEFAULT_COMPACT_MIN_BYTES, read_only=False):
+        self.directory = directory
+        self.legacy_json_path = legacy_json_path
+        self.fsync = fsync
+        self.compact_min_bytes = int(compact_min_bytes)
+        self.read_only = read_only
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_NAME)
+        if not read_only:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._lock_fd = None
+        self._lock_pid = None
+        self._log_fd = None
+        self._generation = None
+        self._compacting = False
+
+        # Bralni kazalec za poll_changes (generacija, odmik), ločen od pisanja
+        self._read_lock = threading.Lock()
+        self._read_file = None
+        self._read_pid = None
+        self._read_generation = None
+        self._read_offset = 0
+
+    # --- Poti in zaklepanje ---
+
+    def _log_path(self, generation):
+        return os.path.join(self.directory, LOG_NAME_FORMAT.format(generation))
+
+    def _log_generations(self):
+        generations = []
+        if not os.path.isdir(self.directory):
+            return generations  # Sledilec, ki se je zagnal pred vodjo
+        for filename in os.listdir(self.directory):
+            match = LOG_NAME_PATTERN.match(filename)
+            if match:
+                generations.append(int(match.group(1)))
+        return sorted(generations)
+
+    def _lock_exclusive(self):
+        if fcntl is None:
+            return
+        # flock velja za odprto datoteko, ki si jo proces po fork-u deli s staršem; vsak proces odpre svojo
+        if self._lock_pid != os.getpid():
+            self._lock_fd = os.open(os.path.join(self.directory, LOCK_NAME), os.O_RDWR | os.O_CREAT, 0o644)
+            self._lock_pid = os.getpid()
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+
+    def _unlock(self):
+        if fcntl is not None:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _fsync_dir(self):
+        if not self.fsync or not hasattr(os, "O_DIRECTORY"):
+            return
+        dir_fd = os.open(self.directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    # --- Branje ---
+
+    def _read_snapshot(self, users):
+        """Naloži posnetek v `users`; vrne prvo generacijo dnevnika, ki ni vključena."""
+        if not os.path.exists(self.snapshot_path):
+            return 0
+        with open(self.snapshot_path, "rb") as f:
+            header = f.read(_SNAPSHOT_HEADER.size)
+            magic, version, next_generation = _SNAPSHOT_HEADER.unpack(header)
+            if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+                raise ValueError(f"Unknown snapshot format in {self.snapshot_path}")
+            for op, user_id, embeddings_list, _ in read_records(f):
+                apply_record(users, op, user_id, embeddings_list)
+        return next_generation
+
+    def _replay_log(self, generation, users, repair=False):
+        """
+        Predvaja dnevnik v `users` in vrne odmik za zadnjim celim zapisom.
+        Z repair=True odreže nepopoln zapis na koncu.
+        """
+        path = self._log_path(generation)
+        valid_end = 0
+        with open(path, "rb") as f:
+            for op, user_id, embeddings_list, offset in read_records(f):
+                apply_record(users, op, user_id, embeddings_list)
+                valid_end = offset
+            file_size = os.fstat(f.fileno()).st_size
+        if valid_end < file_size and not self.read_only:
+            # Pri branju brez zaklepa je to lahko zapis, ki ga pisec ravno dodaja
+            print(f"Warning: {path} has {file_size - valid_end} trailing bytes of an incomplete record"
+                  f"{', truncating' if repair else ''}.")
+            if repair:
+                with open(path, "r+b") as f:
+                    f.truncate(valid_end)
+        return valid_end
+
+    def _read_state(self, up_to_generation=None, repair=False):
+        """
+        Stanje iz posnetka in dnevnikov (do vključno up_to_generation).
+        Vrne (users, prva generacija za posnetkom, predvajane generacije).
+        """
+        users = {}
+        next_generation = self._read_snapshot(users)
+        generations = [g for g in self._log_generations()
+                       if g >= next_generation and (up_to_generation is None or g <= up_to_generation)]
+        for generation in generations:
+            self._replay_log(generation, users, repair=repair and generation == generations[-1])
+        return users, next_generation, generations
+
+    def load(self):
+        if self.read_only:
+            return self._load_read_only()
+        # Pod obema zaklepoma: stiskanje (tudi v drugi niti istega procesa) med branjem ne zamenja posnetka
+        # in ne pobriše dnevnikov
+        with self._lock:
+            self._lock_exclusive()
+            try:
+                if (not os.path.exists(self.snapshot_path) and not self._log_generations()
+                        and self.legacy_json_path and os.path.exists(self.legacy_json_path)):
+                    self._migrate_legacy_json()
+
+                users, next_generation, generations = self._read_state(repair=True)
+                # Dnevniki, ki so že v posnetku (prekinjeno čiščenje po stiskanju)
+                for generation in self._log_generations():
+                    if generation < next_generation:
+                        os.remove(self._log_path(generation))
+                self._open_log(generations[-1] if generations else next_generation)
+                with self._read_lock:
+                    self._open_reader(self._generation, os.path.getsize(self._log_path(self._generation)))
+            finally:
+                self._unlock()
+        return users
+
+    def _load_read_only(self):
+        """Posnetek + dnevniki brez zaklepa in brez pisanja; bralni kazalec ostane na koncu prebranega."""
+        for _ in range(READ_ONLY_LOAD_ATTEMPTS):
+            # Dnevnike naštejemo pred branjem posnetka: če je posnetek še star, so bili takrat vsi še na disku
+            generations = self._log_generations()
+            users = {}
+            try:
+                next_generation = self._read_snapshot(users)
+                cursor = (next_generation, 0)
+                for generation in generations:
+                    if generation >= next_generation:
+                        cursor = (generation, self._replay_log(generation, users))
+            except FileNotFoundError:
+                continue  # Pisec je vmes stisnil dnevnik; beremo znova
+            with self._read_lock:
+                self._close_reader()
+                self._read_generation, self._read_offset = cursor
+            return users
+        raise RuntimeError(f"Could not read a consistent state from {self.directory}")
+
+    def seed(self, users):
+        """
+        Prazno shrambo (brez posnetka in dnevnikov) napolni z `users` kot začetnim
+        posnetkom. Vrne True, če je bila shramba prazna.
+        """
+        self._lock_exclusive()
+        try:
+            if os.path.exists(self.snapshot_path) or self._log_generations():
+                return False
+            self._install_snapshot(self._write_snapshot(users, next_generation=0))
+            return True
+        finally:
+            self._unlock()
+
+    def _migrate_legacy_json(self):
+        users = read_json_embeddings(self.legacy_json_path)
+        self._install_snapshot(self._write_snapshot(users, next_generation=0))
+        os.replace(self.legacy_json_path, self.legacy_json_path + ".migrated")
+        print(f"Migrated {len(users)} users from {self.legacy_json_path} to {self.snapshot_path}")
+
+    # --- Pisanje ---
+
+    def _open_log(self, generation):
+        if self._log_fd is not None:
+            os.close(self._log_fd)
+        self._log_fd = os.open(self._log_path(generation), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._generation = generation
+
+    def _append(self, record):
+        if self.read_only:
+            raise ReadOnlyStoreError(f"{self.directory} is opened read-only")
+        with self._lock:
+            self._lock_exclusive()
+            try:
+                # Drug proces je morda že preklopil na novo generacijo (stiskanje +1, clear +2) ali pa je
+                # naš dnevnik pobrisal; pišemo vedno v najnovejšo generacijo na disku (tudi brez predhodnega load)
+                latest = max(self._log_generations() + [self._generation or 0])
+                if latest != self._generation or not os.path.exists(self._log_path(self._generation)):
+                    self._open_log(latest)
+                os.write(self._log_fd, record)
+                if self.fsync:
+                    os.fsync(self._log_fd)
+                log_bytes = os.fstat(self._log_fd).st_size
+            finally:
+                self._unlock()
+            self._maybe_compact(log_bytes)
+
+    def put(self, user_id, embeddings_list):
+        self._append(encode_record(OP_REGISTER, user_id, embeddings_list))
+
+    def delete(self, user_id):
+        self._append(encode_record(OP_DELETE, user_id))
+
+    def clear(self):
+        if self.read_only:
+            raise ReadOnlyStoreError(f"{self.directory} is opened read-only")
+        with self._lock:
+            self._lock_exclusive()
+            try:
+                generations = self._log_generations()
+                # Nova generacija, da drugi procesi ob naslednjem zapisu preklopijo nanjo; vrzel (+2) v
+                # številkah generacij pove bralcem (poll_changes), da je bila zgodovina pobrisana
+                self._open_log(max(generations + [self._generation or 0]) + 2)
+                for generation in generations:
+                    os.remove(self._log_path(generation))
+                if os.path.exists(self.snapshot_path):
+                    os.remove(self.snapshot_path)
+            finally:
+                self._unlock()
+
+    def describe(self):
+        if self.read_only:
+            return f"{self.snapshot_path} + log generation {self._read_generation} (read-only)"
+        return f"{self.snapshot_path} + log generation {self._generation}"
+
+    def close(self):
+        with self._lock:
+            if self._log_fd is not None:
+                os.close(self._log_fd)
+                self._log_fd = None
+        with self._read_lock:
+            self._close_reader()
+
+    # --- Spremembe drugih procesov ---
+
+    def reset_after_fork(self):
+        self._lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._compacting = False  # Nit stiskanja starša v otroku ne teče
+
+    def _close_reader(self):
+        if self._read_file is not None and self._read_pid == os.getpid():
+            self._read_file.close()
+        self._read_file = None
+
+    def _open_reader(self, generation, offset):
+        self._close_reader()
+        # Odprta datoteka ostane berljiva tudi, ko jo stiskanje pobriše
+        self._read_file = open(self._log_path(generation), "rb")
+        self._read_pid = os.getpid()
+        self._read_generation = generation
+        self._read_offset = offset
+
+    def poll_changes(self):
+        changes = {}
+        with self._read_lock:
+            if self._read_generation is None:
+                return None
+            if self._read_file is None or self._read_pid != os.getpid():
+                # Po fork-u si proces s staršem deli odmik v datoteki, zato odpremo svojo
+                try:
+                    self._open_reader(self._read_generation, self._read_offset)
+                except FileNotFoundError:
+                    # Dnevnik še ne obstaja (nič zapisanega) ali pa je že stisnjen
+                    if any(g > self._read_generation for g in self._log_generations()):
+                        return None
+                    return {}
+            while True:
+                # Novejša generacija pomeni, da je trenutna zaprta: do konca jo preberemo in preklopimo
+                newer = [g for g in self._log_generations() if g > self._read_generation]
+                self._read_file.seek(self._read_offset)
+                for op, user_id, embeddings_list, offset in read_records(self._read_file):
+                    changes[user_id] = embeddings_list if op == OP_REGISTER else None
+                    self._read_offset = offset
+                if not newer:
+                    return changes
+                if newer[0] != self._read_generation + 1:
+                    return None  # Vmesni dnevniki so že stisnjeni ali pobrisani
+                try:
+                    self._open_reader(newer[0], 0)
+                except FileNotFoundError:
+                    return None
+
+    # --- Stiskanje (compaction) ---
+
+    def _maybe_compact(self, log_bytes):
+        """Kliče se pod self._lock. Zažene stiskanje v ozadju, ko dnevnik preraste posnetek."""
+        if self._compacting:
+            return
+        snapshot_bytes = os.path.getsize(self.snapshot_path) if os.path.exists(self.snapshot_path) else 0
+        if log_bytes < max(self.compact_min_bytes, snapshot_bytes):
+            return
+        self._compacting = True
+        threading.Thread(target=self.compact, name="embedding-log-compaction", daemon=True).start()
+
+    def compact(self):
+        """Združi posnetek in zaprte dnevnike v nov posnetek (blokira; običajno teče v ozadju)."""
+        if self.read_only:
+            raise ReadOnlyStoreError(f"{self.directory} is opened read-only")
+        compact_lock_fd = os.open(os.path.join(self.directory, COMPACT_LOCK_NAME), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(compact_lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return  # Stiskanje že teče v drugem procesu
+            # Nove zapise (vseh procesov) preusmerimo v naslednjo generacijo; trenutna je s tem zaprta
+            with self._lock:
+                self._lock_exclusive()
+                try:
+                    sealed = max([self._generation] + self._log_generations())
+                    self._open_log(sealed + 1)
+                finally:
+                    self._unlock()
+
+            users, _, _ = self._read_state(up_to_generation=sealed)
+            tmp_path = self._write_snapshot(users, next_generation=sealed + 1)
+
+            # Zamenjava posnetka in brisanje zaprtih dnevnikov pod zaklepom, sicer bi load lahko prebral
+            # star posnetek in nato ne našel dnevnikov, ki jih ta še ne vsebuje
+            with self._lock:
+                self._lock_exclusive()
+                try:
+                    self._install_snapshot(tmp_path)
+                    for generation in self._log_generations():
+                        if generation <= sealed:
+                            os.remove(self._log_path(generation))
+                finally:
+                    self._unlock()
+            print(f"Compacted embedding log into {self.snapshot_path} ({len(users)} users)")
+        except Exception as e:
+            print(f"Error compacting embedding log: {e}")
+        finally:
+            # Izrecno odklepanje: otrok, ustvarjen med stiskanjem, ima kopijo deskriptorja in bi zaklep sicer držal
+            if fcntl is not None:
+                fcntl.flock(compact_lock_fd, fcntl.LOCK_UN)
+            os.close(compact_lock_fd)
+            with self._lock:
+                self._compacting = False
+
+    def _write_snapshot(self, users, next_generation):
+        """Zapiše posnetek v začasno datoteko in vrne njeno pot (glej _install_snapshot)."""
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, next_generation))
+            for user_id, embeddings_list in users.items():
+                f.write(encode_record(OP_REGISTER, user_id, embeddings_list))
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        return tmp_path
+
+    def _install_snapshot(self, tmp_path):
+        """Atomarno zamenja posnetek z zapisano začasno datoteko (kliče se pod zaklepom datoteke)."""
+        os.replace(tmp_path, self.snapshot_path)
+        self._fsync_dir()
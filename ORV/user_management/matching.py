@@ -0,0 +1,37 @@
+import numpy as np
+
+
+def normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def group_by_dim(embeddings_list):
+    """Seznam embeddingov -> slovar dim -> strnjena float32 matrika (n, dim)."""
+    by_dim = {}
+    for embedding in embeddings_list:
+        embedding = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        by_dim.setdefault(embedding.shape[0], []).append(embedding)
+    return {dim: np.stack(embeddings) for dim, embeddings in by_dim.items()}
+
+
+def template_matrices(embeddings_list):
+    """
+    Templati uporabnika, pripravljeni za primerjavo: po ena L2-normalizirana
+    matrika (n, dim) za vsako dimenzijo (v shrambi so lahko embeddingi različnih modelov).
+    """
+    return {dim: normalize_rows(matrix) for dim, matrix in group_by_dim(embeddings_list).items()}
+
+
+def best_template_scores(templates, queries):
+    """
+    Kosinusna podobnost vsake poizvedbe z najbližjim templatom, z enim matričnim množenjem.
+    :param templates: (n, dim) L2-normalizirana matrika templatov (glej template_matrices).
+    :param queries: (q, dim) ali (dim,) poizvedbe; normalizirati jih ni treba.
+    :return: (podobnosti oblike (q,), indeksi najbližjih templatov oblike (q,))
+    """
+    queries = normalize_rows(np.asarray(queries, dtype=np.float32).reshape(-1, templates.shape[1]))
+    scores = queries @ templates.T
+    best = scores.argmax(axis=1)
+    return scores[np.arange(len(best)), best], best
@@ -0,0 +1,591 @@
+import json
+import os
+import re
+import threading
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from user_management.matching import normalize_rows
+from user_management.store import EmbeddingStore
+
+try:
+    import fcntl
+except ImportError:  # Windows: brez zaklepanja med procesi
+    fcntl = None
+
+CURRENT_NAME = "CURRENT"
+LOCK_NAME = "matrix.lock"
+COMPACT_LOCK_NAME = "matrix.compact.lock"
+INITIAL_CAPACITY = 1024  # Vrstic na dimenzijo ob ustvarjanju; kapaciteta se nato podvaja
+DEFAULT_COMPACT_MIN_ROWS = 4096
+TEMPLATES_PATTERN = re.compile(r"^templates\.(\d{8})\.d(\d+)\.npy$")
+
+
+class TemplateRows:
+    """
+    Templati enega uporabnika kot pogledi v skupne matrike (brez kopij).
+
+    Obnaša se kot seznam embeddingov (len, indeksiranje, iteracija), vrstice pa
+    so zgolj pogledi v memmap, zato template v pomnilniku zasede točno dim * 4
+    bajte (512 B pri 128-d) v straneh, ki si jih delijo vsi procesi. Vrstice so
+    že L2-normalizirane, zato jih verifikacija in 1:N indeks uporabita neposredno.
+    """
+
+    __slots__ = ("_segments",)
+
+    def __init__(self, segments):
+        self._segments = segments  # [(matrika, začetna vrstica, število vrstic)]
+
+    @property
+    def segments(self):
+        return self._segments
+
+    def matrices(self):
+        """{dim: pogled (n, dim) v skupno matriko} - templati za primerjavo brez kopiranja."""
+        by_dim = {}
+        for matrix, start, count in self._segments:
+            by_dim.setdefault(matrix.shape[1], []).append(matrix[start:start + count])
+        return {dim: views[0] if len(views) == 1 else np.concatenate(views) for dim, views in by_dim.items()}
+
+    def __len__(self):
+        return sum(count for _, _, count in self._segments)
+
+    def __iter__(self):
+        for matrix, start, count in self._segments:
+            yield from matrix[start:start + count]
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        for matrix, start, count in self._segments:
+            if 0 <= i < count:
+                return matrix[start + i]
+            i -= count
+        raise IndexError("template index out of range")
+
+
+class MatrixStore(EmbeddingStore):
+    """
+    Shramba kot strnjene float32 matrike (.npy, memmap), po ena za vsako dimenzijo.
+
+    Generacija shrambe so tri vrste datotek:
+    - templates.<gen>.d<dim>.npy: matrika (kapaciteta, dim) vseh templatov te dimenzije, L2-normaliziranih,
+    - index.<gen>.jsonl: indeks user_id -> razponi vrstic, kot dnevnik sprememb
+      (vrstica {"u": ..., "r": [[dim, začetek, število], ...]} ali {"u": ..., "d": 1}),
+    - tombstones.<gen>.d<dim>.npy: bitna maska izbrisanih/zamenjanih vrstic.
+    Datoteka CURRENT pove, katera generacija velja. Templati se shranijo
+    L2-normalizirani: ujemanje je kosinusna podobnost, ki je za normirane in
+    izvirne vrstice enaka, normiranih pa ni treba računati ob vsakem branju.
+
+    Registracija doda vrstice na konec matrike, nato zapis v indeks (ta je
+    točka potrditve) in šele nato označi stare vrstice v bitni maski; bitna
+    maska se ob nalaganju preveri proti indeksu. Nalaganje prebere samo indeks,
+    matrike pa preslika (mmap), zato je skoraj takojšnje, strani pa si delijo
+    vsi gunicorn delavci prek page cache.
+
+    Ko je mrtvih vrstic več kot živih (in vsaj compact_min_rows), nit v
+    ozadju prepiše žive template v novo generacijo brez zaklepa shrambe; pisci
+    medtem dodajajo v staro. Šele na koncu pod zaklepom v novo generacijo
+    prenese zapise, dodane med kopiranjem, in atomarno zamenja CURRENT.
+
+    Indeks je tudi zaporedje sprememb za ostale delavce: vsak uporabnik, ki ga
+    zapis v indeksu spremeni, se zabeleži, `poll_changes` pa vrne njegovo
+    trenutno stanje. Po novi generaciji (stiskanje, clear) so vse vrstice na
+    novih mestih, zato `poll_changes` vrne None in db shrambo naloži na novo
+    (spet samo pogledi, brez kopij).
+    """
+
+    name = "matrix"
+    random_access = True
+    tracks_changes = True
+
+    def __init__(self, directory, import_from=None, fsync=True, compact_min_rows=DEFAULT_COMPACT_MIN_ROWS):
+        """
+        :param import_from: funkcija, ki vrne slovar user_id -> embeddingi; uporabi se ob
+                            prvem zagonu (prenos iz prejšnje shrambe).
+        """
+        self.directory = directory
+        self.import_from = import_from
+        self.fsync = fsync
+        self.compact_min_rows = int(compact_min_rows)
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._lock_fd = None
+        self._lock_pid = None
+        self._generation = None
+        self._index_fd = None
+        self._index_offset = 0
+        self._users = {}  # user_id -> [(dim, začetek, število)]
+        self._num_embeddings = 0  # Živi templati v _users (brez prehoda po uporabnikih)
+        self._sizes = {}  # dim -> število uporabljenih vrstic
+        self._dead = {}  # dim -> število mrtvih vrstic
+        self._write_maps = {}  # dim -> memmap (r+) za pisanje
+        self._read_maps = {}  # dim -> memmap (r) za poglede, ki jih dobi db
+        self._tombstones = {}  # dim -> memmap uint8 (r+)
+        self._inodes = {}  # dim -> inode odprte matrike (drug proces jo lahko poveča)
+        self._changed = set()  # Uporabniki, spremenjeni od zadnjega poll_changes
+        self._compacting = False
+        self._polled_generation = None  # Generacija, ki jo pozna db (poll_changes)
+
+    # --- Poti in zaklepanje ---
+
+    def _templates_path(self, dim, generation=None):
+        gen = self._generation if generation is None else generation
+        return os.path.join(self.directory, f"templates.{gen:08d}.d{dim}.npy")
+
+    def _tombstones_path(self, dim, generation=None):
+        gen = self._generation if generation is None else generation
+        return os.path.join(self.directory, f"tombstones.{gen:08d}.d{dim}.npy")
+
+    def _index_path(self, generation=None):
+        gen = self._generation if generation is None else generation
+        return os.path.join(self.directory, f"index.{gen:08d}.jsonl")
+
+    def _flock(self, operation):
+        # flock velja za odprto datoteko, ki si jo proces po fork-u deli s staršem; vsak proces odpre svojo
+        if self._lock_pid != os.getpid():
+            self._lock_fd = os.open(os.path.join(self.directory, LOCK_NAME), os.O_RDWR | os.O_CREAT, 0o644)
+            self._lock_pid = os.getpid()
+        fcntl.flock(self._lock_fd, operation)
+
+    def _lock_exclusive(self):
+        if fcntl is not None:
+            self._flock(fcntl.LOCK_EX)
+
+    def _lock_shared(self):
+        """Za branje sprememb: izključi pisce (dodajanje, stiskanje), ne pa drugih bralcev."""
+        if fcntl is not None:
+            self._flock(fcntl.LOCK_SH)
+
+    def _unlock(self):
+        if fcntl is not None:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _read_current(self):
+        path = os.path.join(self.directory, CURRENT_NAME)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return int(f.read().strip())
+
+    def _write_current(self, generation):
+        path = os.path.join(self.directory, CURRENT_NAME)
+        with open(path + ".tmp", "w") as f:
+            f.write(f"{generation}\n")
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        if self.fsync and hasattr(os, "O_DIRECTORY"):
+            dir_fd = os.open(self.directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+    # --- Nalaganje ---
+
+    def load(self):
+        with self._lock:
+            self._open_current()
+            return {user_id: self._rows(user_id) for user_id in self._users}
+
+    def user_ids(self):
+        # Samo indeks; matrike ostanejo na disku, dokler jih ne preberemo z get
+        with self._lock:
+            self._open_current()
+            return list(self._users)
+
+    def _open_current(self):
+        """Odpre generacijo iz CURRENT (ob prvem zagonu jo ustvari); kliče se pod self._lock."""
+        self._lock_exclusive()
+        try:
+            generation = self._read_current()
+            if generation is None:
+                users = self.import_from() if self.import_from else {}
+                self._write_generation(1, users)
+                if users:
+                    print(f"Imported {len(users)} users into {self.directory}")
+                generation = 1
+            self._open_generation(generation, repair=True)
+        finally:
+            self._unlock()
+        self._changed = set()
+        self._polled_generation = self._generation
+
+    def _open_generation(self, generation, repair=False):
+        self._close_files()
+        self._generation = generation
+        self._users, self._sizes, self._dead = {}, {}, {}
+        self._num_embeddings = 0
+        self._index_offset = 0
+        self._catch_up_index(repair=repair)
+        self._index_fd = os.open(self._index_path(), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+        for filename in os.listdir(self.directory):
+            match = TEMPLATES_PATTERN.match(filename)
+            if match and int(match.group(1)) == generation:
+                self._open_maps(int(match.group(2)))
+        if repair:
+            self._check_tombstones()
+
+    def _open_maps(self, dim):
+        path = self._templates_path(dim)
+        self._write_maps[dim] = np.load(path, mmap_mode="r+")
+        self._read_maps[dim] = np.asarray(np.load(path, mmap_mode="r"))  # Navaden ndarray pogled, samo za branje
+        self._tombstones[dim] = np.load(self._tombstones_path(dim), mmap_mode="r+")
+        self._inodes[dim] = os.stat(path).st_ino
+        self._sizes.setdefault(dim, 0)
+        self._dead.setdefault(dim, 0)
+
+    def _close_files(self):
+        if self._index_fd is not None:
+            os.close(self._index_fd)
+            self._index_fd = None
+        # Memmapi se zaprejo, ko nanje ne kaže nič več (pogledi v db ostanejo veljavni)
+        self._write_maps, self._read_maps, self._tombstones, self._inodes = {}, {}, {}, {}
+
+    def _catch_up_index(self, repair=False):
+        """Prebere zapise indeksa od zadnjega branja naprej (tudi zapise drugih procesov)."""
+        path = self._index_path()
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as f:
+            f.seek(self._index_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Nepopoln zapis na koncu (prekinjeno pisanje)
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                self._apply(record)
+                self._index_offset += len(line)
+            file_size = os.fstat(f.fileno()).st_size
+        if repair and self._index_offset < file_size:
+            print(f"Warning: truncating incomplete record at the end of {path}.")
+            with open(path, "r+b") as f:
+                f.truncate(self._index_offset)
+
+    def _apply(self, record):
+        user_id = record["u"]
+        self._changed.add(user_id)
+        for dim, _, count in self._users.pop(user_id, ()):
+            self._dead[dim] = self._dead.get(dim, 0) + count
+            self._num_embeddings -= count
+        if "r" in record:
+            segments = [tuple(segment) for segment in record["r"]]
+            self._users[user_id] = segments
+            for dim, start, count in segments:
+                self._sizes[dim] = max(self._sizes.get(dim, 0), start + count)
+                self._num_embeddings += count
+
+    def _check_tombstones(self):
+        """Bitno masko uskladi z indeksom (zapis v masko je zadnji korak, lahko je bil prekinjen)."""
+        for dim, tombstones in self._tombstones.items():
+            live = np.zeros(len(tombstones) * 8, dtype=bool)
+            for segments in self._users.values():
+                for seg_dim, start, count in segments:
+                    if seg_dim == dim:
+                        live[start:start + count] = True
+            expected = np.packbits(~live, bitorder="little")
+            expected[np.arange(len(expected)) * 8 >= self._sizes.get(dim, 0)] = 0
+            if not np.array_equal(expected, tombstones):
+                tombstones[:] = expected
+                tombstones.flush()
+            self._dead[dim] = int(self._sizes.get(dim, 0) - live[:self._sizes.get(dim, 0)].sum())
+
+    def _sync_with_disk(self):
+        """Pred pisanjem (pod zaklepom) prevzame spremembe drugih procesov: nova generacija, zapisi, večje matrike."""
+        generation = self._read_current()
+        if generation != self._generation:
+            self._open_generation(generation)
+            return
+        self._catch_up_index()
+        for dim in self._sizes:
+            path = self._templates_path(dim)
+            if os.path.exists(path) and self._inodes.get(dim) != os.stat(path).st_ino:
+                self._open_maps(dim)
+
+    def _rows(self, user_id):
+        return TemplateRows([(self._read_maps[dim], start, count) for dim, start, count in self._users[user_id]])
+
+    # --- Pisanje ---
+
+    def _ensure_capacity(self, dim, rows_needed):
+        matrix = self._write_maps.get(dim)
+        if matrix is not None and len(matrix) >= rows_needed:
+            return
+        capacity = max(INITIAL_CAPACITY, rows_needed, 2 * len(matrix) if matrix is not None else 0)
+        capacity = -(-capacity // 8) * 8  # Cela bajta bitne maske
+        used = self._sizes.get(dim, 0)
+
+        # Večjo matriko napišemo ob strani in jo atomarno zamenjamo; obstoječi pogledi ostanejo veljavni
+        for path, shape, dtype, old in (
+                (self._templates_path(dim), (capacity, dim), np.float32, matrix),
+                (self._tombstones_path(dim), (capacity // 8,), np.uint8, self._tombstones.get(dim))):
+            grown = open_memmap(path + ".tmp", mode="w+", dtype=dtype, shape=shape)
+            if old is not None:
+                grown[:len(old)] = old
+            grown.flush()
+            del grown
+            os.replace(path + ".tmp", path)
+        self._open_maps(dim)
+        self._sizes[dim] = used
+
+    def _append_index(self, record):
+        os.write(self._index_fd, (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8"))
+        if self.fsync:
+            os.fsync(self._index_fd)
+        self._index_offset = os.fstat(self._index_fd).st_size
+        self._apply(record)
+
+    def _mark_dead(self, segments):
+        for dim, start, count in segments:
+            rows = np.arange(start, start + count)
+            tombstones = self._tombstones[dim]
+            np.bitwise_or.at(tombstones, rows >> 3, (1 << (rows & 7)).astype(np.uint8))
+            if self.fsync:
+                tombstones.flush()
+
+    def _write_user(self, user_id, embeddings_list):
+        """Doda templata uporabnika na konec matrik trenutne generacije (pod obema zaklepoma)."""
+        by_dim = {}
+        for embedding in embeddings_list:
+            embedding = np.asarray(embedding, dtype=np.float32).reshape(-1)
+            by_dim.setdefault(embedding.shape[0], []).append(embedding)
+        segments = []
+        for dim, rows in by_dim.items():
+            start = self._sizes.get(dim, 0)
+            self._ensure_capacity(dim, start + len(rows))
+            self._write_maps[dim][start:start + len(rows)] = normalize_rows(np.stack(rows))
+            if self.fsync:
+                self._write_maps[dim].flush()
+            segments.append([dim, start, len(rows)])
+        old_segments = self._users.get(user_id, [])
+        self._append_index({"u": user_id, "r": segments})
+        self._mark_dead(old_segments)
+
+    def _delete_user(self, user_id):
+        old_segments = self._users.get(user_id)
+        if old_segments is None:
+            return False
+        self._append_index({"u": user_id, "d": 1})
+        self._mark_dead(old_segments)
+        return True
+
+    def put(self, user_id, embeddings_list):
+        with self._lock:
+            self._lock_exclusive()
+            try:
+                self._sync_with_disk()
+                self._write_user(user_id, embeddings_list)
+                self._maybe_compact()
+            finally:
+                self._unlock()
+
+    def delete(self, user_id):
+        with self._lock:
+            self._lock_exclusive()
+            try:
+                self._sync_with_disk()
+                deleted = self._delete_user(user_id)
+                if deleted:
+                    self._maybe_compact()
+                return deleted
+            finally:
+                self._unlock()
+
+    def clear(self):
+        # Stiskanje (tudi v drugem procesu) ne sme hkrati pisati naslednje generacije
+        compact_lock_fd = self._compact_lock(blocking=True)
+        try:
+            with self._lock:
+                self._lock_exclusive()
+                try:
+                    old_generation = self._read_current() or self._generation or 0
+                    self._write_generation(old_generation + 1, {})
+                    self._open_generation(old_generation + 1)
+                    self._remove_generation(old_generation)
+                finally:
+                    self._unlock()
+        finally:
+            self._compact_unlock(compact_lock_fd)
+
+    def get(self, user_id):
+        with self._lock:
+            return self._rows(user_id) if user_id in self._users else []
+
+    def contains(self, user_id):
+        return user_id in self._users
+
+    def count(self):
+        with self._lock:
+            return len(self._users), self._num_embeddings
+
+    def poll_changes(self):
+        with self._lock:
+            if self._generation is None:
+                return None
+            self._lock_shared()
+            try:
+                self._sync_with_disk()
+            finally:
+                self._unlock()
+            if self._generation != self._polled_generation:
+                self._polled_generation = self._generation
+                self._changed = set()
+                return None
+            changed, self._changed = self._changed, set()
+            return {user_id: self._rows(user_id) if user_id in self._users else None for user_id in changed}
+
+    def describe(self):
+        return f"{self.directory} (generation {self._generation})"
+
+    def close(self):
+        with self._lock:
+            self._close_files()
+
+    def reset_after_fork(self):
+        self._lock = threading.Lock()
+        self._compacting = False  # Nit stiskanja starša v otroku ne teče
+
+    # --- Generacije in stiskanje ---
+
+    def _write_generation(self, generation, users, make_current=True):
+        """Zapiše celotno generacijo (strnjene matrike brez mrtvih vrstic) in jo (privzeto) nastavi kot trenutno."""
+        # Ostanki prekinjenega stiskanja z isto številko ne smejo priti v novo generacijo
+        self._remove_generation(generation)
+        rows_by_dim, records = {}, []
+        for user_id, embeddings_list in users.items():
+            segments = {}
+            for embedding in embeddings_list:
+                embedding = np.asarray(embedding, dtype=np.float32).reshape(-1)
+                dim = embedding.shape[0]
+                rows = rows_by_dim.setdefault(dim, [])
+                if dim not in segments:
+                    segments[dim] = [dim, len(rows), 0]
+                rows.append(embedding)
+                segments[dim][2] += 1
+            records.append({"u": user_id, "r": list(segments.values())})
+
+        for dim, rows in rows_by_dim.items():
+            capacity = -(-max(INITIAL_CAPACITY, len(rows)) // 8) * 8
+            matrix = open_memmap(self._templates_path(dim, generation), mode="w+", dtype=np.float32,
+                                 shape=(capacity, dim))
+            matrix[:len(rows)] = normalize_rows(np.stack(rows))
+            matrix.flush()
+            tombstones = open_memmap(self._tombstones_path(dim, generation), mode="w+", dtype=np.uint8,
+                                     shape=(capacity // 8,))
+            tombstones.flush()
+            del matrix, tombstones
+
+        with open(self._index_path(generation), "w") as f:
+            for record in records:
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        if make_current:
+            self._write_current(generation)
+
+    def _remove_generation(self, generation):
+        suffix = f".{generation:08d}."
+        for filename in os.listdir(self.directory):
+            if suffix in filename and filename.split(suffix)[0] in ("templates", "tombstones", "index"):
+                os.remove(os.path.join(self.directory, filename))
+
+    def _compact_lock(self, blocking):
+        """Odpre in zaklene datoteko stiskanja; vrne deskriptor ali None, če stiskanje že teče drugje."""
+        fd = os.open(os.path.join(self.directory, COMPACT_LOCK_NAME), os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                return None
+        return fd
+
+    @staticmethod
+    def _compact_unlock(fd):
+        # Izrecno odklepanje: otrok, ustvarjen med stiskanjem, ima kopijo deskriptorja in bi zaklep sicer držal
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    def _maybe_compact(self):
+        """Kliče se pod self._lock. Zažene stiskanje v ozadju, ko je mrtvih vrstic več kot živih."""
+        if self._compacting:
+            return
+        dead = sum(self._dead.values())
+        if dead < max(self.compact_min_rows, self._num_embeddings):
+            return
+        self._compacting = True
+        threading.Thread(target=self.compact, name="matrix-store-compaction", daemon=True).start()
+
+    def _index_users_since(self, generation, offset):
+        """user_id vseh zapisov v indeksu generacije od odmika naprej."""
+        with open(self._index_path(generation), "rb") as f:
+            f.seek(offset)
+            return {json.loads(line)["u"] for line in f if line.endswith(b"\n")}
+
+    def compact(self):
+        """Prepiše žive template v novo generacijo (blokira; običajno teče v ozadju)."""
+        compact_lock_fd = self._compact_lock(blocking=False)
+        if compact_lock_fd is None:
+            with self._lock:
+                self._compacting = False
+            return  # Stiskanje že teče v drugem procesu
+        try:
+            # 1. Kratko pod zaklepom: trenutno stanje (pogledi v matrike, brez kopij) in mesto v indeksu
+            with self._lock:
+                self._lock_shared()
+                try:
+                    self._sync_with_disk()
+                    old_generation, index_offset = self._generation, self._index_offset
+                    users = {user_id: list(self._rows(user_id)) for user_id in self._users}
+                    dead = sum(self._dead.values())
+                finally:
+                    self._unlock()
+
+            # 2. Brez zaklepa: kopiranje v novo generacijo; pisci dodajajo vrstice na konec stare, obstoječih
+            #    vrstic ne spreminjajo (povečana matrika je nova datoteka, naši pogledi ostanejo veljavni)
+            new_generation = old_generation + 1
+            self._write_generation(new_generation, users, make_current=False)
+            del users
+
+            # 3. Pod zaklepom: zapisi, dodani med kopiranjem, gredo še v novo generacijo, nato zamenjava CURRENT
+            with self._lock:
+                self._lock_exclusive()
+                try:
+                    self._sync_with_disk()
+                    if self._generation != old_generation:
+                        self._remove_generation(new_generation)
+                        return  # Vmes je bila shramba pobrisana (clear)
+                    changed = self._index_users_since(old_generation, index_offset)
+                    latest = {user_id: list(self._rows(user_id)) if user_id in self._users else None
+                              for user_id in changed}
+                    try:
+                        self._open_generation(new_generation)
+                        for user_id, rows in latest.items():
+                            if rows is None:
+                                self._delete_user(user_id)
+                            else:
+                                self._write_user(user_id, rows)
+                        self._write_current(new_generation)
+                    except BaseException:
+                        self._open_generation(old_generation)
+                        raise
+                    # Drugi procesi imajo stare datoteke morda še preslikane; na Linuxu ostanejo veljavne do zaprtja
+                    self._remove_generation(old_generation)
+                finally:
+                    self._unlock()
+            print(f"Compacted embedding matrices into generation {new_generation} ({dead} dead rows removed)")
+        except Exception as e:
+            print(f"Error compacting embedding matrices: {e}")
+        finally:
+            self._compact_unlock(compact_lock_fd)
+            with self._lock:
+                self._compacting = False
@@ -0,0 +1,101 @@
+import os
+import threading
+import time
+from collections import deque
+
+
+class PersistQueue:
+    """
+    Zapisovanje sprememb v trajno shrambo v ozadju, izven niti zahtevka.
+
+    Opravila (register/delete zapisi) izvaja ena nit v vrstnem redu, v katerem
+    so bila oddana, zato shramba vidi spremembe v istem zaporedju kot stanje v
+    pomnilniku. `flush` počaka, da so zapisana vsa do tedaj oddana opravila
+    (ob izklopu in pred ponovnim nalaganjem).
+    """
+
+    def __init__(self, name="store-persist"):
+        self.name = name
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._busy = False
+        self._stopped = False
+
+        # Statistika (zaščitena s self._cond)
+        self._written_total = 0
+        self._max_lag_s = 0.0
+
+        self._start_worker()
+
+        # Niti ne preživijo fork-a: v pre-fork strežniku (serve.py) je treba delavca znova zagnati
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._restart_after_fork)
+
+    def _start_worker(self):
+        self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._worker.start()
+
+    def _restart_after_fork(self):
+        # Opravila starša zapiše starš; otrok začne s prazno vrsto
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._busy = False
+        if not self._stopped:
+            self._start_worker()
+
+    def submit(self, fn, *args):
+        """Doda opravilo fn(*args) na konec vrste."""
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError(f"PersistQueue '{self.name}' je ustavljen.")
+            self._queue.append((fn, args, time.perf_counter()))
+            self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """Počaka, da so vsa oddana opravila zapisana. Vrne False, če je potekel timeout."""
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        with self._cond:
+            while self._queue or self._busy:
+                remaining = None if deadline is None else deadline - time.perf_counter()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def stop(self, timeout=5.0):
+        self.flush(timeout)
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._worker.join(timeout=1.0)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._stopped:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                fn, args, submitted = self._queue.popleft()
+                self._busy = True
+
+            try:
+                fn(*args)
+            except Exception as e:
+                # Opravila sama izpišejo napake shrambe; sem pridejo samo nepričakovane
+                print(f"Error in background persistence: {e}")
+
+            with self._cond:
+                self._busy = False
+                self._written_total += 1
+                self._max_lag_s = max(self._max_lag_s, time.perf_counter() - submitted)
+                self._cond.notify_all()
+
+    def get_stats(self):
+        with self._cond:
+            return {
+                "name": self.name,
+                "pending": len(self._queue) + int(self._busy),
+                "written_total": self._written_total,
+                "max_lag_ms": self._max_lag_s * 1000.0,
+            }
@@ -0,0 +1,226 @@
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+from user_management.store import EmbeddingStore
+
+DB_NAME = "user_embeddings.sqlite3"
+BUSY_TIMEOUT_MS = 5000  # Koliko časa pisec počaka na zaklep baze, ki ga drži drug proces
+CHANGES_KEEP = 10000  # Koliko zadnjih zapisov v user_changes obdržimo za bralce, ki zaostajajo
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_embeddings (
+    user_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    dim INTEGER NOT NULL,
+    embedding BLOB NOT NULL,
+    PRIMARY KEY (user_id, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS user_changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS store_counts (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    users INTEGER NOT NULL,
+    embeddings INTEGER NOT NULL
+);
+"""
+
+
+class SqliteStore(EmbeddingStore):
+    """
+    Shramba v SQLite bazi v načinu WAL: ena vrstica na template, embedding kot
+    float32 BLOB, primarni ključ (user_id, position).
+
+    Tabela je organizirana po primarnem ključu (WITHOUT ROWID), zato so
+    templati uporabnika skupaj in jih prebere ena indeksirana poizvedba. Zapis
+    uporabnika (izbris starih + vstavljanje novih vrstic) je ena transakcija.
+    WAL omogoča, da vsi API delavci berejo hkrati, medtem ko eden piše.
+
+    Shramba je "lena" (lazy = True): ob zagonu se ne naloži v pomnilnik,
+    user_management.db bere posamezne uporabnike neposredno iz baze.
+
+    Vsak zapis v isti transakciji doda vrstico v user_changes; njen
+    naraščajoči seq je zaporedna številka spremembe, po kateri ostali delavci
+    (poll_changes) najdejo spremenjene uporabnike.
+
+    Število uporabnikov in embeddingov je v tabeli store_counts (ena vrstica),
+    ki jo zapis popravi v isti transakciji, zato count ne pregleduje baze.
+    Vrstica nastane ob inicializaciji baze in je hkrati oznaka, da je uvoz iz
+    prejšnje shrambe že opravljen.
+    """
+
+    name = "sqlite"
+    lazy = True
+    random_access = True
+    tracks_changes = True
+
+    def __init__(self, path, import_from=None, fsync=True):
+        """
+        :param import_from: funkcija, ki vrne slovar user_id -> embeddingi; uporabi se, ko
+                            baza še ni inicializirana (prenos iz prejšnje shrambe).
+        """
+        self.path = path
+        self.import_from = import_from
+        self.fsync = fsync
+        self._local = threading.local()
+        self._change_seq = 0  # Zadnja sprememba, ki jo je ta proces že videl
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        self._initialize(conn)
+        self._change_seq = self._last_change_seq(conn)
+
+    def _initialize(self, conn):
+        """
+        Ob prvem zagonu uvozi prejšnjo shrambo in zapiše števce. Vse je ena transakcija IMMEDIATE, zato več
+        delavcev, ki se zaženejo hkrati, uvozi le enkrat (ostali počakajo in najdejo vrstico v store_counts).
+        """
+        if conn.execute("SELECT 1 FROM store_counts WHERE id = 1").fetchone() is not None:
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM store_counts WHERE id = 1").fetchone() is None:
+                users = self.import_from() if self.import_from is not None else {}
+                for user_id, embeddings_list in users.items():
+                    self._insert(conn, user_id, embeddings_list)
+                conn.execute("INSERT INTO store_counts (id, users, embeddings) "
+                             "SELECT 1, COUNT(DISTINCT user_id), COUNT(*) FROM user_embeddings")
+                if users:
+                    print(f"Imported {len(users)} users into {self.path}")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _conn(self):
+        """Povezava za trenutno nit; po fork-u (gunicorn) vsak proces odpre svojo."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            # isolation_level=None: transakcije vodimo sami (BEGIN IMMEDIATE pri zapisu)
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={'FULL' if self.fsync else 'NORMAL'}")
+            conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _adjust_counts(conn, users, embeddings):
+        conn.execute("UPDATE store_counts SET users = users + ?, embeddings = embeddings + ? WHERE id = 1",
+                     (users, embeddings))
+
+    @staticmethod
+    def _insert(conn, user_id, embeddings_list):
+        rows = []
+        for position, embedding in enumerate(embeddings_list):
+            embedding = np.asarray(embedding, dtype=np.float32).reshape(-1)
+            rows.append((user_id, position, embedding.shape[0], embedding.tobytes()))
+        conn.executemany("INSERT INTO user_embeddings (user_id, position, dim, embedding) VALUES (?, ?, ?, ?)",
+                         rows)
+
+    @staticmethod
+    def _record_change(conn, user_id):
+        cursor = conn.execute("INSERT INTO user_changes (user_id) VALUES (?)", (user_id,))
+        # Stare spremembe sproti brišemo (seq je primarni ključ, zato je to poceni)
+        conn.execute("DELETE FROM user_changes WHERE seq <= ?", (cursor.lastrowid - CHANGES_KEEP,))
+
+    @staticmethod
+    def _last_change_seq(conn):
+        return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM user_changes").fetchone()[0]
+
+    def load(self):
+        users = {}
+        for user_id, dim, blob in self._conn().execute(
+                "SELECT user_id, dim, embedding FROM user_embeddings ORDER BY user_id, position"):
+            users.setdefault(user_id, []).append(np.frombuffer(blob, dtype=np.float32, count=dim))
+        return users
+
+    def get(self, user_id):
+        return [
+            np.frombuffer(blob, dtype=np.float32, count=dim)
+            for dim, blob in self._conn().execute(
+                "SELECT dim, embedding FROM user_embeddings WHERE user_id = ? ORDER BY position", (user_id,))
+        ]
+
+    def contains(self, user_id):
+        return self._conn().execute(
+            "SELECT 1 FROM user_embeddings WHERE user_id = ? LIMIT 1", (user_id,)).fetchone() is not None
+
+    def user_ids(self):
+        # Bere samo primarni ključ (user_id je njegov prvi stolpec), BLOB-i ostanejo na disku
+        return [row[0] for row in self._conn().execute("SELECT DISTINCT user_id FROM user_embeddings")]
+
+    def count(self):
+        users, embeddings = self._conn().execute(
+            "SELECT users, embeddings FROM store_counts WHERE id = 1").fetchone()
+        return users, embeddings
+
+    def put(self, user_id, embeddings_list):
+        conn = self._conn()
+        # IMMEDIATE: zaklep za pisanje vzamemo takoj, da se dva pisca ne zatakneta sredi transakcije
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            removed = conn.execute("DELETE FROM user_embeddings WHERE user_id = ?", (user_id,)).rowcount
+            self._insert(conn, user_id, embeddings_list)
+            self._adjust_counts(conn, int(len(embeddings_list) > 0) - int(removed > 0), len(embeddings_list) - removed)
+            self._record_change(conn, user_id)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete(self, user_id):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            removed = conn.execute("DELETE FROM user_embeddings WHERE user_id = ?", (user_id,)).rowcount
+            deleted = removed > 0
+            if deleted:
+                self._adjust_counts(conn, -1, -removed)
+                self._record_change(conn, user_id)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return deleted
+
+    def clear(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("INSERT INTO user_changes (user_id) SELECT DISTINCT user_id FROM user_embeddings")
+            conn.execute("DELETE FROM user_embeddings")
+            conn.execute("UPDATE store_counts SET users = 0, embeddings = 0 WHERE id = 1")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def poll_changes(self):
+        conn = self._conn()
+        rows = conn.execute("SELECT seq, user_id FROM user_changes WHERE seq > ? ORDER BY seq",
+                            (self._change_seq,)).fetchall()
+        if not rows:
+            return {}
+        if rows[0][0] > self._change_seq + 1:
+            # Vmesne spremembe so že pobrisane (CHANGES_KEEP), zato jih ne znamo našteti
+            self._change_seq = rows[-1][0]
+            return None
+        self._change_seq = rows[-1][0]
+        return {user_id: self.get(user_id) or None for user_id in {user_id for _, user_id in rows}}
+
+    def describe(self):
+        return self.path
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            conn.close()
+        self._local.conn = None
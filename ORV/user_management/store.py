@@ -0,0 +1,187 @@
+import json
+import os
+
+import numpy as np
+
+
+class ReadOnlyStoreError(RuntimeError):
+    """Zapis v shrambo, ki je odprta samo za branje (npr. sledilec replikacije)."""
+
+
+class EmbeddingStore:
+    """
+    Trajna shramba embeddingov uporabnikov.
+
+    user_management.db drži celotno stanje (user_id -> seznam embeddingov) v
+    pomnilniku; shramba ga ob zagonu naloži (`load`) in nato zapisuje samo
+    posamezne spremembe (`put`, `delete`).
+
+    "Lena" shramba (lazy = True) se ob zagonu ne naloži; db tedaj bere
+    posamezne uporabnike z `get`/`contains`, `load` pa uporabi le za 1:N indeks.
+
+    Shramba z random_access = True zna brati posamezne uporabnike in seznam
+    user_id brez nalaganja vseh embeddingov (pogoj za stopenjsko nalaganje v db).
+    """
+
+    name = "base"
+    lazy = False
+    random_access = False
+    tracks_changes = False  # Ali zna našteti spremembe drugih procesov (poll_changes)
+    read_only = False
+
+    def load(self):
+        """Vrne slovar user_id -> seznam float32 NumPy arrayev."""
+        raise NotImplementedError
+
+    def put(self, user_id, embeddings_list):
+        """Shrani (ali zamenja) embeddinge uporabnika."""
+        raise NotImplementedError
+
+    def delete(self, user_id):
+        raise NotImplementedError
+
+    def get(self, user_id):
+        """Embeddingi enega uporabnika (samo shrambe z random_access)."""
+        raise NotImplementedError
+
+    def contains(self, user_id):
+        raise NotImplementedError
+
+    def count(self):
+        """(število uporabnikov, število embeddingov) (samo shrambe z random_access)."""
+        raise NotImplementedError
+
+    def user_ids(self):
+        """Seznam vseh user_id brez branja embeddingov (samo shrambe z random_access)."""
+        raise NotImplementedError
+
+    def clear(self):
+        """Pobriše vse uporabnike (za teste in čist začetek)."""
+        raise NotImplementedError
+
+    def poll_changes(self):
+        """
+        Spremembe v shrambi od `load` oz. prejšnjega klica, tudi tiste iz drugih
+        procesov: slovar user_id -> embeddingi (None = izbrisan). Vrne None, če
+        sprememb ni več mogoče našteti (zgodovina je bila stisnjena ali
+        pobrisana) in je treba stanje naložiti na novo.
+        """
+        raise NotImplementedError
+
+    def describe(self):
+        """Kratek opis za izpise ob zagonu (vrsta in lokacija shrambe)."""
+        return self.name
+
+    def close(self):
+        pass
+
+    def reset_after_fork(self):
+        """V otroku po fork-u: zaklepe niti ustvari na novo (ob fork-u jih je morda držala nit starša)."""
+
+
+def read_json_embeddings(path):
+    """Prebere shrambo v starem JSON formatu (user_id -> seznam seznamov števil)."""
+    with open(path, 'r') as f:
+        data_from_file = json.load(f)
+    return {
+        user_id: [np.array(emb, dtype=np.float32) for emb in embeddings_list]
+        for user_id, embeddings_list in data_from_file.items()
+    }
+
+
+class JsonFileStore(EmbeddingStore):
+    """
+    Prvotna shramba: vsi uporabniki v eni JSON datoteki, ki se ob vsaki
+    spremembi zapiše na novo (O(vseh uporabnikov) na zapis). Zapis gre v
+    začasno datoteko, ki nato atomarno zamenja staro, zato prekinjen zapis ne
+    pokvari shrambe.
+    """
+
+    name = "json"
+
+    def __init__(self, path):
+        self.path = path
+        self._users = {}
+
+    def load(self):
+        if os.path.exists(self.path):
+            self._users = read_json_embeddings(self.path)
+        else:
+            print(f"Embeddings file {self.path} not found. Starting with an empty store.")
+            self._users = {}
+        return dict(self._users)
+
+    def put(self, user_id, embeddings_list):
+        self._users[user_id] = embeddings_list
+        self._save()
+
+    def delete(self, user_id):
+        self._users.pop(user_id, None)
+        self._save()
+
+    def clear(self):
+        self._users = {}
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def describe(self):
+        return self.path
+
+    def _save(self):
+        # Pretvorimo NumPy arraye v sezname za JSON serializacijo
+        data_to_save = {
+            user_id: [emb.tolist() for emb in embeddings_list]
+            for user_id, embeddings_list in self._users.items()
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data_to_save, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+
+def _import_previous(data_dir, legacy_json_path):
+    """Uporabniki iz dnevnika ali stare JSON datoteke (za prvi zagon z drugim formatom)."""
+    from user_management.log_store import LOG_NAME_PATTERN, SNAPSHOT_NAME, LogStore
+
+    names = os.listdir(data_dir) if os.path.isdir(data_dir) else []
+    if SNAPSHOT_NAME in names or any(LOG_NAME_PATTERN.match(name) for name in names):
+        log_store = LogStore(data_dir, legacy_json_path=legacy_json_path)
+        try:
+            return log_store.load()
+        finally:
+            log_store.close()
+    if os.path.exists(legacy_json_path):
+        return read_json_embeddings(legacy_json_path)
+    return {}
+
+
+def open_store(backend, data_dir, **options):
+    """
+    Ustvari shrambo izbrane vrste.
+    :param backend: "log" (dnevnik sprememb + posnetek, privzeto; z read_only=True samo za
+                    branje, npr. replikacijski dnevnik na sledilcu), "matrix" (memmap matrike
+                    templatov v data_dir/matrix), "sqlite" (SQLite baza v načinu WAL)
+                    ali "json" (ena JSON datoteka).
+    """
+    legacy_json_path = os.path.join(data_dir, 'user_embeddings.json')
+    if backend == "json":
+        return JsonFileStore(legacy_json_path)
+    if backend == "log":
+        from user_management.log_store import LogStore
+
+        return LogStore(data_dir, legacy_json_path=legacy_json_path, **options)
+    if backend == "matrix":
+        from user_management.matrix_store import MatrixStore
+
+        return MatrixStore(os.path.join(data_dir, 'matrix'),
+                           import_from=lambda: _import_previous(data_dir, legacy_json_path),
+                           fsync=options.get("fsync", True))
+    if backend == "sqlite":
+        from user_management.sqlite_store import DB_NAME, SqliteStore
+
+        return SqliteStore(os.path.join(data_dir, DB_NAME),
+                           import_from=lambda: _import_previous(data_dir, legacy_json_path),
+                           fsync=options.get("fsync", True))
+    raise ValueError(f"Unknown store backend: {backend}")
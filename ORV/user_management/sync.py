@@ -0,0 +1,86 @@
+import os
+import threading
+import time
+
+
+class StoreSync:
+    """
+    Periodično prevzemanje sprememb, ki so jih v skupno shrambo zapisali drugi
+    procesi (gunicorn delavci), v stanje v pomnilniku tega procesa.
+
+    Vsakih `interval_s` sekund pokliče `poll_fn`, ki vrne število vnesenih
+    sprememb ali None, če je bilo treba stanje naložiti na novo. Registracija
+    v enem delavcu je tako v ostalih vidna najkasneje po `interval_s`.
+    """
+
+    def __init__(self, poll_fn, interval_s, name="store-sync"):
+        if interval_s <= 0:
+            raise ValueError("interval_s mora biti pozitiven.")
+        self.poll_fn = poll_fn
+        self.interval_s = float(interval_s)
+        self.name = name
+
+        self._stop = threading.Event()
+        self._poll_lock = threading.Lock()  # Poll iz niti in ročni poll ne smeta teči hkrati
+        self._lock = threading.Lock()
+
+        # Statistika (zaščitena s self._lock)
+        self._polls_total = 0
+        self._changes_total = 0
+        self._reloads_total = 0
+        self._errors_total = 0
+        self._last_poll = None
+
+        self._start_worker()
+
+        # Niti ne preživijo fork-a: v pre-fork strežniku (serve.py) je treba delavca znova zagnati
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._restart_after_fork)
+
+    def _start_worker(self):
+        self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._worker.start()
+
+    def _restart_after_fork(self):
+        self._stop = threading.Event()
+        self._poll_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._start_worker()
+
+    def stop(self):
+        self._stop.set()
+        self._worker.join(timeout=1.0)
+
+    def poll(self):
+        """Ena sinhronizacija (kliče jo nit; za teste in ročno osvežitev tudi neposredno)."""
+        try:
+            with self._poll_lock:
+                applied = self.poll_fn()
+        except Exception as e:
+            print(f"Error syncing store changes: {e}")
+            with self._lock:
+                self._errors_total += 1
+            return
+        with self._lock:
+            self._polls_total += 1
+            self._last_poll = time.monotonic()
+            if applied is None:
+                self._reloads_total += 1
+            else:
+                self._changes_total += applied
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            self.poll()
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "name": self.name,
+                "interval_s": self.interval_s,
+                "polls_total": self._polls_total,
+                "changes_total": self._changes_total,
+                "reloads_total": self._reloads_total,
+                "errors_total": self._errors_total,
+                "last_poll_age_s": (time.monotonic() - self._last_poll) if self._last_poll is not None else None,
+            }
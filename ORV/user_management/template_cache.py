@@ -0,0 +1,110 @@
+import threading
+from collections import OrderedDict
+
+from src.metrics import record_template_cache, set_template_cache_bytes
+
+
+class TemplateCache:
+    """
+    LRU predpomnilnik templatov uporabnikov ({dim: L2-normalizirana matrika})
+    z omejitvijo skupne velikosti v bajtih, za stopenjsko nalaganje velikih
+    galerij: v pomnilniku so samo templati uporabnikov, ki so se nedavno
+    preverjali, ostali se ob prvi verifikaciji preberejo iz shrambe.
+
+    Vnos, ki je sam večji od omejitve, se ne shrani. Vsaka sprememba (put,
+    invalidate, clear) poveča različico; nalaganje, med katerim se je
+    različica spremenila, rezultata ne shrani, da v predpomnilnik ne pride
+    stanje, ki ga je sočasen zapis že zamenjal.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = int(max_bytes)
+        self._entries = OrderedDict()  # user_id -> (templati, velikost v bajtih)
+        self._bytes = 0
+        self._version = 0
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @staticmethod
+    def _size(templates):
+        return sum(matrix.nbytes for matrix in templates.values())
+
+    def get(self, user_id, loader):
+        """Templati uporabnika iz predpomnilnika ali, ob zgrešitvi, loader(user_id) (prazen slovar se ne shrani)."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                self._entries.move_to_end(user_id)
+                self._hits += 1
+            else:
+                self._misses += 1
+            version = self._version
+        record_template_cache(entry is not None)
+        if entry is not None:
+            return entry[0]
+
+        # Branje iz shrambe poteka izven zaklepa, da zgrešitev ne zadrži ostalih bralcev
+        templates = loader(user_id)
+        if templates:
+            with self._lock:
+                if self._version == version:
+                    self._insert(user_id, templates)
+        return templates
+
+    def put(self, user_id, templates):
+        """Shrani sveže template (po registraciji)."""
+        with self._lock:
+            self._version += 1
+            self._remove(user_id)
+            self._insert(user_id, templates)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._version += 1
+            self._remove(user_id)
+            set_template_cache_bytes(self._bytes)
+
+    def clear(self):
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+            self._bytes = 0
+            set_template_cache_bytes(0)
+
+    def reset_after_fork(self):
+        """V otroku po fork-u: nov zaklep (ob fork-u ga je morda držala nit starša)."""
+        self._lock = threading.Lock()
+
+    def _insert(self, user_id, templates):
+        size = self._size(templates)
+        if size > self.max_bytes:
+            return
+        self._remove(user_id)
+        self._entries[user_id] = (templates, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self._evictions += 1
+        set_template_cache_bytes(self._bytes)
+
+    def _remove(self, user_id):
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": (self._hits / lookups) if lookups else 0.0,
+                "evictions": self._evictions,
+            }